@@ -8,7 +8,6 @@ django.setup()
 
 from django.db import connection
 
-cursor = connection.cursor()
-cursor.execute('SELECT name FROM sqlite_master WHERE type="table" AND name LIKE "myapp_%"')
-tables = [row[0] for row in cursor.fetchall()]
+# 通过数据库内省获取表名，兼容 SQLite 和 PostgreSQL
+tables = [name for name in connection.introspection.table_names() if name.startswith('myapp_')]
 print("Tables found:", tables)
\ No newline at end of file
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import Theme, ThemeVariable
+from .theme_cache import invalidate_theme_cache
 
 
 class ThemeVariableInline(admin.TabularInline):
@@ -19,6 +20,7 @@ class ThemeAdmin(admin.ModelAdmin):
     def activate_theme(self, request, queryset):
         """批量激活主题（只激活最后一个选中的）"""
         Theme.objects.filter(is_active=True).update(is_active=False)
+        invalidate_theme_cache()
         
         if queryset.exists():
             last_theme = queryset.last()
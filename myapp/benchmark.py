@@ -0,0 +1,578 @@
+"""
+压力测试
+
+按场景反复请求热点页面，统计每个场景的延迟分位数（p50/p95/p99）、吞吐量和每请求查询数，
+结果写入 JSON 文件，包含当前提交和数据规模，便于在不同提交之间对比。
+
+两种驱动方式：
+- ``ClientDriver``：进程内通过 Django 测试客户端调用视图，查询数由 QueryStats 统计；
+- ``HttpDriver``：通过 HTTP 请求运行中的服务（如本地 gunicorn），查询数取自
+  QueryBudgetMiddleware 输出的 Server-Timing 头（服务端需开启 QUERY_BUDGET_ENABLED）。
+
+每个并发级别使用相同数量的工作线程，每个线程持有自己的客户端（和会话）。
+
+``run_write_contention`` 另外模拟多个 worker 进程同时写库（发表回复、写回浏览次数，
+穿插读取回复楼层），用于比较不同数据库配置下的并发写入吞吐量和锁等待失败次数。
+
+``measure_startup`` 在新的子进程中测量冷启动：``python -X importtime`` 的导入耗时，
+以及 worker 启动（django.setup + 加载 WSGI 应用）和处理第一个请求的耗时。
+
+``measure_listings`` 对比列表页查询读取完整模型实例和只读取所需列（rows.as_rows）时，
+每页从数据库读取的字节数、构造结果占用的内存和耗时。
+"""
+import http.cookiejar
+import json
+import math
+import multiprocessing
+import random
+import re
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import OperationalError, connections, transaction
+from django.db.models import Count, F
+from django.test import Client
+from django.urls import reverse
+
+from .models import Forum, Post
+from .query_budget import QueryStats
+
+SCENARIOS = ('forum_index', 'forum_detail', 'post_detail', 'add_reply', 'theme_variables', 'login')
+
+_SERVER_TIMING_QUERIES_RE = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+def percentile(sorted_values, percent):
+    """最近秩法计算分位数，sorted_values 须已排序"""
+    if not sorted_values:
+        return None
+    rank = math.ceil(percent / 100 * len(sorted_values))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+
+class Targets:
+    """
+    各场景请求的目标
+
+    板块和帖子都按热度偏斜抽取：帖子从回复数最多的样本中按 Zipf 权重选择，
+    与真实访问集中在少数热帖的情况一致。
+    """
+
+    def __init__(self, sample_size=1000, seed=0, credentials=None):
+        self.rng = random.Random(seed)
+        self.credentials = credentials
+        self.lock = threading.Lock()
+        self.forum_ids = list(
+            Forum.objects.filter(is_active=True, moderator_only=False)
+            .order_by('-post_count').values_list('pk', flat=True)
+        )
+        self.post_ids = list(
+            Post.objects.filter(is_deleted=False, status='published')
+            .order_by('-reply_count').values_list('pk', flat=True)[:sample_size]
+        )
+        if not self.forum_ids or not self.post_ids:
+            raise ValueError('数据库中没有可用的板块或帖子，请先执行 generate_dataset')
+        self.forum_weights = [1 / rank for rank in range(1, len(self.forum_ids) + 1)]
+        self.post_weights = [1 / rank for rank in range(1, len(self.post_ids) + 1)]
+
+    def _pick(self, values, weights):
+        with self.lock:
+            return self.rng.choices(values, weights=weights)[0]
+
+    def request(self, scenario):
+        """返回 (method, path, data)"""
+        if scenario == 'forum_index':
+            return 'GET', reverse('forum_index'), None
+        if scenario == 'forum_detail':
+            forum_id = self._pick(self.forum_ids, self.forum_weights)
+            return 'GET', reverse('forum_detail', kwargs={'forum_id': forum_id}), None
+        if scenario == 'post_detail':
+            post_id = self._pick(self.post_ids, self.post_weights)
+            return 'GET', reverse('post_detail', kwargs={'post_id': post_id}), None
+        if scenario == 'add_reply':
+            post_id = self._pick(self.post_ids, self.post_weights)
+            return 'POST', reverse('add_reply', kwargs={'post_id': post_id}), {'content': '压力测试回复'}
+        if scenario == 'theme_variables':
+            return 'POST', reverse('get_theme_variables'), {}
+        if scenario == 'login':
+            username, password = self.credentials or ('', '')
+            return 'POST', reverse('login'), {'username': username, 'password': password}
+        raise ValueError(f'未知的场景：{scenario}')
+
+
+class ClientDriver:
+    """进程内驱动：每个工作线程一个测试客户端"""
+
+    name = 'client'
+
+    def __init__(self, username, password):
+        self.username = username
+        self.password = password
+        allowed = [host for host in settings.ALLOWED_HOSTS if host not in ('*', '') and not host.startswith('.')]
+        self.host = allowed[0] if allowed else 'localhost'
+
+    def session(self):
+        client = Client(HTTP_HOST=self.host)
+        if self.username and not client.login(username=self.username, password=self.password):
+            raise ValueError(f'无法以 {self.username} 登录')
+        return client
+
+    def send(self, client, method, path, data):
+        """发送请求，返回 (状态码, 查询数)"""
+        with QueryStats() as stats:
+            if method == 'GET':
+                response = client.get(path)
+            else:
+                response = client.post(path, data)
+            if response.streaming:
+                b''.join(response)
+        return response.status_code, stats.count
+
+    def close(self):
+        # 每个工作线程结束时关闭自己的数据库连接
+        connections.close_all()
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpDriver:
+    """HTTP 驱动：每个工作线程一个带 Cookie 的会话"""
+
+    name = 'http'
+
+    def __init__(self, base_url, username, password, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+
+    def session(self):
+        jar = http.cookiejar.CookieJar()
+        opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar), _NoRedirect)
+        session = {'opener': opener, 'jar': jar}
+        if self.username:
+            login = reverse('login')
+            self._open(session, 'GET', login)
+            status, _ = self._open(session, 'POST', login, {
+                'username': self.username, 'password': self.password,
+            })
+            if status != 302:
+                raise ValueError(f'无法以 {self.username} 登录（状态码 {status}）')
+        return session
+
+    def _csrf_token(self, session):
+        for cookie in session['jar']:
+            if cookie.name == settings.CSRF_COOKIE_NAME:
+                return cookie.value
+        return ''
+
+    def _open(self, session, method, path, data=None):
+        url = self.base_url + path
+        body = None
+        headers = {'Referer': url}
+        if method == 'POST':
+            token = self._csrf_token(session)
+            body = urllib.parse.urlencode({**(data or {}), 'csrfmiddlewaretoken': token}).encode()
+            headers['X-CSRFToken'] = token
+        request = urllib.request.Request(url, data=body, headers=headers, method=method)
+        try:
+            with session['opener'].open(request, timeout=self.timeout) as response:
+                response.read()
+                return response.status, response.headers.get('Server-Timing', '')
+        except urllib.error.HTTPError as error:
+            error.read()
+            return error.code, error.headers.get('Server-Timing', '')
+
+    def send(self, session, method, path, data):
+        status, server_timing = self._open(session, method, path, data)
+        match = _SERVER_TIMING_QUERIES_RE.search(server_timing)
+        return status, int(match.group(1)) if match else None
+
+    def close(self):
+        pass
+
+
+def _summarize(samples, errors, elapsed):
+    latencies = sorted(latency for latency, _ in samples)
+    queries = [count for _, count in samples if count is not None]
+    total = len(samples) + errors
+    return {
+        'requests': total,
+        'errors': errors,
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'mean_ms': sum(latencies) / len(latencies) if latencies else None,
+        'requests_per_second': total / elapsed if elapsed > 0 else None,
+        'queries_per_request': sum(queries) / len(queries) if queries else None,
+    }
+
+
+def run_scenario(driver, targets, scenario, requests, concurrency, warmup=0):
+    """用 concurrency 个线程共发出 requests 个请求，返回统计结果"""
+    lock = threading.Lock()
+    samples = []
+    errors = [0]
+    remaining = [requests]
+
+    def take():
+        with lock:
+            if remaining[0] <= 0:
+                return False
+            remaining[0] -= 1
+            return True
+
+    def start_clock():
+        started[0] = time.perf_counter()
+
+    # 所有线程登录并预热完成后才开始计时
+    ready = threading.Barrier(concurrency, action=start_clock)
+    started = [None]
+
+    def worker():
+        try:
+            session = driver.session()
+            for _ in range(warmup):
+                driver.send(session, *targets.request(scenario))
+        except Exception:
+            # 登录或预热失败时释放其余等待中的线程
+            ready.abort()
+            driver.close()
+            raise
+        try:
+            ready.wait()
+            while take():
+                method, path, data = targets.request(scenario)
+                request_started = time.perf_counter()
+                try:
+                    status, queries = driver.send(session, method, path, data)
+                except Exception:
+                    status, queries = None, None
+                latency = (time.perf_counter() - request_started) * 1000
+                with lock:
+                    # 重定向（如回复成功后跳转）视为成功
+                    if status is not None and status < 400:
+                        samples.append((latency, queries))
+                    else:
+                        errors[0] += 1
+        finally:
+            driver.close()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(worker) for _ in range(concurrency)]
+    # 优先抛出导致失败的异常，而不是其他线程因此收到的 BrokenBarrierError
+    failures = [future.exception() for future in futures if future.exception() is not None]
+    failures.sort(key=lambda error: isinstance(error, threading.BrokenBarrierError))
+    if failures:
+        raise failures[0]
+    return _summarize(samples, errors[0], time.perf_counter() - started[0])
+
+
+def git_revision():
+    """当前提交的哈希，不在 git 仓库中时返回 None"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def dataset_size():
+    from django.contrib.auth.models import User
+
+    from .models import Notification, Reply
+
+    return {
+        'users': User.objects.count(),
+        'forums': Forum.objects.count(),
+        'posts': Post.objects.count(),
+        'replies': Reply.objects.count(),
+        'notifications': Notification.objects.count(),
+    }
+
+
+def run(driver, scenarios=SCENARIOS, requests=200, concurrency=(1,), warmup=5, seed=0, progress=None):
+    """
+    依次在每个并发级别下运行每个场景，返回可直接写入 JSON 的报告
+
+    progress(场景, 并发数, 结果) 在每个场景运行后调用。
+    """
+    targets = Targets(seed=seed, credentials=(driver.username, driver.password))
+    report = {
+        'revision': git_revision(),
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'driver': driver.name,
+        'database': connections['default'].vendor,
+        'dataset': dataset_size(),
+        'requests': requests,
+        'warmup': warmup,
+        'results': [],
+    }
+    for level in concurrency:
+        for scenario in scenarios:
+            result = run_scenario(driver, targets, scenario, requests, level, warmup)
+            result.update(scenario=scenario, concurrency=level)
+            report['results'].append(result)
+            if progress is not None:
+                progress(scenario, level, result)
+    return report
+
+
+def write_report(report, path):
+    with open(path, 'w', encoding='utf-8') as output:
+        json.dump(report, output, ensure_ascii=False, indent=2)
+        output.write('\n')
+
+
+def _write_worker(args):
+    """写入压力测试的子进程：交替执行发表回复、写回浏览次数和读取回复楼层"""
+    from . import reply_thread
+    from .models import Reply
+
+    worker, operations, post_ids, user_ids, seed = args
+    rng = random.Random(seed * 1000 + worker)
+    latencies, errors = [], 0
+    try:
+        for index in range(operations):
+            post_id = rng.choice(post_ids)
+            started = time.perf_counter()
+            try:
+                if index % 3 == 0:
+                    Reply.objects.create(post_id=post_id, author_id=rng.choice(user_ids), content='压力测试回复')
+                elif index % 3 == 1:
+                    with transaction.atomic():
+                        Post.objects.filter(pk=post_id).update(view_count=F('view_count') + 1)
+                else:
+                    page = reply_thread.load_thread(Post.objects.get(pk=post_id))
+                    list(page)
+            except OperationalError:
+                # database is locked 等锁等待失败
+                errors += 1
+            else:
+                latencies.append((time.perf_counter() - started) * 1000)
+    finally:
+        connections.close_all()
+    return latencies, errors
+
+
+def run_write_contention(processes=4, operations=300, seed=0):
+    """
+    用 processes 个子进程（fork）各执行 operations 次操作，返回统计结果
+
+    与 gunicorn 多 worker 一样，每个进程有自己的数据库连接，锁竞争发生在进程之间。
+    """
+    from django.contrib.auth.models import User
+
+    targets = Targets(seed=seed)
+    user_ids = list(User.objects.filter(is_active=True).values_list('pk', flat=True)[:1000])
+    # 子进程不能共用父进程打开的连接
+    connections.close_all()
+
+    tasks = [(worker, operations, targets.post_ids, user_ids, seed) for worker in range(processes)]
+    started = time.perf_counter()
+    with multiprocessing.get_context('fork').Pool(processes) as pool:
+        outcomes = pool.map(_write_worker, tasks)
+    elapsed = time.perf_counter() - started
+
+    samples = [(latency, None) for latencies, _ in outcomes for latency in latencies]
+    result = _summarize(samples, sum(errors for _, errors in outcomes), elapsed)
+    del result['queries_per_request']
+    database = connections['default'].settings_dict
+    result.update(
+        revision=git_revision(),
+        created_at=datetime.now(timezone.utc).isoformat(),
+        engine=database['ENGINE'],
+        pragmas=database.get('PRAGMAS', {}),
+        processes=processes,
+    )
+    return result
+
+
+# 在子进程中模拟 worker 启动：加载 WSGI 应用，记录此时是否已连接数据库，再处理第一个请求
+_BOOT_SCRIPT = """
+import json, os, time
+started = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+booted = time.perf_counter()
+from django.db import connections
+connected = any(connections[alias].connection is not None for alias in connections)
+from django.test import Client
+status = Client(HTTP_HOST=%r).get(%r).status_code
+print(json.dumps({
+    'boot_ms': (booted - started) * 1000,
+    'first_request_ms': (time.perf_counter() - booted) * 1000,
+    'db_connected_at_boot': connected,
+    'status': status,
+}))
+"""
+
+_IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def _parse_importtime(stderr, top=10):
+    """解析 -X importtime 的输出，返回 (总导入耗时毫秒, 累计耗时最长的顶层模块)"""
+    total = 0
+    roots = []
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if not match:
+            continue
+        own, cumulative, indent, module = match.groups()
+        total += int(own)
+        # 缩进为一个空格的是被直接导入的顶层模块
+        if len(indent) == 1:
+            roots.append((int(cumulative) / 1000, module))
+    roots.sort(reverse=True)
+    return total / 1000, [{'module': module, 'cumulative_ms': ms} for ms, module in roots[:top]]
+
+
+def measure_startup(runs=5, path='/'):
+    """运行 runs 次冷启动，返回各项耗时的中位数"""
+    host = ClientDriver(None, None).host
+    script = _BOOT_SCRIPT % (host, path)
+    boots, imports = [], []
+    top_imports = []
+    for _ in range(runs):
+        boot = subprocess.run(
+            [sys.executable, '-c', script], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        )
+        boots.append(json.loads(boot.stdout.strip().splitlines()[-1]))
+        importtime = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', script], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        )
+        total, top_imports = _parse_importtime(importtime.stderr)
+        imports.append(total)
+
+    return {
+        'revision': git_revision(),
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'runs': runs,
+        'path': path,
+        'boot_ms': statistics.median(boot['boot_ms'] for boot in boots),
+        'first_request_ms': statistics.median(boot['first_request_ms'] for boot in boots),
+        'import_ms': statistics.median(imports),
+        'db_connected_at_boot': any(boot['db_connected_at_boot'] for boot in boots),
+        'first_request_status': boots[-1]['status'],
+        'slowest_imports': top_imports,
+    }
+
+
+def _listing_querysets():
+    """各列表页一页数据的查询集：(名称, 完整模型实例, 只读行)"""
+    from .models import Notification, UserProfile
+    from .rows import as_rows
+
+    forum = Forum.objects.order_by('-post_count').first()
+    author = UserProfile.objects.order_by('-post_count').values_list('user_id', flat=True).first()
+    recipient = (
+        Notification.objects.order_by().values('recipient')
+        .annotate(total=Count('pk')).order_by('-total').values_list('recipient', flat=True).first()
+    )
+
+    forum_posts = Post.objects.filter(forum=forum, is_deleted=False, status='published').order_by(*Post.LATEST_ORDERING)
+    profile_posts = Post.objects.filter(author_id=author, is_deleted=False, status='published')
+    notifications = Notification.objects.filter(recipient_id=recipient).order_by(*Notification.LIST_ORDERING)
+    return [
+        ('forum_detail', forum_posts.select_related('author')[:20], as_rows(forum_posts, *Post.LIST_FIELDS)[:20]),
+        (
+            'user_profile',
+            profile_posts[:10],
+            as_rows(
+                profile_posts,
+                'id', 'title', 'excerpt', 'is_top', 'is_essence', 'view_count', 'reply_count', 'created_at',
+                'forum__id', 'forum__name',
+            )[:10],
+        ),
+        ('notifications', notifications[:20], as_rows(notifications, *Notification.LIST_FIELDS)[:20]),
+    ]
+
+
+def _value_size(value):
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    if isinstance(value, (bytes, memoryview)):
+        return len(value)
+    return len(str(value))
+
+
+def _fetched_bytes(queryset):
+    """执行查询集的 SQL，返回结果中所有值的字节数之和（近似数据库传给应用的数据量）"""
+    sql, params = queryset.query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        return sum(_value_size(value) for row in cursor.fetchall() for value in row)
+
+
+def _measure_listing(queryset, runs):
+    durations = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        list(queryset.all())
+        durations.append((time.perf_counter() - started) * 1000)
+
+    tracemalloc.start()
+    try:
+        objects = list(queryset.all())
+        memory, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'rows': len(objects),
+        'bytes': _fetched_bytes(queryset),
+        'memory_bytes': memory,
+        'median_ms': statistics.median(durations),
+    }
+
+
+def measure_listings(runs=20, content_size=None):
+    """
+    对比各列表页读取完整模型实例和只读行的开销
+
+    content_size 不为空时，先把参与测试的帖子正文临时改为该长度（字符数）以模拟长帖，
+    测试在事务中进行，结束后回滚。
+    """
+    results = []
+    with transaction.atomic():
+        listings = _listing_querysets()
+        if content_size:
+            body = ('长帖内容' * (content_size // 4 + 1))[:content_size]
+            post_ids = {post.pk for name, full, _ in listings if full.model is Post for post in full}
+            Post.objects.filter(pk__in=post_ids).update(content=body, content_html=f'<p>{body}</p>')
+        for name, full, rows in listings:
+            results.append({
+                'listing': name,
+                'model_instances': _measure_listing(full, runs),
+                'rows': _measure_listing(rows, runs),
+            })
+        transaction.set_rollback(True)
+
+    return {
+        'revision': git_revision(),
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'database': connections['default'].vendor,
+        'dataset': dataset_size(),
+        'runs': runs,
+        'content_size': content_size,
+        'results': results,
+    }
@@ -0,0 +1,96 @@
+"""
+页面条件请求（ETag / Last-Modified）
+
+帖子页和板块页先用少量数据算出验证值，请求带有匹配的 If-None-Match / If-Modified-Since 时
+直接返回 304，不查询回复、帖子列表，也不渲染模板。
+
+ETag 由以下部分组成：
+- 页面数据的版本：视图从数据库读出的字段值（帖子的更新时间、回复数、板块的更新时间等）。
+  不使用片段缓存的版本号：缓存为进程内缓存时，其他进程中的写入不会更换本进程的版本号；
+- 完整路径（分页游标、排序、搜索参数）和当前主题的 CSS 版本；
+- 访问者：页面导航栏包含用户名和未读通知数，回复表单包含 CSRF 令牌，
+  因此登录用户按会话和未读通知数区分，匿名用户共享同一个 ETag。
+
+匿名响应标记为 public 并输出 Last-Modified，反向代理可以缓存（时间由 PAGE_CACHE_SHARED_MAX_AGE 控制）
+并用 ETag 回源验证；登录用户的响应为 private，浏览器每次都要验证。两者都带 Vary: Cookie。
+浏览次数不参与验证，304 响应中的浏览次数可能滞后。
+
+提示消息（django.contrib.messages）只显示一次，有待显示的消息时不做条件处理，
+直接渲染页面，响应也不带 ETag、不允许缓存。
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+
+def _shared_max_age():
+    """匿名响应允许反向代理缓存的时间（秒）"""
+    return getattr(settings, 'PAGE_CACHE_SHARED_MAX_AGE', 0)
+
+
+def _viewer(request):
+    """ETag 中的访问者部分"""
+    user = request.user
+    if not user.is_authenticated:
+        return 'anonymous'
+    from .notification_counter import get_request_unread_count
+
+    # 重新登录会更换会话和 CSRF 令牌，旧页面中的表单不能再用
+    return f'user:{user.pk}:{request.session.session_key}:{get_request_unread_count(request)}'
+
+
+def _theme_version():
+    from .theme_cache import get_active_theme, get_theme_css
+
+    theme = get_active_theme()
+    bundle = get_theme_css(theme.identifier) if theme is not None else None
+    return bundle['version'] if bundle is not None else ''
+
+
+def _has_messages(request):
+    """是否有待显示的提示消息，只计数，不会把消息标记为已显示"""
+    return len(get_messages(request)) > 0
+
+
+def page_etag(request, *parts):
+    """页面的 ETag，parts 为页面数据的版本"""
+    raw = '\n'.join(str(part) for part in (request.get_full_path(), _theme_version(), _viewer(request), *parts))
+    return quote_etag(hashlib.md5(raw.encode('utf-8')).hexdigest())
+
+
+def conditional_page(request, render, *parts, last_modified=None):
+    """
+    按验证值处理条件请求
+
+    验证值匹配时返回 304，否则调用 render() 生成响应；两种情况都设置 ETag、Cache-Control 和 Vary。
+    last_modified 只在匿名响应中输出，登录用户的页面还取决于 ETag 中的访问者部分。
+    有待显示的提示消息时直接调用 render()。
+    """
+    if _has_messages(request):
+        response = render()
+        patch_cache_control(response, private=True, no_store=True)
+        patch_vary_headers(response, ('Cookie',))
+        return response
+
+    etag = page_etag(request, *parts)
+    anonymous = not request.user.is_authenticated
+    timestamp = int(last_modified.timestamp()) if anonymous and last_modified is not None else None
+
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = render()
+        if response.status_code != 200:
+            return response
+
+    response['ETag'] = etag
+    if timestamp is not None:
+        response['Last-Modified'] = http_date(timestamp)
+    if anonymous:
+        patch_cache_control(response, public=True, max_age=0, s_maxage=_shared_max_age())
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ('Cookie',))
+    return response
@@ -1,15 +1,39 @@
 from django.contrib.auth.decorators import login_required
+from django.utils.functional import SimpleLazyObject
 
 def notification_count(request):
     """
     为模板提供当前用户的未读通知数量
+
+    数量与页面 ETag 共用同一次读取，并且只在模板实际用到时才读取。
     """
-    if request.user.is_authenticated:
-        from .models import Notification
-        unread_count = Notification.objects.filter(recipient=request.user, is_read=False).count()
-        return {
-            'unread_notification_count': unread_count
-        }
+    def unread_count():
+        if not request.user.is_authenticated:
+            return 0
+        from .notification_counter import get_request_unread_count
+        return get_request_unread_count(request)
+
     return {
-        'unread_notification_count': 0
-    }
\ No newline at end of file
+        'unread_notification_count': SimpleLazyObject(unread_count)
+    }
+
+
+def theme(request):
+    """
+    为模板提供当前激活主题的标识和版本化CSS地址
+    """
+    from django.urls import reverse
+    from .theme_cache import get_active_theme, get_theme_css
+
+    active_theme = get_active_theme()
+    if active_theme is None:
+        return {}
+
+    context = {'current_theme': active_theme.identifier}
+    bundle = get_theme_css(active_theme.identifier)
+    if bundle is not None:
+        context['theme_css_url'] = reverse('theme_css', kwargs={
+            'identifier': active_theme.identifier,
+            'version': bundle['version'],
+        })
+    return context
\ No newline at end of file
@@ -0,0 +1,92 @@
+"""
+页面片段缓存
+
+板块帖子列表和帖子回复列表的渲染结果按“对象版本号”缓存：
+- ``myapp:fragment:version:<kind>:<id>``  板块（forum）或帖子（post）的当前版本号
+- ``myapp:fragment:<hash>``               片段 HTML，键中包含版本号
+
+帖子或回复的写入（包括置顶、精华、软删除）通过模型信号调用 ``bump`` 更换版本号，
+旧片段不再被读取，由缓存过期自然淘汰，不需要逐个删除。使用进程内缓存时版本号只在本进程内
+更换，视图还会把板块的 updated_at（由 Forum.touch 在每次写入时更新）放进键中，其他进程的写入
+同样使片段失效。
+
+片段中的操作按钮与当前用户有关，因此缓存键中还包含“访问者身份”：匿名用户和管理员
+各自共享一份，普通登录用户按用户区分。片段使用独立的上下文渲染，不经过上下文处理器，
+页面其余部分（导航栏、通知角标等）仍每次渲染。
+
+浏览次数不会更换版本号，片段中的浏览次数最多滞后 FRAGMENT_CACHE_TIMEOUT 秒。
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+VERSION_KEY = 'myapp:fragment:version:%s:%s'
+FRAGMENT_KEY = 'myapp:fragment:%s'
+
+
+def _timeout():
+    """片段缓存过期时间（秒），0 表示不缓存"""
+    return getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 300)
+
+
+def _new_version():
+    # 使用随机值而不是自增：版本号被淘汰后重新生成，也不会与旧片段的键重合
+    return uuid.uuid4().hex[:12]
+
+
+def get_version(kind, pk):
+    """获取对象的当前版本号，不存在时生成一个"""
+    key = VERSION_KEY % (kind, pk)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump(kind, pk):
+    """
+    更换对象的版本号，使相关片段全部失效
+
+    立即更换一次，事务提交后再更换一次，防止提交前有请求按旧数据重新生成片段。
+    """
+    key = VERSION_KEY % (kind, pk)
+    cache.set(key, _new_version(), None)
+    transaction.on_commit(lambda: cache.set(key, _new_version(), None))
+
+
+def _audience(user):
+    """片段中的个性化内容只取决于访问者身份"""
+    if user is None or not user.is_authenticated:
+        return 'anonymous'
+    if user.is_staff:
+        return 'staff'
+    return 'user:%s' % user.pk
+
+
+def render_fragment(template_name, context, user, key_parts=None):
+    """
+    渲染片段，key_parts 不为 None 时先从缓存读取
+
+    context 可以是字典或返回字典的函数；使用函数时，只有缓存未命中才会执行其中的查询。
+    """
+    def render():
+        values = context() if callable(context) else context
+        return render_to_string(template_name, {**values, 'user': user})
+
+    timeout = _timeout()
+    if key_parts is None or not timeout:
+        return render()
+
+    raw_key = ':'.join(str(part) for part in (template_name, _audience(user), *key_parts))
+    key = FRAGMENT_KEY % hashlib.md5(raw_key.encode('utf-8')).hexdigest()
+    html = cache.get(key)
+    if html is None:
+        html = str(render())
+        cache.set(key, html, timeout)
+    return mark_safe(html)
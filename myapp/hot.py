@@ -0,0 +1,103 @@
+"""
+帖子热度
+
+热度 = log10(互动权重) + 最后活跃时间项，互动权重由回复数、浏览次数和精华状态加权得到，
+时间项每过 HALF_LIFE_HOURS 小时增加 log10(2)，相当于旧帖子的热度每过一个半衰期减半。
+因为衰减体现在新帖子的时间项更大，而不是旧帖子的分数随时间变小，已有帖子的热度不需要定时重算，
+只在互动数据变化时更新：
+
+- 新增回复：最后活跃时间变为回复时间，热度按新的回复数和时间重新计算；
+- 删除回复、写回浏览次数、设置或取消精华：最后活跃时间不变，热度加上互动权重对数的变化量；
+- 保存帖子的全部字段（发帖）或计数字段：在 Python 中按当前字段计算。
+
+以上增量更新都以 UPDATE 表达式完成，不需要先读出帖子。增量累积的浮点误差，
+以及调整权重或半衰期后的旧分数，由 refresh_hot_scores 命令批量重算（可每天执行一次）。
+"""
+import math
+from datetime import datetime, timezone as dt_timezone
+
+from django.db.models import Case, ExpressionWrapper, F, FloatField, Value, When
+from django.db.models.functions import Log
+from django.utils import timezone
+
+REPLY_WEIGHT = 5
+VIEW_WEIGHT = 0.1
+ESSENCE_WEIGHT = 25
+HALF_LIFE_HOURS = 24
+
+# 时间项的起点，只影响分数的绝对值，不影响排序
+EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def time_term(activity_at):
+    """最后活跃时间对应的时间项"""
+    hours = (activity_at - EPOCH).total_seconds() / 3600
+    return hours / HALF_LIFE_HOURS * math.log10(2)
+
+
+def score(reply_count, view_count, is_essence, activity_at):
+    """按给定的字段值计算热度"""
+    weight = 1 + reply_count * REPLY_WEIGHT + view_count * VIEW_WEIGHT + (ESSENCE_WEIGHT if is_essence else 0)
+    return math.log10(weight) + time_term(activity_at)
+
+
+def score_post(post):
+    """按帖子实例当前的字段计算热度，新帖子还没有创建时间时按当前时间计算"""
+    activity_at = post.last_reply_at or post.created_at or timezone.now()
+    return score(post.reply_count, post.view_count, post.is_essence, activity_at)
+
+
+def _log_weight(reply_count, view_count, is_essence=None):
+    if is_essence is None:
+        essence = Case(When(is_essence=True, then=Value(float(ESSENCE_WEIGHT))), default=Value(0.0))
+    else:
+        essence = Value(float(ESSENCE_WEIGHT) if is_essence else 0.0)
+    weight = (
+        Value(1.0)
+        + reply_count * Value(float(REPLY_WEIGHT))
+        + view_count * Value(float(VIEW_WEIGHT))
+        + essence
+    )
+    return Log(Value(10.0), ExpressionWrapper(weight, output_field=FloatField()))
+
+
+def adjusted(reply_count=F('reply_count'), view_count=F('view_count'), is_essence=None):
+    """
+    最后活跃时间不变时的新热度表达式
+
+    reply_count / view_count 为更新后的值（表达式），is_essence 为更新后的精华状态（None 表示不变），
+    用于 UPDATE ... SET hot_score = ...，与这些字段在同一条语句中更新（SET 中的字段引用都是更新前的值）。
+    """
+    new = _log_weight(reply_count, view_count, is_essence)
+    old = _log_weight(F('reply_count'), F('view_count'))
+    return ExpressionWrapper(F('hot_score') + new - old, output_field=FloatField())
+
+
+def bumped(activity_at, reply_count=F('reply_count'), view_count=F('view_count')):
+    """最后活跃时间变为 activity_at 时的新热度表达式，参数含义同 adjusted"""
+    return ExpressionWrapper(
+        _log_weight(reply_count, view_count) + Value(time_term(activity_at)),
+        output_field=FloatField(),
+    )
+
+
+def refresh(model, batch_size=500, progress=None):
+    """
+    按主键分批重算全部帖子的热度，返回更新的行数
+    """
+    queryset = model.objects.order_by('pk').only(
+        'pk', 'reply_count', 'view_count', 'is_essence', 'created_at', 'last_reply_at'
+    )
+    total = 0
+    last_pk = 0
+    while True:
+        posts = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+        if not posts:
+            return total
+        for post in posts:
+            post.hot_score = score_post(post)
+        model.objects.bulk_update(posts, ['hot_score'])
+        total += len(posts)
+        last_pk = posts[-1].pk
+        if progress is not None:
+            progress(total)
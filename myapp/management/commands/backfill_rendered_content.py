@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+from myapp import rendering
+from myapp.models import Post, Reply
+
+
+class Command(BaseCommand):
+    help = '为已有帖子和回复分批生成摘要和渲染后的内容'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='每批处理的行数（默认 500）'
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='重新渲染全部行（修改渲染规则后使用），默认只处理尚未生成的行'
+        )
+
+    def handle(self, *args, **options):
+        for model, excerpt_length in ((Post, rendering.POST_EXCERPT_LENGTH), (Reply, rendering.REPLY_EXCERPT_LENGTH)):
+            label = model._meta.verbose_name
+            started = time.monotonic()
+
+            def progress(total):
+                self.stdout.write(f'{label}：已处理 {total} 行')
+
+            total = rendering.backfill(
+                model,
+                excerpt_length,
+                batch_size=options['batch_size'],
+                only_missing=not options['all'],
+                progress=progress,
+            )
+            elapsed = time.monotonic() - started
+            self.stdout.write(self.style.SUCCESS(
+                f'{label}：共更新 {total} 行，耗时 {elapsed:.2f} 秒（{total / elapsed if elapsed else 0:.0f} 行/秒）'
+            ))
@@ -0,0 +1,55 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from myapp import notification_fanout
+
+
+class Command(BaseCommand):
+    help = '向用户群发系统通知'
+
+    def add_arguments(self, parser):
+        parser.add_argument('title', help='通知标题')
+        parser.add_argument('content', help='通知内容')
+        parser.add_argument(
+            '--url',
+            default='',
+            help='通知的跳转链接'
+        )
+        parser.add_argument(
+            '--staff-only',
+            action='store_true',
+            help='只发送给管理员'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='每批写入的通知数（默认 1000）'
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(is_active=True)
+        if options['staff_only']:
+            users = users.filter(is_staff=True)
+        
+        started = time.monotonic()
+        
+        def progress(sent):
+            if options['verbosity'] > 1:
+                elapsed = time.monotonic() - started
+                self.stdout.write(f'已发送 {sent} 条（{sent / elapsed if elapsed > 0 else sent:.0f} 条/秒）')
+        
+        total = notification_fanout.broadcast(
+            options['title'],
+            options['content'],
+            url=options['url'],
+            users=users,
+            batch_size=options['batch_size'],
+            progress=progress,
+        )
+        elapsed = time.monotonic() - started
+        rate = total / elapsed if elapsed > 0 else total
+        self.stdout.write(self.style.SUCCESS(
+            f'已向 {total} 个用户发送系统通知，耗时 {elapsed:.2f} 秒（{rate:.0f} 条/秒）'
+        ))
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+from myapp import notification_retention
+
+
+class Command(BaseCommand):
+    help = '按保留策略合并和清理通知'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep',
+            type=int,
+            help='每个用户保留的最新通知数（默认 NOTIFICATION_KEEP_PER_USER，0 表示不限制）'
+        )
+        parser.add_argument(
+            '--read-days',
+            type=int,
+            help='已读通知保留天数（默认 NOTIFICATION_READ_RETENTION_DAYS，0 表示永久保留）'
+        )
+        parser.add_argument(
+            '--no-collapse',
+            action='store_true',
+            help='不合并同一帖子的重复回复通知'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='每批删除的通知数（默认 1000）'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        reclaimed = notification_retention.compact(
+            keep=options['keep'],
+            read_days=options['read_days'],
+            collapse=False if options['no_collapse'] else None,
+            batch_size=options['batch_size'],
+        )
+        elapsed = time.monotonic() - started
+        
+        labels = {'collapsed': '合并回复通知', 'expired': '过期已读通知', 'overflow': '超出保留条数'}
+        for policy, rows in reclaimed.items():
+            self.stdout.write(f'{labels[policy]}：删除 {rows} 条')
+        self.stdout.write(self.style.SUCCESS(
+            f'共回收 {sum(reclaimed.values())} 条通知，耗时 {elapsed:.2f} 秒'
+        ))
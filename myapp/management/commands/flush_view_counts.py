@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from myapp import view_counter
+
+
+class Command(BaseCommand):
+    help = '将缓存中累计的帖子浏览次数批量写回数据库'
+
+    def handle(self, *args, **options):
+        posts, views = view_counter.flush()
+        self.stdout.write(self.style.SUCCESS(f'已写回 {posts} 个帖子的 {views} 次浏览'))
@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand
+from myapp import synthetic_data
+
+
+class Command(BaseCommand):
+    help = '生成用于压力测试的合成论坛数据'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='用户数（默认 1000）')
+        parser.add_argument('--forums', type=int, default=8, help='板块数（默认 8）')
+        parser.add_argument('--posts', type=int, default=10000, help='帖子数（默认 10000）')
+        parser.add_argument('--replies', type=int, default=50000, help='回复总数，按长尾分布分配到帖子（默认 50000）')
+        parser.add_argument('--notifications', type=int, default=20000, help='通知数（默认 20000）')
+        parser.add_argument('--days', type=int, default=365, help='数据的时间跨度（天，默认 365）')
+        parser.add_argument('--seed', type=int, default=0, help='随机种子，相同种子生成相同数据（默认 0）')
+        parser.add_argument(
+            '--password',
+            default=synthetic_data.DEFAULT_PASSWORD,
+            help=f'生成用户的密码（默认 {synthetic_data.DEFAULT_PASSWORD}）'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='每批写入的行数（默认 1000）'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        def progress(kind, created):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{kind}: 已生成 {created} 条（{time.monotonic() - started:.1f} 秒）')
+
+        generator = synthetic_data.DatasetGenerator(
+            users=options['users'],
+            forums=options['forums'],
+            posts=options['posts'],
+            replies=options['replies'],
+            notifications=options['notifications'],
+            days=options['days'],
+            batch_size=options['batch_size'],
+            seed=options['seed'],
+            password=options['password'],
+            progress=progress,
+        )
+        created = generator.generate()
+        elapsed = time.monotonic() - started
+        rows = sum(created.values())
+        rate = rows / elapsed if elapsed > 0 else rows
+        summary = '，'.join(f'{kind} {count}' for kind, count in created.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'已生成 {summary}，耗时 {elapsed:.2f} 秒（{rate:.0f} 行/秒）'
+        ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from myapp.models import Forum
+
+
+class Command(BaseCommand):
+    help = '重新计算论坛板块的帖子数和最新帖子'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'forum_ids',
+            nargs='*',
+            type=int,
+            help='只重建指定板块，默认重建全部板块'
+        )
+
+    def handle(self, *args, **options):
+        forums = Forum.objects.all()
+        if options['forum_ids']:
+            forums = forums.filter(pk__in=options['forum_ids'])
+        
+        updated = Forum.rebuild_stats(forums)
+        self.stdout.write(self.style.SUCCESS(f'已重建 {updated} 个板块的统计数据'))
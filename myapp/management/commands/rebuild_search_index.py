@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from myapp import search
+
+
+class Command(BaseCommand):
+    help = '重建帖子全文搜索索引'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='每批写入的帖子数（默认 500）'
+        )
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            self.stdout.write(self.style.WARNING('当前数据库没有全文索引表，搜索将使用 icontains 查询'))
+            return
+        
+        total = search.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'已重建 {total} 个帖子的搜索索引'))
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+from myapp import reputation
+
+
+class Command(BaseCommand):
+    help = '根据帖子和回复重新计算用户统计与声望值'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pending',
+            action='store_true',
+            help='只处理重算队列中的用户，默认重算全部用户'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='每批处理的用户数（默认 1000）'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if options['pending']:
+            processed, updated = reputation.process_pending(chunk_size=options['chunk_size'])
+        else:
+            processed, updated = reputation.recompute(chunk_size=options['chunk_size'])
+        elapsed = time.monotonic() - started
+        rate = processed / elapsed if elapsed > 0 else processed
+        self.stdout.write(self.style.SUCCESS(
+            f'已处理 {processed} 个用户，更新 {updated} 个，耗时 {elapsed:.2f} 秒（{rate:.0f} 个/秒）'
+        ))
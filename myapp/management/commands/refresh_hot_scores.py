@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+from myapp import hot
+from myapp.models import Post
+
+
+class Command(BaseCommand):
+    help = '批量重算帖子热度（修正增量更新的误差，调整热度权重或半衰期后也需要执行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='每批更新的帖子数（默认 500）'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        total = hot.refresh(Post, batch_size=options['batch_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'已重算 {total} 个帖子的热度，耗时 {elapsed:.2f} 秒'))
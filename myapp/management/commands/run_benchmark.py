@@ -0,0 +1,124 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from myapp import benchmark, synthetic_data
+
+
+class Command(BaseCommand):
+    help = '对热点页面进行压力测试，输出延迟分位数、吞吐量和每请求查询数'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            choices=benchmark.SCENARIOS,
+            help='要测试的场景，可重复指定（默认全部）'
+        )
+        parser.add_argument('--requests', type=int, default=200, help='每个场景每个并发级别的请求数（默认 200）')
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            nargs='+',
+            default=[1],
+            help='并发级别，可指定多个（默认 1）'
+        )
+        parser.add_argument('--warmup', type=int, default=5, help='每个线程计时前的预热请求数（默认 5）')
+        parser.add_argument('--seed', type=int, default=0, help='选择请求目标的随机种子（默认 0）')
+        parser.add_argument(
+            '--username',
+            default=f'{synthetic_data.USERNAME_PREFIX}00001',
+            help='登录使用的用户名，为空时匿名访问（add_reply 和 login 场景需要）'
+        )
+        parser.add_argument('--password', default=synthetic_data.DEFAULT_PASSWORD, help='登录密码')
+        parser.add_argument(
+            '--base-url',
+            help='通过 HTTP 测试运行中的服务（如 http://127.0.0.1:8000），默认在进程内使用测试客户端'
+        )
+        parser.add_argument(
+            '--gunicorn',
+            type=int,
+            metavar='WORKERS',
+            help='启动指定进程数的本地 gunicorn 并通过 HTTP 测试，结束后自动关闭'
+        )
+        parser.add_argument('--output', default='benchmark.json', help='结果文件（默认 benchmark.json）')
+
+    def handle(self, *args, **options):
+        server = None
+        base_url = options['base_url']
+        if options['gunicorn']:
+            server, base_url = self._start_gunicorn(options['gunicorn'])
+
+        try:
+            if base_url:
+                driver = benchmark.HttpDriver(base_url, options['username'], options['password'])
+            else:
+                driver = benchmark.ClientDriver(options['username'], options['password'])
+
+            def progress(scenario, concurrency, result):
+                self.stdout.write(
+                    f'{scenario:<16} 并发 {concurrency:<3} '
+                    f'p50 {self._ms(result["p50_ms"])}  p95 {self._ms(result["p95_ms"])}  '
+                    f'p99 {self._ms(result["p99_ms"])}  {result["requests_per_second"] or 0:.1f} 请求/秒  '
+                    f'查询 {self._number(result["queries_per_request"])}/请求  错误 {result["errors"]}'
+                )
+
+            try:
+                report = benchmark.run(
+                    driver,
+                    scenarios=options['scenario'] or benchmark.SCENARIOS,
+                    requests=options['requests'],
+                    concurrency=options['concurrency'],
+                    warmup=options['warmup'],
+                    seed=options['seed'],
+                    progress=progress,
+                )
+            except ValueError as error:
+                raise CommandError(str(error))
+            if options['gunicorn']:
+                report['gunicorn_workers'] = options['gunicorn']
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=10)
+
+        benchmark.write_report(report, options['output'])
+        self.stdout.write(self.style.SUCCESS(f'结果已写入 {options["output"]}'))
+
+    @staticmethod
+    def _ms(value):
+        return '-' if value is None else f'{value:.1f}ms'
+
+    @staticmethod
+    def _number(value):
+        return '-' if value is None else f'{value:.1f}'
+
+    def _start_gunicorn(self, workers):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        base_url = f'http://127.0.0.1:{port}'
+        server = subprocess.Popen(
+            [
+                sys.executable, '-m', 'gunicorn', 'myproject.wsgi:application',
+                '--workers', str(workers), '--bind', f'127.0.0.1:{port}', '--log-level', 'warning',
+            ],
+            cwd=settings.BASE_DIR,
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'myproject.settings')},
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError('gunicorn 启动失败')
+            try:
+                urllib.request.urlopen(base_url + '/', timeout=1).close()
+                return server, base_url
+            except OSError:
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError('等待 gunicorn 启动超时')
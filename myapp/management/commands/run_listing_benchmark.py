@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from myapp import benchmark
+
+
+class Command(BaseCommand):
+    help = '对比列表页读取完整模型实例和只读取所需列时，每页的数据量、内存和耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=20, help='每种方式的查询次数，耗时取中位数（默认 20）')
+        parser.add_argument(
+            '--content-size',
+            type=int,
+            help='临时把参与测试的帖子正文改为指定字符数以模拟长帖（在事务中进行，结束后回滚）'
+        )
+        parser.add_argument('--output', help='同时把结果写入 JSON 文件')
+
+    def handle(self, *args, **options):
+        result = benchmark.measure_listings(runs=options['runs'], content_size=options['content_size'])
+
+        for item in result['results']:
+            full, rows = item['model_instances'], item['rows']
+            self.stdout.write(f'{item["listing"]}（每页 {rows["rows"]} 行）')
+            for label, measured in (('模型实例', full), ('只读行', rows)):
+                self.stdout.write(
+                    f'  {label:<6} 读取 {measured["bytes"] / 1024:.1f}KB  '
+                    f'内存 {measured["memory_bytes"] / 1024:.1f}KB  耗时 {measured["median_ms"]:.2f}ms'
+                )
+        if options['output']:
+            benchmark.write_report(result, options['output'])
+        self.stdout.write(self.style.SUCCESS(f'已完成 {len(result["results"])} 个列表页的测量'))
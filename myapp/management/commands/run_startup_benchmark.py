@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from myapp import benchmark
+
+
+class Command(BaseCommand):
+    help = '测量冷启动耗时：模块导入、worker 启动和第一个请求'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help='启动次数，结果取中位数（默认 5）')
+        parser.add_argument('--path', default='/forum/', help='第一个请求的路径（默认 /forum/）')
+        parser.add_argument('--output', help='同时把结果写入 JSON 文件')
+
+    def handle(self, *args, **options):
+        result = benchmark.measure_startup(runs=options['runs'], path=options['path'])
+
+        self.stdout.write(f'模块导入 {result["import_ms"]:.1f}ms（-X importtime 各模块自身耗时之和）')
+        for item in result['slowest_imports']:
+            self.stdout.write(f'  {item["module"]:<40} {item["cumulative_ms"]:.1f}ms')
+        self.stdout.write(
+            f'worker 启动 {result["boot_ms"]:.1f}ms，启动时{"已" if result["db_connected_at_boot"] else "未"}连接数据库，'
+            f'第一个请求 {result["first_request_ms"]:.1f}ms（状态码 {result["first_request_status"]}）'
+        )
+        if options['output']:
+            benchmark.write_report(result, options['output'])
+        self.stdout.write(self.style.SUCCESS(f'已完成 {result["runs"]} 次冷启动测量'))
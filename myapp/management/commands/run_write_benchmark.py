@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from myapp import benchmark
+
+
+class Command(BaseCommand):
+    help = '模拟多个 worker 进程并发写库，输出写入吞吐量、延迟分位数和锁等待失败次数'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4, help='并发写入的进程数（默认 4）')
+        parser.add_argument('--operations', type=int, default=300, help='每个进程执行的操作数（默认 300）')
+        parser.add_argument('--seed', type=int, default=0, help='随机种子（默认 0）')
+        parser.add_argument('--output', help='同时把结果写入 JSON 文件')
+
+    def handle(self, *args, **options):
+        try:
+            result = benchmark.run_write_contention(
+                processes=options['processes'],
+                operations=options['operations'],
+                seed=options['seed'],
+            )
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        pragmas = '，'.join(f'{name}={value}' for name, value in result['pragmas'].items()) or '无'
+        self.stdout.write(f'数据库后端 {result["engine"]}，PRAGMA：{pragmas}')
+        self.stdout.write(
+            f'{result["processes"]} 个进程共 {result["requests"]} 次操作，失败 {result["errors"]} 次，'
+            f'p50 {result["p50_ms"] or 0:.1f}ms  p95 {result["p95_ms"] or 0:.1f}ms  p99 {result["p99_ms"] or 0:.1f}ms'
+        )
+        if options['output']:
+            benchmark.write_report(result, options['output'])
+        self.stdout.write(self.style.SUCCESS(f'吞吐量 {result["requests_per_second"]:.1f} 次/秒'))
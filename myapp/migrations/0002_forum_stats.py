@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:18
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def populate_forum_stats(apps, schema_editor):
+    Forum = apps.get_model('myapp', 'Forum')
+    Post = apps.get_model('myapp', 'Post')
+    visible_posts = Post.objects.filter(forum=OuterRef('pk'), is_deleted=False)
+    latest_posts = visible_posts.order_by('-created_at', '-pk')
+    post_counts = visible_posts.order_by().values('forum').annotate(total=Count('pk')).values('total')
+    Forum.objects.update(
+        post_count=Coalesce(Subquery(post_counts), 0),
+        last_post=Subquery(latest_posts.values('pk')[:1]),
+        last_post_at=Subquery(latest_posts.values('created_at')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='forum',
+            name='last_post',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='myapp.post', verbose_name='最新帖子'),
+        ),
+        migrations.AddField(
+            model_name='forum',
+            name='last_post_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='最新发帖时间'),
+        ),
+        migrations.AddField(
+            model_name='forum',
+            name='post_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='帖子数'),
+        ),
+        migrations.RunPython(populate_forum_stats, migrations.RunPython.noop),
+    ]
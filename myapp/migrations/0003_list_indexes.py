@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0002_forum_stats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['recipient', '-created_at'], name='notification_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', '-created_at'], name='notification_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['forum', 'status', '-is_top', '-last_reply_at', '-created_at'], name='post_forum_latest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['forum', 'status', '-reply_count', '-view_count', '-created_at'], name='post_forum_hot_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reply',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['post', 'created_at'], name='reply_post_created_idx'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+import re
+
+from django.db import migrations
+from django.utils.html import strip_tags
+
+# 建立索引时的分词规则（myapp.search.segment 在本迁移编写时的实现）。
+# 迁移不引用应用代码，以后修改或移动 myapp.search 不会影响本迁移；
+# 分词规则改变后，已有索引用 rebuild_search_index 命令重建
+_CJK_RANGES = (
+    '\u3040-\u30ff'  # 日文假名
+    '\u3400-\u4dbf'  # 中日韩统一表意文字扩展A
+    '\u4e00-\u9fff'  # 中日韩统一表意文字
+    '\uf900-\ufaff'  # 中日韩兼容表意文字
+    '\uac00-\ud7af'  # 韩文音节
+)
+_TOKEN_RE = re.compile(rf'[{_CJK_RANGES}]|[^\W_{_CJK_RANGES}]+')
+
+
+def segment(text):
+    """中日韩文字每字一个词，其他按单词切分并转为小写，以空格连接"""
+    return ' '.join(token.lower() for token in _TOKEN_RE.findall(strip_tags(text or '')))
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    Post = apps.get_model('myapp', 'Post')
+    posts = Post.objects.filter(is_deleted=False).order_by().values_list('pk', 'title', 'content')
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            try:
+                cursor.execute('CREATE VIRTUAL TABLE myapp_post_fts USING fts5(title, content)')
+            except Exception:
+                # SQLite 未编译 FTS5 时不建立索引，搜索会退回 icontains 查询
+                return
+            insert_sql = 'INSERT INTO myapp_post_fts (rowid, title, content) VALUES (%s, %s, %s)'
+        elif connection.vendor == 'postgresql':
+            cursor.execute(
+                'CREATE TABLE myapp_post_fts ('
+                'post_id bigint PRIMARY KEY REFERENCES myapp_post (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+                'document tsvector NOT NULL)'
+            )
+            cursor.execute('CREATE INDEX myapp_post_fts_document_idx ON myapp_post_fts USING GIN (document)')
+            insert_sql = (
+                "INSERT INTO myapp_post_fts (post_id, document) VALUES (%s, "
+                "setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'B'))"
+            )
+        else:
+            return
+
+        rows = [(pk, segment(title), segment(content)) for pk, title, content in posts.iterator()]
+        if rows:
+            cursor.executemany(insert_sql, rows)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute('DROP TABLE IF EXISTS myapp_post_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0003_list_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
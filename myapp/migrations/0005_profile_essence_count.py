@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:24
+
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_profile_stats(apps, schema_editor):
+    UserProfile = apps.get_model('myapp', 'UserProfile')
+    Post = apps.get_model('myapp', 'Post')
+    Reply = apps.get_model('myapp', 'Reply')
+
+    def count_of(queryset):
+        counts = queryset.order_by().values('author').annotate(total=Count('pk')).values('total')
+        return Coalesce(Subquery(counts), 0)
+
+    posts = Post.objects.filter(author=OuterRef('user'), is_deleted=False)
+    replies = Reply.objects.filter(author=OuterRef('user'), is_deleted=False)
+    UserProfile.objects.update(
+        post_count=count_of(posts),
+        reply_count=count_of(replies),
+        essence_count=count_of(posts.filter(is_essence=True)),
+    )
+    UserProfile.objects.update(reputation=F('post_count') * 2 + F('reply_count') + F('essence_count') * 10)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0004_post_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='essence_count',
+            field=models.IntegerField(default=0, verbose_name='精华帖数'),
+        ),
+        migrations.RunPython(populate_profile_stats, migrations.RunPython.noop),
+    ]
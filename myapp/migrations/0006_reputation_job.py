@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:25
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('myapp', '0005_profile_essence_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReputationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('requested_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='请求时间')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='用户')),
+            ],
+            options={
+                'verbose_name': '声望重算任务',
+                'verbose_name_plural': '声望重算任务',
+            },
+        ),
+    ]
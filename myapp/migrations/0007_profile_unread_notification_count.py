@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:29
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_unread_counts(apps, schema_editor):
+    UserProfile = apps.get_model('myapp', 'UserProfile')
+    Notification = apps.get_model('myapp', 'Notification')
+
+    unread = (
+        Notification.objects.filter(recipient=OuterRef('user'), is_read=False)
+        .order_by()
+        .values('recipient')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    UserProfile.objects.update(unread_notification_count=Coalesce(Subquery(unread), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0006_reputation_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='unread_notification_count',
+            field=models.IntegerField(default=0, verbose_name='未读通知数'),
+        ),
+        migrations.RunPython(populate_unread_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0007_profile_unread_notification_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='aggregate_count',
+            field=models.PositiveIntegerField(default=1, verbose_name='合并条数'),
+        ),
+    ]
@@ -0,0 +1,113 @@
+# Generated by Django 4.2.30 on 2026-10-17 21:10
+
+from django.db import migrations
+
+
+# 迁移时写入的初始主题（myapp.theme_seed 在本迁移编写时的数据）。
+# 迁移不引用应用代码，以后修改 theme_seed 不会改变新数据库上执行本迁移的结果
+DEFAULT_THEMES = [
+    {
+        'identifier': 'light',
+        'name': '浅色主题',
+        'is_active': True,
+        'variables': {
+            'primary': '#007bff',
+            'secondary': '#6c757d',
+            'background': '#ffffff',
+            'text': '#212529',
+            'border': '#dee2e6',
+            'shadow': 'rgba(0, 0, 0, 0.1)',
+            'card-bg': '#ffffff',
+            'navbar-bg': '#f8f9fa',
+            'navbar-text': '#212529',
+            'footer-bg': '#f8f9fa',
+            'footer-text': '#212529',
+        },
+    },
+    {
+        'identifier': 'dark',
+        'name': '暗色主题',
+        'is_active': False,
+        'variables': {
+            'primary': '#0d6efd',
+            'secondary': '#6c757d',
+            'background': '#121212',
+            'text': '#ffffff',
+            'border': '#404040',
+            'shadow': 'rgba(0, 0, 0, 0.3)',
+            'card-bg': '#1e1e1e',
+            'navbar-bg': '#343a40',
+            'navbar-text': '#ffffff',
+            'footer-bg': '#343a40',
+            'footer-text': '#ffffff',
+        },
+    },
+    {
+        'identifier': 'blue',
+        'name': '蓝色主题',
+        'is_active': False,
+        'variables': {
+            'primary': '#0056b3',
+            'secondary': '#6c757d',
+            'background': '#f8faff',
+            'text': '#212529',
+            'border': '#b3d7ff',
+            'shadow': 'rgba(0, 86, 179, 0.1)',
+            'card-bg': '#ffffff',
+            'navbar-bg': '#0056b3',
+            'navbar-text': '#ffffff',
+            'footer-bg': '#e6f2ff',
+            'footer-text': '#212529',
+        },
+    },
+    {
+        'identifier': 'green',
+        'name': '绿色主题',
+        'is_active': False,
+        'variables': {
+            'primary': '#28a745',
+            'secondary': '#6c757d',
+            'background': '#f8fff9',
+            'text': '#212529',
+            'border': '#c3e6cb',
+            'shadow': 'rgba(40, 167, 69, 0.1)',
+            'card-bg': '#ffffff',
+            'navbar-bg': '#28a745',
+            'navbar-text': '#ffffff',
+            'footer-bg': '#e6f7ec',
+            'footer-text': '#212529',
+        },
+    },
+]
+
+
+def seed_themes(apps, schema_editor):
+    # 初始主题原先在每次进程启动时由 MyappConfig.ready 创建，现在只在迁移时写入一次；
+    # 已存在的主题不会重复创建，只有在没有任何激活主题时才激活浅色主题
+    Theme = apps.get_model('myapp', 'Theme')
+    ThemeVariable = apps.get_model('myapp', 'ThemeVariable')
+
+    existing = set(Theme.objects.values_list('identifier', flat=True))
+    has_active = Theme.objects.filter(is_active=True).exists()
+    for spec in DEFAULT_THEMES:
+        if spec['identifier'] in existing:
+            continue
+        theme = Theme.objects.create(
+            name=spec['name'],
+            identifier=spec['identifier'],
+            is_active=spec['is_active'] and not has_active,
+        )
+        ThemeVariable.objects.bulk_create(
+            ThemeVariable(theme=theme, name=name, value=value) for name, value in spec['variables'].items()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0008_notification_aggregate_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_themes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:52
+
+from django.db import migrations, models
+from django.utils.html import linebreaks, strip_tags
+
+
+def render_existing(apps, schema_editor):
+    # 模板改为直接输出 excerpt / content_html，已有数据按主键分批生成；
+    # 渲染规则固定为本迁移编写时的版本，之后 rendering.py 的修改不影响这里
+    def excerpt(content, length):
+        text = strip_tags(content)
+        return text if len(text) <= length else text[:length] + '...'
+
+    for name, length in (('Post', 100), ('Reply', 50)):
+        model = apps.get_model('myapp', name)
+        queryset = model.objects.order_by('pk').only('pk', 'content')
+        last_pk = 0
+        while True:
+            rows = list(queryset.filter(pk__gt=last_pk)[:500])
+            if not rows:
+                break
+            for row in rows:
+                row.excerpt = excerpt(row.content, length)
+                row.content_html = linebreaks(row.content, autoescape=True)
+            model.objects.bulk_update(rows, ['excerpt', 'content_html'])
+            last_pk = rows[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0009_seed_themes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='content_html',
+            field=models.TextField(blank=True, editable=False, verbose_name='渲染后的内容'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='excerpt',
+            field=models.CharField(blank=True, editable=False, max_length=103, verbose_name='摘要'),
+        ),
+        migrations.AddField(
+            model_name='reply',
+            name='content_html',
+            field=models.TextField(blank=True, editable=False, verbose_name='渲染后的内容'),
+        ),
+        migrations.AddField(
+            model_name='reply',
+            name='excerpt',
+            field=models.CharField(blank=True, editable=False, max_length=53, verbose_name='摘要'),
+        ),
+        migrations.RunPython(render_existing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:56
+
+import math
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import migrations, models
+
+# 热度公式（myapp.hot 在本迁移编写时的权重和半衰期）。迁移不引用应用代码，
+# 以后调整公式后由 refresh_hot_scores 命令重算
+REPLY_WEIGHT = 5
+VIEW_WEIGHT = 0.1
+ESSENCE_WEIGHT = 25
+HALF_LIFE_HOURS = 24
+EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def hot_score(post):
+    weight = (
+        1 + post.reply_count * REPLY_WEIGHT + post.view_count * VIEW_WEIGHT
+        + (ESSENCE_WEIGHT if post.is_essence else 0)
+    )
+    hours = ((post.last_reply_at or post.created_at) - EPOCH).total_seconds() / 3600
+    return math.log10(weight) + hours / HALF_LIFE_HOURS * math.log10(2)
+
+
+def compute_hot_scores(apps, schema_editor):
+    # 热门排序改为按 hot_score，已有帖子需要先算出热度；按主键分批读取和写回
+    Post = apps.get_model('myapp', 'Post')
+    queryset = Post.objects.order_by('pk').only(
+        'pk', 'reply_count', 'view_count', 'is_essence', 'created_at', 'last_reply_at'
+    )
+    last_pk = 0
+    while True:
+        posts = list(queryset.filter(pk__gt=last_pk)[:500])
+        if not posts:
+            return
+        for post in posts:
+            post.hot_score = hot_score(post)
+        Post.objects.bulk_update(posts, ['hot_score'])
+        last_pk = posts[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0010_rendered_content'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='post',
+            name='post_forum_hot_idx',
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='hot_score',
+            field=models.FloatField(default=0, editable=False, verbose_name='热度'),
+        ),
+        migrations.RunPython(compute_hot_scores, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['forum', 'status', '-hot_score', '-id'], name='post_forum_hot_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-17 21:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0011_post_hot_score'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='notification_recent_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='post',
+            name='post_forum_latest_idx',
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', '-created_at', '-id'], name='notification_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['forum', 'status', '-is_top', '-last_reply_at', '-created_at', '-id'], name='post_forum_latest_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-17 21:25
+
+from django.db import migrations, models
+import myapp.pagination
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0012_keyset_index_tiebreak'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='post',
+            name='post_forum_latest_idx',
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=myapp.pagination.KeysetIndex(condition=models.Q(('is_deleted', False)), fields=['forum', 'status', '-is_top', '-last_reply_at', '-created_at', '-id'], name='post_forum_latest_idx'),
+        ),
+    ]
@@ -1,9 +1,13 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest
 from django.contrib.auth.models import User
 from django.utils import timezone
-from django.utils.html import strip_tags
 from django.urls import reverse
 
+from . import hot, rendering
+from .pagination import KeysetIndex
+
 
 class Theme(models.Model):
     """
@@ -29,6 +33,9 @@ class Theme(models.Model):
             Theme.objects.filter(is_active=True).update(is_active=False)
         super().save(*args, **kwargs)
 
+        from .theme_cache import invalidate_theme_cache
+        invalidate_theme_cache()
+
 
 class ThemeVariable(models.Model):
     """
@@ -68,6 +75,11 @@ class Forum(models.Model):
     order = models.IntegerField(choices=ORDER_CHOICES, default=1, verbose_name="排序")
     is_active = models.BooleanField(default=True, verbose_name="是否启用")
     moderator_only = models.BooleanField(default=False, verbose_name="仅管理员可见")
+    # 以下为冗余统计字段，由帖子的创建、删除和恢复维护，可用 rebuild_forum_stats 命令重建
+    post_count = models.IntegerField(default=0, editable=False, verbose_name="帖子数")
+    last_post = models.ForeignKey('Post', on_delete=models.SET_NULL, blank=True, null=True,
+                                  editable=False, related_name='+', verbose_name="最新帖子")
+    last_post_at = models.DateTimeField(blank=True, null=True, editable=False, verbose_name="最新发帖时间")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
     
@@ -80,12 +92,60 @@ class Forum(models.Model):
         return self.name
     
     def get_post_count(self):
-        """获取板块内的帖子总数"""
+        """获取板块内的帖子总数（实时统计，列表页请使用 post_count 字段）"""
         return self.posts.filter(is_deleted=False).count()
     
     def get_last_post(self):
-        """获取板块内最新的帖子"""
+        """获取板块内最新的帖子（实时查询，列表页请使用 last_post_at 字段）"""
         return self.posts.filter(is_deleted=False).order_by('-created_at').first()
+    
+    @staticmethod
+    def _latest_post_subquery(field):
+        """板块内最新未删除帖子的某个字段，用于关联子查询"""
+        posts = Post.objects.filter(forum=OuterRef('pk'), is_deleted=False).order_by('-created_at', '-pk')
+        return Subquery(posts.values(field)[:1])
+    
+    @classmethod
+    def record_post_added(cls, post):
+        """帖子新增或恢复后更新板块统计"""
+        forums = cls.objects.filter(pk=post.forum_id)
+        forums.update(post_count=F('post_count') + 1)
+        forums.filter(
+            Q(last_post_at__isnull=True) | Q(last_post_at__lte=post.created_at)
+        ).update(last_post=post, last_post_at=post.created_at)
+    
+    @classmethod
+    def record_post_removed(cls, post):
+        """帖子删除（含软删除）后更新板块统计，只有删除的是最新帖子时才重新查找最新帖子"""
+        forums = cls.objects.filter(pk=post.forum_id)
+        forums.filter(post_count__gt=0).update(post_count=F('post_count') - 1)
+        forums.filter(Q(last_post=post) | Q(last_post__isnull=True)).update(
+            last_post=cls._latest_post_subquery('pk'),
+            last_post_at=cls._latest_post_subquery('created_at'),
+        )
+    
+    @classmethod
+    def touch(cls, forum_id):
+        """
+        板块列表显示的帖子或回复变化后更新 updated_at
+
+        板块页的条件请求以板块行为验证值，其他进程中的写入也能使其失效（片段缓存的版本号可能只在本进程内）。
+        """
+        cls.objects.filter(pk=forum_id).update(updated_at=timezone.now())
+    
+    @classmethod
+    def rebuild_stats(cls, queryset=None):
+        """使用一条 UPDATE 语句重新计算板块统计，返回更新的板块数"""
+        if queryset is None:
+            queryset = cls.objects.all()
+        post_counts = Post.objects.filter(
+            forum=OuterRef('pk'), is_deleted=False
+        ).order_by().values('forum').annotate(total=Count('pk')).values('total')
+        return queryset.update(
+            post_count=Coalesce(Subquery(post_counts), 0),
+            last_post=cls._latest_post_subquery('pk'),
+            last_post_at=cls._latest_post_subquery('created_at'),
+        )
 
 
 class Post(models.Model):
@@ -98,10 +158,24 @@ class Post(models.Model):
         ('hidden', '已隐藏'),
     ]
     
+    # 帖子列表的排序（游标分页使用，最后一项保证顺序唯一）
+    LATEST_ORDERING = ('-is_top', '-last_reply_at', '-created_at', '-id')
+    HOT_ORDERING = ('-hot_score', '-id')
+    # 帖子列表显示的字段（rows.as_rows 使用），包含上面两种排序的全部字段，不含正文
+    LIST_FIELDS = (
+        'id', 'title', 'excerpt', 'status', 'is_top', 'is_essence', 'view_count', 'reply_count',
+        'hot_score', 'created_at', 'last_reply_at', 'author_id', 'author__username',
+    )
+    # 参与热度计算的计数和时间字段，保存其中任何一个时按实例的值重新计算热度
+    HOT_FIELDS = frozenset({'reply_count', 'view_count', 'last_reply_at', 'created_at'})
+    
     forum = models.ForeignKey(Forum, on_delete=models.CASCADE, related_name='posts', verbose_name="所属板块")
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='posts', verbose_name="作者")
     title = models.CharField(max_length=200, verbose_name="帖子标题")
     content = models.TextField(verbose_name="帖子内容")
+    # 保存时由 content 生成（见 rendering.py），列表页和详情页不再处理正文
+    excerpt = models.CharField(max_length=rendering.POST_EXCERPT_LENGTH + 3, blank=True, editable=False, verbose_name="摘要")
+    content_html = models.TextField(blank=True, editable=False, verbose_name="渲染后的内容")
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='published', verbose_name="状态")
     is_top = models.BooleanField(default=False, verbose_name="是否置顶")
     is_essence = models.BooleanField(default=False, verbose_name="是否精华")
@@ -109,6 +183,8 @@ class Post(models.Model):
     view_count = models.IntegerField(default=0, verbose_name="浏览次数")
     reply_count = models.IntegerField(default=0, verbose_name="回复次数")
     last_reply_at = models.DateTimeField(blank=True, null=True, verbose_name="最后回复时间")
+    # 随时间衰减的热度（见 hot.py），热门排序使用
+    hot_score = models.FloatField(default=0, editable=False, verbose_name="热度")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
     
@@ -116,24 +192,93 @@ class Post(models.Model):
         verbose_name = "帖子"
         verbose_name_plural = "帖子"
         ordering = ['-is_top', '-last_reply_at', '-created_at']
+        indexes = [
+            # 板块帖子列表：按 (forum, status) 过滤，分别按“最新回复”和热度排序
+            # 最后回复时间可为空，按游标分页的“空值在最后”建立索引
+            KeysetIndex(
+                fields=['forum', 'status', '-is_top', '-last_reply_at', '-created_at', '-id'],
+                condition=Q(is_deleted=False),
+                name='post_forum_latest_idx',
+            ),
+            models.Index(
+                fields=['forum', 'status', '-hot_score', '-id'],
+                condition=Q(is_deleted=False),
+                name='post_forum_hot_idx',
+            ),
+        ]
     
     def __str__(self):
         return self.title
     
-    def get_excerpt(self, length=100):
-        """获取帖子内容摘要"""
-        content = strip_tags(self.content)
-        if len(content) <= length:
-            return content
-        return content[:length] + '...'
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 记录从数据库加载时的删除和精华状态，用于在保存时计算统计数据的增量
+        instance._loaded_is_deleted = instance.__dict__.get('is_deleted')
+        instance._loaded_is_essence = instance.__dict__.get('is_essence')
+        return instance
+    
+    def save(self, *args, **kwargs):
+        rendering.prepare_save(self, rendering.POST_EXCERPT_LENGTH, kwargs)
+        update_fields = kwargs.get('update_fields')
+        rescore = update_fields is None or bool(self.HOT_FIELDS.intersection(update_fields))
+        if rescore:
+            self.hot_score = hot.score_post(self)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'hot_score'}
+        # 帖子本身与板块、作者统计（见模型信号处理）在同一事务中更新
+        with transaction.atomic():
+            if not rescore and 'is_essence' in update_fields and self.pk is not None:
+                # 只改精华状态时按数据库中的计数调整热度，实例中的计数可能已经过期
+                Post.objects.filter(pk=self.pk).update(hot_score=hot.adjusted(is_essence=self.is_essence))
+            super().save(*args, **kwargs)
+        self._loaded_is_deleted = self.is_deleted
+        self._loaded_is_essence = self.is_essence
+    
+    def get_excerpt(self, length=rendering.POST_EXCERPT_LENGTH):
+        """获取帖子内容摘要，默认长度直接使用保存时生成的摘要"""
+        if length == rendering.POST_EXCERPT_LENGTH and self.excerpt:
+            return self.excerpt
+        return rendering.make_excerpt(self.content, length)
     
-    def increase_view_count(self):
-        """增加浏览次数"""
-        self.view_count += 1
-        self.save(update_fields=['view_count'])
+    def increase_view_count(self, count=1):
+        """
+        直接增加浏览次数（原子更新）
+
+        帖子详情页使用 view_counter.record_view 缓冲计数，这里仅用于需要立即生效的场景。
+        """
+        Post.objects.filter(pk=self.pk).update(
+            view_count=F('view_count') + count,
+            hot_score=hot.adjusted(view_count=F('view_count') + count),
+        )
+        self.view_count += count
+    
+    @classmethod
+    def record_reply_added(cls, reply):
+        """新增回复后原子更新回复数、最后回复时间和热度"""
+        # 恢复旧回复时不能把最后回复时间往回改
+        is_latest = Q(last_reply_at__isnull=True) | Q(last_reply_at__lt=reply.created_at)
+        reply_count = F('reply_count') + 1
+        cls.objects.filter(pk=reply.post_id).update(
+            reply_count=reply_count,
+            last_reply_at=Case(When(is_latest, then=Value(reply.created_at)), default=F('last_reply_at')),
+            hot_score=Case(
+                When(is_latest, then=hot.bumped(reply.created_at, reply_count=reply_count)),
+                default=hot.adjusted(reply_count=reply_count),
+            ),
+        )
+    
+    @classmethod
+    def record_reply_removed(cls, reply):
+        """删除回复后原子更新回复数和热度"""
+        reply_count = Greatest(F('reply_count') - 1, 0)
+        cls.objects.filter(pk=reply.post_id).update(
+            reply_count=reply_count,
+            hot_score=hot.adjusted(reply_count=reply_count),
+        )
     
     def update_reply_count(self):
-        """更新回复数量"""
+        """重新统计回复数量（实时统计，日常更新请使用 record_reply_added / record_reply_removed）"""
         self.reply_count = self.replies.filter(is_deleted=False).count()
         if self.reply_count > 0:
             self.last_reply_at = self.replies.latest('created_at').created_at
@@ -151,6 +296,9 @@ class Reply(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='replies', verbose_name="所属帖子")
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='replies', verbose_name="作者")
     content = models.TextField(verbose_name="回复内容")
+    # 保存时由 content 生成（见 rendering.py）
+    excerpt = models.CharField(max_length=rendering.REPLY_EXCERPT_LENGTH + 3, blank=True, editable=False, verbose_name="摘要")
+    content_html = models.TextField(blank=True, editable=False, verbose_name="渲染后的内容")
     parent_reply = models.ForeignKey('self', on_delete=models.CASCADE, blank=True, null=True, 
                                    related_name='child_replies', verbose_name="父回复")
     is_deleted = models.BooleanField(default=False, verbose_name="是否删除")
@@ -161,16 +309,36 @@ class Reply(models.Model):
         verbose_name = "回复"
         verbose_name_plural = "回复"
         ordering = ['created_at']
+        indexes = [
+            # 帖子详情页的回复列表
+            models.Index(
+                fields=['post', 'created_at'],
+                condition=Q(is_deleted=False),
+                name='reply_post_created_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.author.username}的回复"
     
-    def get_excerpt(self, length=50):
-        """获取回复内容摘要"""
-        content = strip_tags(self.content)
-        if len(content) <= length:
-            return content
-        return content[:length] + '...'
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_is_deleted = instance.__dict__.get('is_deleted')
+        return instance
+    
+    def save(self, *args, **kwargs):
+        rendering.prepare_save(self, rendering.REPLY_EXCERPT_LENGTH, kwargs)
+        # 回复本身与帖子、作者统计在同一事务中更新
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+        self._loaded_is_deleted = self.is_deleted
+    
+    def get_excerpt(self, length=rendering.REPLY_EXCERPT_LENGTH):
+        """获取回复内容摘要，默认长度直接使用保存时生成的摘要"""
+        if length == rendering.REPLY_EXCERPT_LENGTH and self.excerpt:
+            return self.excerpt
+        return rendering.make_excerpt(self.content, length)
 
 
 class UserProfile(models.Model):
@@ -183,7 +351,9 @@ class UserProfile(models.Model):
     signature = models.CharField(max_length=100, blank=True, verbose_name="个性签名")
     post_count = models.IntegerField(default=0, verbose_name="发帖数")
     reply_count = models.IntegerField(default=0, verbose_name="回复数")
+    essence_count = models.IntegerField(default=0, verbose_name="精华帖数")
     reputation = models.IntegerField(default=0, verbose_name="声望值")
+    unread_notification_count = models.IntegerField(default=0, verbose_name="未读通知数")
     last_login_ip = models.GenericIPAddressField(blank=True, null=True, verbose_name="最后登录IP")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
@@ -192,32 +362,142 @@ class UserProfile(models.Model):
         verbose_name = "用户资料"
         verbose_name_plural = "用户资料"
     
+    # 声望值计算规则：发帖数 * 2 + 回复数 * 1 + 精华帖 * 10
+    POST_REPUTATION = 2
+    REPLY_REPUTATION = 1
+    ESSENCE_REPUTATION = 10
+    
+    # 用户可修改的资料字段，参与改动检查；统计字段由 apply_stats_delta 等原子 UPDATE 维护，
+    # 用内存中可能过期的值整行写回会覆盖并发的更新
+    PROFILE_FIELDS = ('avatar', 'bio', 'signature', 'last_login_ip')
+    
     def __str__(self):
         return f"{self.user.username}的资料"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 记录从数据库加载时的资料字段，保存时只写回有改动的字段
+        instance._loaded_profile = instance._profile_state()
+        return instance
+    
+    def _profile_state(self):
+        """当前已加载的资料字段值（头像取文件名），延迟加载的字段不包含在内"""
+        return {
+            name: getattr(self.__dict__[name], 'name', self.__dict__[name])
+            for name in self.PROFILE_FIELDS
+            if name in self.__dict__
+        }
+    
+    def get_dirty_fields(self):
+        """加载后被修改过的资料字段"""
+        loaded = getattr(self, '_loaded_profile', None)
+        current = self._profile_state()
+        if loaded is None:
+            return list(current)
+        return [name for name, value in current.items() if loaded.get(name, value) != value]
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        state = self._profile_state()
+        if update_fields is None:
+            self._loaded_profile = state
+        else:
+            loaded = getattr(self, '_loaded_profile', {})
+            loaded.update((name, value) for name, value in state.items() if name in update_fields)
+            self._loaded_profile = loaded
+    
+    def save_if_changed(self):
+        """只写回有改动的资料字段，没有改动时不访问数据库，返回是否写入"""
+        if self._state.adding:
+            self.save()
+            return True
+        dirty = self.get_dirty_fields()
+        if not dirty:
+            return False
+        self.save(update_fields=[*dirty, 'updated_at'])
+        return True
+    
+    @classmethod
+    def apply_stats_delta(cls, user_id, posts=0, replies=0, essences=0):
+        """
+        用一条 UPDATE 语句原子地调整用户统计和声望值
+        
+        各项增量可正可负，结果不会小于 0。
+        """
+        if not (posts or replies or essences):
+            return
+        reputation = (
+            posts * cls.POST_REPUTATION
+            + replies * cls.REPLY_REPUTATION
+            + essences * cls.ESSENCE_REPUTATION
+        )
+        updates = {'reputation': Greatest(F('reputation') + reputation, 0)}
+        if posts:
+            updates['post_count'] = Greatest(F('post_count') + posts, 0)
+        if replies:
+            updates['reply_count'] = Greatest(F('reply_count') + replies, 0)
+        if essences:
+            updates['essence_count'] = Greatest(F('essence_count') + essences, 0)
+        cls.objects.filter(user_id=user_id).update(**updates)
+        
+        # 减少时计数可能被截断为 0，安排一次异步精确重算；
+        # 删除用户时其帖子和回复级联删除也会走到这里，等事务提交后再安排，已删除的用户会被跳过
+        if posts < 0 or replies < 0 or essences < 0:
+            transaction.on_commit(lambda: ReputationJob.schedule([user_id]))
+    
     def increase_post_count(self):
         """增加发帖数"""
+        UserProfile.apply_stats_delta(self.user_id, posts=1)
         self.post_count += 1
-        self.save(update_fields=['post_count'])
+        self.reputation += self.POST_REPUTATION
     
     def increase_reply_count(self):
         """增加回复数"""
+        UserProfile.apply_stats_delta(self.user_id, replies=1)
         self.reply_count += 1
-        self.save(update_fields=['reply_count'])
+        self.reputation += self.REPLY_REPUTATION
     
     def calculate_reputation(self):
-        """计算声望值"""
-        # 声望值计算规则：发帖数 * 2 + 回复数 * 1 + 精华帖 * 10
-        essence_bonus = Post.objects.filter(
-            author=self.user, 
-            is_essence=True, 
-            is_deleted=False
-        ).count() * 10
-        
-        self.reputation = self.post_count * 2 + self.reply_count + essence_bonus
+        """根据当前统计重新计算声望值"""
+        self.reputation = (
+            self.post_count * self.POST_REPUTATION
+            + self.reply_count * self.REPLY_REPUTATION
+            + self.essence_count * self.ESSENCE_REPUTATION
+        )
         self.save(update_fields=['reputation'])
 
 
+class ReputationJob(models.Model):
+    """
+    待重新计算声望值的用户队列
+    
+    同一用户只保留一条记录，多次请求合并为一次重算，由 recompute_reputation --pending 处理。
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='+', verbose_name="用户")
+    requested_at = models.DateTimeField(default=timezone.now, verbose_name="请求时间")
+    
+    class Meta:
+        verbose_name = "声望重算任务"
+        verbose_name_plural = "声望重算任务"
+    
+    def __str__(self):
+        return f"重算 {self.user_id} 的声望值"
+    
+    @classmethod
+    def schedule(cls, user_ids):
+        """安排重算；已在队列中的用户只刷新请求时间，不存在的用户跳过"""
+        now = timezone.now()
+        existing = User.objects.filter(pk__in=set(user_ids)).values_list('pk', flat=True)
+        cls.objects.bulk_create(
+            [cls(user_id=user_id, requested_at=now) for user_id in existing],
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=['requested_at'],
+        )
+
+
 class Notification(models.Model):
     """
     通知模型
@@ -228,6 +508,11 @@ class Notification(models.Model):
         ('system', '系统通知'),
     ]
     
+    # 通知列表的排序（游标分页使用）
+    LIST_ORDERING = ('-created_at', '-id')
+    # 通知列表显示的字段（rows.as_rows 使用）
+    LIST_FIELDS = ('id', 'title', 'content', 'url', 'is_read', 'aggregate_count', 'created_at')
+    
     recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications', verbose_name="接收者")
     sender = models.ForeignKey(User, on_delete=models.CASCADE, blank=True, null=True, related_name='sent_notifications', verbose_name="发送者")
     notification_type = models.CharField(max_length=20, choices=NOTIFICATION_TYPES, verbose_name="通知类型")
@@ -235,15 +520,48 @@ class Notification(models.Model):
     content = models.TextField(verbose_name="通知内容")
     url = models.CharField(max_length=200, blank=True, verbose_name="跳转链接")
     is_read = models.BooleanField(default=False, verbose_name="是否已读")
+    aggregate_count = models.PositiveIntegerField(default=1, verbose_name="合并条数")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
     
     class Meta:
         verbose_name = "通知"
         verbose_name_plural = "通知"
         ordering = ['-created_at']
+        indexes = [
+            # 未读通知计数（部分索引，只包含未读通知）与通知列表
+            models.Index(
+                fields=['recipient', '-created_at'],
+                condition=Q(is_read=False),
+                name='notification_unread_idx',
+            ),
+            models.Index(fields=['recipient', '-created_at', '-id'], name='notification_recent_idx'),
+        ]
     
     def __str__(self):
         return f"{self.recipient.username} - {self.title}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 记录从数据库加载时的已读状态，用于在保存时调整未读计数
+        instance._loaded_is_read = instance.__dict__.get('is_read')
+        return instance
+    
+    def save(self, *args, **kwargs):
+        # 通知本身与接收者的未读计数（见模型信号处理）在同一事务中更新
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+        self._loaded_is_read = self.is_read
+    
+    @classmethod
+    def mark_all_read(cls, user):
+        """把用户的全部未读通知标为已读，返回标记的条数"""
+        from .notification_counter import adjust
+        
+        with transaction.atomic():
+            count = cls.objects.filter(recipient=user, is_read=False).update(is_read=True)
+            adjust({user.pk: -count})
+        return count
 
 
 # ==================== 模型信号处理 ====================
@@ -252,6 +570,15 @@ from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
 
+@receiver(post_delete, sender=Theme)
+@receiver(post_save, sender=ThemeVariable)
+@receiver(post_delete, sender=ThemeVariable)
+def invalidate_theme(sender, instance, **kwargs):
+    """主题或主题变量变更时清除主题缓存"""
+    from .theme_cache import invalidate_theme_cache
+    invalidate_theme_cache()
+
+
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     """当创建用户时自动创建用户资料"""
@@ -260,47 +587,156 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    """当保存用户时保存用户资料"""
-    if hasattr(instance, 'profile'):
-        instance.profile.save()
+def save_user_profile(sender, instance, created, **kwargs):
+    """
+    保存用户时一并保存已加载且有改动的用户资料
+
+    登录（更新 last_login）、修改密码等只保存 User 的操作不会查询或写入资料。
+    """
+    if not created and User.profile.is_cached(instance):
+        instance.profile.save_if_changed()
+
+
+def _loaded_value(instance, field, created, default_when_created):
+    """获取实例从数据库加载时某字段的值；新建的实例视为 default_when_created"""
+    if created:
+        return default_when_created
+    value = getattr(instance, f'_loaded_{field}', None)
+    return getattr(instance, field) if value is None else value
 
 
 @receiver(post_save, sender=Post)
 def update_post_count(sender, instance, created, **kwargs):
-    """发帖时更新用户统计"""
-    if created and not instance.is_deleted:
-        profile = instance.author.profile
-        profile.increase_post_count()
-        profile.calculate_reputation()
+    """发帖、软删除、恢复和设置精华时用一条语句更新作者统计"""
+    was_visible = not _loaded_value(instance, 'is_deleted', created, True)
+    was_essence = was_visible and _loaded_value(instance, 'is_essence', created, False)
+    is_visible = not instance.is_deleted
+    is_essence = is_visible and instance.is_essence
+    
+    UserProfile.apply_stats_delta(
+        instance.author_id,
+        posts=int(is_visible) - int(was_visible),
+        essences=int(is_essence) - int(was_essence),
+    )
 
 
 @receiver(post_delete, sender=Post)
 def decrease_post_count(sender, instance, **kwargs):
-    """删帖时更新用户统计"""
+    """物理删帖时更新作者统计"""
+    if not instance.is_deleted:
+        UserProfile.apply_stats_delta(
+            instance.author_id,
+            posts=-1,
+            essences=-1 if instance.is_essence else 0,
+        )
+
+
+@receiver(post_save, sender=Post)
+def update_forum_stats(sender, instance, created, **kwargs):
+    """发帖、软删除和恢复帖子时更新板块统计"""
+    was_deleted = _loaded_value(instance, 'is_deleted', created, True)
+    
+    if was_deleted and not instance.is_deleted:
+        Forum.record_post_added(instance)
+    elif not was_deleted and instance.is_deleted:
+        Forum.record_post_removed(instance)
+
+
+@receiver(post_delete, sender=Post)
+def decrease_forum_stats(sender, instance, **kwargs):
+    """物理删除帖子时更新板块统计"""
     if not instance.is_deleted:
-        profile = instance.author.profile
-        profile.post_count = max(0, profile.post_count - 1)
-        profile.calculate_reputation()
-        profile.save()
+        Forum.record_post_removed(instance)
+
+
+@receiver(post_save, sender=Post)
+def update_search_index(sender, instance, update_fields=None, **kwargs):
+    """帖子标题、内容或删除状态变化时同步全文索引"""
+    if update_fields is not None and not {'title', 'content', 'is_deleted'} & set(update_fields):
+        return
+    from .search import index_post
+    index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def remove_search_index(sender, instance, **kwargs):
+    """物理删除帖子时移除全文索引"""
+    from .search import remove_post
+    remove_post(instance.pk)
 
 
 @receiver(post_save, sender=Reply)
 def update_reply_count(sender, instance, created, **kwargs):
-    """回复时更新用户和帖子统计"""
-    if created and not instance.is_deleted:
-        # 更新回复者的统计
-        profile = instance.author.profile
-        profile.increase_reply_count()
-        profile.calculate_reputation()
-        
-        # 更新帖子的回复数
-        post = instance.post
-        post.update_reply_count()
-    
-    elif not created:
-        # 删除回复时更新统计
-        profile = instance.author.profile
-        profile.reply_count = max(0, profile.reply_count - 1)
-        profile.calculate_reputation()
-        profile.save()
\ No newline at end of file
+    """回复、软删除和恢复回复时更新作者和帖子统计，每种情况只需两条 UPDATE"""
+    was_deleted = _loaded_value(instance, 'is_deleted', created, True)
+    
+    if was_deleted and not instance.is_deleted:
+        UserProfile.apply_stats_delta(instance.author_id, replies=1)
+        Post.record_reply_added(instance)
+    elif not was_deleted and instance.is_deleted:
+        UserProfile.apply_stats_delta(instance.author_id, replies=-1)
+        Post.record_reply_removed(instance)
+
+
+@receiver(post_delete, sender=Reply)
+def decrease_reply_count(sender, instance, **kwargs):
+    """物理删除回复时更新作者和帖子统计"""
+    if not instance.is_deleted:
+        UserProfile.apply_stats_delta(instance.author_id, replies=-1)
+        Post.record_reply_removed(instance)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_fragments(sender, instance, **kwargs):
+    """帖子发布、编辑、置顶、精华、删除时使帖子页和板块列表的片段缓存失效，并更新板块页的验证值"""
+    from .fragment_cache import bump
+    bump('post', instance.pk)
+    bump('forum', instance.forum_id)
+    Forum.touch(instance.forum_id)
+
+
+@receiver(post_save, sender=Reply)
+@receiver(post_delete, sender=Reply)
+def invalidate_reply_fragments(sender, instance, **kwargs):
+    """
+    回复变化时使回复列表失效；回复数和最后回复时间显示在板块列表中，板块片段也一并失效，
+    并更新板块页的验证值（帖子页的验证值包含回复数和最后回复时间，由 record_reply_* 更新）
+    """
+    from .fragment_cache import bump
+    bump('post', instance.post_id)
+    # 只需要板块 ID，帖子没有随回复加载时只查询这一列，不读取帖子正文
+    if Reply.post.is_cached(instance):
+        forum_id = instance.post.forum_id
+    else:
+        forum_id = Post.objects.filter(pk=instance.post_id).values_list('forum_id', flat=True).first()
+    # 帖子已不存在时由帖子自己的删除信号使板块片段失效
+    if forum_id is not None:
+        bump('forum', forum_id)
+        Forum.touch(forum_id)
+
+
+@receiver(post_save, sender=Notification)
+def publish_new_notification(sender, instance, created, **kwargs):
+    """新通知在事务提交后推送给在线的接收者（先于未读数变化推送）"""
+    if created:
+        from .notification_stream import publish_notification
+        transaction.on_commit(lambda: publish_notification(instance))
+
+
+@receiver(post_save, sender=Notification)
+def update_unread_notification_count(sender, instance, created, **kwargs):
+    """新建通知、标为已读或恢复未读时调整接收者的未读计数"""
+    was_unread = not _loaded_value(instance, 'is_read', created, True)
+    delta = int(not instance.is_read) - int(was_unread)
+    if delta:
+        from .notification_counter import adjust
+        adjust({instance.recipient_id: delta})
+
+
+@receiver(post_delete, sender=Notification)
+def decrease_unread_notification_count(sender, instance, **kwargs):
+    """删除未读通知时减少接收者的未读计数"""
+    if not instance.is_read:
+        from .notification_counter import adjust
+        adjust({instance.recipient_id: -1})
@@ -0,0 +1,111 @@
+"""
+未读通知计数
+
+每个用户的未读通知数保存在 UserProfile.unread_notification_count 中，用 F() 原子增减；
+缓存 ``myapp:notification:unread:<user_id>`` 中保存同一数值，读取时优先命中缓存，
+未命中时读取该字段并回填，不再对通知表执行 COUNT(*)。缓存只在本进程内有效时
+（CACHE_IS_SHARED 为 False），其他进程的失效到达不了这里，直接读取该字段。
+
+单条通知的新建、标为已读和删除由模型信号维护；批量操作（全部标为已读、批量创建通知）
+需要调用 ``adjust``。计数与实际不符时可以用 ``rebuild`` 按通知表重新统计。
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+CACHE_KEY = 'myapp:notification:unread:%s'
+
+
+def _timeout():
+    """缓存过期时间（秒）"""
+    return getattr(settings, 'NOTIFICATION_COUNT_CACHE_TIMEOUT', 60 * 60)
+
+
+def _invalidate(user_ids):
+    # 立即删除一次，事务提交后再删除一次，防止提交前有请求把旧值写回缓存
+    keys = [CACHE_KEY % user_id for user_id in user_ids]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def get_unread_count(user_id):
+    """获取用户的未读通知数"""
+    from .models import UserProfile
+
+    def load():
+        return UserProfile.objects.filter(user_id=user_id).values_list(
+            'unread_notification_count', flat=True
+        ).first() or 0
+
+    if not getattr(settings, 'CACHE_IS_SHARED', False):
+        return load()
+
+    key = CACHE_KEY % user_id
+    count = cache.get(key)
+    if count is None:
+        count = load()
+        cache.set(key, count, _timeout())
+    return count
+
+
+def get_request_unread_count(request):
+    """
+    获取当前请求用户的未读通知数，同一请求内只读取一次
+
+    页面的 ETag 和导航栏角标都使用这个数值，两者始终一致。
+    """
+    if not hasattr(request, '_unread_notification_count'):
+        request._unread_notification_count = get_unread_count(request.user.pk)
+    return request._unread_notification_count
+
+
+def adjust(deltas):
+    """
+    按 {user_id: 增量} 调整未读通知数，结果不会小于 0
+
+    增量相同的用户合并为一条 UPDATE。
+    """
+    from .models import UserProfile
+
+    by_delta = defaultdict(list)
+    for user_id, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(user_id)
+    if not by_delta:
+        return
+
+    for delta, user_ids in by_delta.items():
+        UserProfile.objects.filter(user_id__in=user_ids).update(
+            unread_notification_count=Greatest(F('unread_notification_count') + delta, 0)
+        )
+    changed = [user_id for user_ids in by_delta.values() for user_id in user_ids]
+    _invalidate(changed)
+
+    from .notification_stream import publish_unread_counts
+    transaction.on_commit(lambda: publish_unread_counts(changed))
+
+
+def rebuild(user_ids=None):
+    """按通知表重新统计未读通知数，user_ids 为 None 时统计全部用户，返回更新的行数"""
+    from .models import Notification, UserProfile
+
+    unread = (
+        Notification.objects.filter(recipient=OuterRef('user'), is_read=False)
+        .order_by()
+        .values('recipient')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    profiles = UserProfile.objects.all()
+    if user_ids is not None:
+        profiles = profiles.filter(user_id__in=user_ids)
+    updated = profiles.update(unread_notification_count=Coalesce(Subquery(unread), 0))
+
+    if user_ids is None:
+        user_ids = UserProfile.objects.values_list('user_id', flat=True)
+    _invalidate(list(user_ids))
+    return updated
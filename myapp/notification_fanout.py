@@ -0,0 +1,143 @@
+"""
+通知批量分发
+
+回复通知、@提及通知和系统广播统一经过 ``create_notifications``：按批 bulk_create，
+每批只需一条 INSERT，接收者的未读计数按增量合并为少量 UPDATE，事务提交后推送给在线用户。
+
+bulk_create 不会触发 Notification 的模型信号，未读计数和实时推送都在这里处理。
+"""
+import re
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .models import Notification
+
+# @用户名：与 Django 用户名规则一致（字母、数字和 . + - _），不含 @ 本身
+MENTION_RE = re.compile(r'(?<![\w@])@([\w.+-]+)')
+
+# 单条内容最多通知的提及人数
+MAX_MENTIONS = 20
+
+
+def parse_mentions(text):
+    """按出现顺序提取内容中 @ 的用户名（去重）"""
+    usernames = []
+    for match in MENTION_RE.finditer(text or ''):
+        # 句末的 “.” 通常是标点而不是用户名的一部分
+        username = match.group(1).rstrip('.')
+        if username and username not in usernames:
+            usernames.append(username)
+            if len(usernames) >= MAX_MENTIONS:
+                break
+    return usernames
+
+
+def resolve_mentions(text, exclude=()):
+    """用一次查询把内容中提及的用户名解析为用户 ID，exclude 中的用户不计入"""
+    usernames = parse_mentions(text)
+    if not usernames:
+        return []
+    user_ids = User.objects.filter(username__in=usernames, is_active=True).values_list('pk', flat=True)
+    excluded = set(exclude)
+    return [user_id for user_id in user_ids if user_id not in excluded]
+
+
+def _after_create(notifications):
+    from .notification_counter import adjust
+    from .notification_stream import publish_notification
+
+    adjust(Counter(notification.recipient_id for notification in notifications if not notification.is_read))
+
+    def publish():
+        for notification in notifications:
+            publish_notification(notification)
+    transaction.on_commit(publish)
+
+
+def create_notifications(notifications, batch_size=1000):
+    """分批创建通知并更新未读计数，返回创建的条数"""
+    total = 0
+    for start in range(0, len(notifications), batch_size):
+        batch = notifications[start:start + batch_size]
+        with transaction.atomic():
+            Notification.objects.bulk_create(batch)
+            _after_create(batch)
+        total += len(batch)
+    return total
+
+
+def _mention_notifications(user_ids, sender, post, url):
+    return [
+        Notification(
+            recipient_id=user_id,
+            sender=sender,
+            notification_type='mention',
+            title=f'{sender.username}在帖子中提到了您',
+            content=f'《{post.title}》',
+            url=url,
+        )
+        for user_id in user_ids
+    ]
+
+
+def notify_post(post):
+    """通知新帖中 @ 提及的用户"""
+    user_ids = resolve_mentions(post.content, exclude=[post.author_id])
+    return create_notifications(_mention_notifications(user_ids, post.author, post, post.get_absolute_url()))
+
+
+def notify_reply(reply):
+    """通知帖子作者有新回复，并通知回复中 @ 提及的其他用户，全部通知一次写入"""
+    post, sender = reply.post, reply.author
+    notifications = []
+    if post.author_id != sender.pk:
+        notifications.append(Notification(
+            recipient_id=post.author_id,
+            sender=sender,
+            notification_type='reply',
+            title=f'{sender.username}回复了您的帖子',
+            content=f'《{post.title}》',
+            url=post.get_absolute_url(),
+        ))
+
+    # 帖子作者已经收到回复通知，不再重复通知提及
+    user_ids = resolve_mentions(reply.content, exclude=[sender.pk, post.author_id])
+    notifications.extend(
+        _mention_notifications(user_ids, sender, post, f'{post.get_absolute_url()}#reply-{reply.pk}')
+    )
+    return create_notifications(notifications)
+
+
+def broadcast(title, content, url='', users=None, batch_size=1000, progress=None):
+    """
+    向用户群发系统通知，返回发送的条数
+
+    用户 ID 通过 iterator() 流式读取，每攒够 batch_size 个写入一批，内存占用与用户总数无关。
+    users 默认为全部有效用户；progress(已发送条数) 在每批写入后调用。
+    """
+    if users is None:
+        users = User.objects.filter(is_active=True)
+    user_ids = users.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=batch_size)
+
+    def build(batch_ids):
+        return [
+            Notification(recipient_id=user_id, notification_type='system', title=title, content=content, url=url)
+            for user_id in batch_ids
+        ]
+
+    total = 0
+    batch_ids = []
+    for user_id in user_ids:
+        batch_ids.append(user_id)
+        if len(batch_ids) >= batch_size:
+            total += create_notifications(build(batch_ids), batch_size)
+            batch_ids = []
+            if progress is not None:
+                progress(total)
+    if batch_ids:
+        total += create_notifications(build(batch_ids), batch_size)
+        if progress is not None:
+            progress(total)
+    return total
@@ -0,0 +1,159 @@
+"""
+通知保留与压缩
+
+通知表只增不减，这里按以下策略定期清理（由 compact_notifications 命令执行）：
+- 合并同一帖子的重复回复通知：每个接收者每个帖子只保留最新一条，标题改为汇总形式，
+  aggregate_count 记录合并的条数；其中有未读通知时，保留的这条也是未读；
+- 删除超过 NOTIFICATION_READ_RETENTION_DAYS 天的已读通知；
+- 每个用户最多保留 NOTIFICATION_KEEP_PER_USER 条最新通知。
+
+删除都按主键分批进行，每批一个短事务，不会长时间锁表。每批用一条 DELETE 删除，
+不逐行发送删除信号，批内被删除的未读通知按接收者合计后一次调整未读计数。
+需要逐个处理的接收者先分块读出，再删除通知，不会边遍历通知表边删除。
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.utils import timezone
+
+from .models import Notification
+from .notification_counter import adjust
+
+
+def _delete_in_batches(queryset, batch_size):
+    """按主键分批删除查询集中的通知，返回删除的行数"""
+    total = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                queryset.select_for_update().order_by('pk').values_list('pk', 'recipient_id', 'is_read')[:batch_size]
+            )
+            if not rows:
+                return total
+            # 通知没有被其他表引用，直接删除，不逐行发送删除信号
+            Notification.objects.filter(pk__in=[pk for pk, _, _ in rows])._raw_delete(Notification.objects.db)
+            unread = Counter(recipient_id for _, recipient_id, is_read in rows if not is_read)
+            adjust({recipient_id: -count for recipient_id, count in unread.items()})
+        total += len(rows)
+
+
+def _recipient_chunks(recipients, batch_size):
+    """
+    按接收者 ID 分块读出 recipients（接收者 ID 的查询集）
+
+    每块先全部读出再交给调用方处理，处理时删除通知不会影响后续分块的读取。
+    """
+    last_id = 0
+    while True:
+        chunk = list(recipients.filter(recipient__gt=last_id).order_by('recipient')[:batch_size])
+        if not chunk:
+            return
+        yield chunk
+        last_id = chunk[-1]
+
+
+def drop_read(days, batch_size=1000):
+    """删除 days 天之前的已读通知"""
+    cutoff = timezone.now() - timedelta(days=days)
+    return _delete_in_batches(Notification.objects.filter(is_read=True, created_at__lt=cutoff), batch_size)
+
+
+def keep_recent(keep, batch_size=1000):
+    """每个用户只保留最新的 keep 条通知"""
+    recipients = (
+        Notification.objects.order_by()
+        .values('recipient')
+        .annotate(total=Count('pk'))
+        .filter(total__gt=keep)
+        .values_list('recipient', flat=True)
+    )
+
+    total = 0
+    for chunk in _recipient_chunks(recipients, batch_size):
+        for recipient_id in chunk:
+            notifications = Notification.objects.filter(recipient_id=recipient_id)
+            # 第 keep 条（按通知列表顺序）及更新的通知保留，其余删除
+            boundary = notifications.order_by(*Notification.LIST_ORDERING).values('created_at', 'pk')[keep - 1:keep].first()
+            if boundary is None:
+                continue
+            older = notifications.filter(
+                Q(created_at__lt=boundary['created_at'])
+                | Q(created_at=boundary['created_at'], pk__lt=boundary['pk'])
+            )
+            total += _delete_in_batches(older, batch_size)
+    return total
+
+
+def _collapse_title(count):
+    return f'您的帖子收到了 {count} 条回复'
+
+
+def collapse_replies(batch_size=1000):
+    """合并同一帖子的重复回复通知，返回删除的行数"""
+    groups = (
+        Notification.objects.filter(notification_type='reply')
+        .order_by()
+        .values('recipient', 'url')
+        .annotate(
+            rows=Count('pk'),
+            replies=Sum('aggregate_count'),
+            latest=Max('pk'),
+            unread=Count('pk', filter=Q(is_read=False)),
+        )
+        .filter(rows__gt=1)
+    )
+
+    total = 0
+    recipients = groups.values_list('recipient', flat=True).distinct()
+    for chunk in _recipient_chunks(recipients, batch_size):
+        for group in list(groups.filter(recipient__in=chunk)):
+            total += _collapse_group(group, batch_size)
+    return total
+
+
+def _collapse_group(group, batch_size):
+    """把一组重复的回复通知合并到最新的一条，返回删除的行数"""
+    with transaction.atomic():
+        kept = Notification.objects.select_for_update().filter(pk=group['latest'])
+        kept_is_read = kept.values_list('is_read', flat=True).first()
+        if kept_is_read is None:
+            return 0
+        kept.update(
+            title=_collapse_title(group['replies']),
+            aggregate_count=group['replies'],
+            is_read=not group['unread'],
+        )
+        # 保留的通知由已读变为未读不经过模型信号，需要单独调整计数；
+        # 被删除的未读通知在分批删除时调整
+        if kept_is_read and group['unread']:
+            adjust({group['recipient']: 1})
+    duplicates = Notification.objects.filter(
+        recipient_id=group['recipient'], url=group['url'], notification_type='reply', pk__lt=group['latest'],
+    )
+    return _delete_in_batches(duplicates, batch_size)
+
+
+def compact(keep=None, read_days=None, collapse=None, batch_size=1000):
+    """
+    按配置执行全部清理策略，返回 {策略: 删除的行数}
+
+    参数为 None 时使用设置中的值；keep 或 read_days 为 0 表示不启用该策略。
+    """
+    if keep is None:
+        keep = getattr(settings, 'NOTIFICATION_KEEP_PER_USER', 1000)
+    if read_days is None:
+        read_days = getattr(settings, 'NOTIFICATION_READ_RETENTION_DAYS', 90)
+    if collapse is None:
+        collapse = getattr(settings, 'NOTIFICATION_COLLAPSE_REPLIES', True)
+
+    reclaimed = {}
+    if collapse:
+        reclaimed['collapsed'] = collapse_replies(batch_size)
+    if read_days:
+        reclaimed['expired'] = drop_read(read_days, batch_size)
+    if keep:
+        reclaimed['overflow'] = keep_recent(keep, batch_size)
+    return reclaimed
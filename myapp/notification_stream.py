@@ -0,0 +1,228 @@
+"""
+实时通知推送
+
+浏览器通过 Server-Sent Events（``notification_stream`` 视图）或长轮询（``notification_poll`` 视图）
+保持连接，新通知和未读数变化由发布/订阅方式推送，空闲连接不会轮询数据库。
+
+发布方（模型信号、notification_counter.adjust）在事务提交后调用 ``publish_notification`` /
+``publish_unread_counts``；订阅方是 ASGI 事件循环中的异步视图。默认的 ``InProcessBroker``
+只在当前进程内分发：写入通知的请求由其他 worker 处理时，连接收不到实时推送，要等达到
+NOTIFICATION_STREAM_MAX_DURATION 重连时按 Last-Event-ID 补发。多进程部署时可以通过 NOTIFICATION_BROKER
+设置替换为基于 Redis 等消息中间件的实现，只需提供相同的 ``subscribe`` / ``publish`` / ``has_subscribers`` 方法。
+
+这两个视图必须通过 ASGI 服务器（myproject/asgi.py，见 Procfile）运行；在 WSGI 下 notification_stream
+直接返回 204，避免每个页面的连接长时间占用工作进程。
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+class Subscription:
+    """一个连接对某个用户事件的订阅"""
+
+    def __init__(self, broker, user_id, loop, queue):
+        self.broker = broker
+        self.user_id = user_id
+        self.loop = loop
+        self.queue = queue
+
+    async def get(self, timeout):
+        """等待下一个事件，超时返回 None"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def drain(self):
+        """取出已到达但尚未读取的全部事件"""
+        events = []
+        while not self.queue.empty():
+            events.append(self.queue.get_nowait())
+        return events
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """
+    进程内发布/订阅
+
+    每个订阅是所在事件循环中的一个 asyncio.Queue，publish 可以在本进程的任意线程中调用，
+    其他进程中的发布不会到达。
+    队列满时丢弃最旧的事件，客户端重连后会按 Last-Event-ID 补齐通知。
+    """
+
+    def __init__(self, max_queue_size=100):
+        self.max_queue_size = max_queue_size
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        subscription = Subscription(
+            self, user_id, asyncio.get_running_loop(), asyncio.Queue(self.max_queue_size)
+        )
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def has_subscribers(self, user_id):
+        return user_id in self._subscriptions
+
+    def publish(self, user_id, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(_put, subscription.queue, event)
+            except RuntimeError:
+                # 事件循环已关闭，连接随之结束
+                pass
+
+
+def _put(queue, event):
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(event)
+
+
+def get_broker():
+    """获取 NOTIFICATION_BROKER 设置指定的发布/订阅实现（进程内单例）"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, 'NOTIFICATION_BROKER', 'myapp.notification_stream.InProcessBroker')
+                _broker = import_string(path)()
+    return _broker
+
+
+# ==================== 事件 ====================
+
+def notification_event(notification):
+    return {
+        'event': 'notification',
+        'id': notification.pk,
+        'data': {
+            'id': notification.pk,
+            'type': notification.notification_type,
+            'title': notification.title,
+            'content': notification.content,
+            'url': notification.url,
+            'created_at': notification.created_at.isoformat(),
+        },
+    }
+
+
+def unread_event(count):
+    return {'event': 'unread', 'data': {'count': count}}
+
+
+def publish_notification(notification):
+    """推送一条新通知"""
+    broker = get_broker()
+    if broker.has_subscribers(notification.recipient_id):
+        broker.publish(notification.recipient_id, notification_event(notification))
+
+
+def publish_unread_counts(user_ids):
+    """推送未读数变化，只为当前有连接的用户读取计数"""
+    from .notification_counter import get_unread_count
+
+    broker = get_broker()
+    for user_id in user_ids:
+        if broker.has_subscribers(user_id):
+            broker.publish(user_id, unread_event(get_unread_count(user_id)))
+
+
+def format_sse(event):
+    lines = []
+    if event.get('id') is not None:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['event']}")
+    lines.append('data: ' + json.dumps(event['data'], ensure_ascii=False))
+    return '\n'.join(lines) + '\n\n'
+
+
+def _parse_last_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@sync_to_async
+def _missed_events(user_id, last_id, limit=50):
+    """连接建立时补发 last_id 之后的通知，并附上当前未读数"""
+    from .models import Notification
+    from .notification_counter import get_unread_count
+
+    events = []
+    if last_id is not None:
+        missed = Notification.objects.filter(recipient_id=user_id, pk__gt=last_id).order_by('pk')[:limit]
+        events.extend(notification_event(notification) for notification in missed)
+    events.append(unread_event(get_unread_count(user_id)))
+    return events
+
+
+# ==================== 连接 ====================
+
+async def stream_events(user_id, last_event_id=None):
+    """SSE 事件流：先补发错过的通知，之后推送新事件，空闲时定期发送心跳"""
+    heartbeat = getattr(settings, 'NOTIFICATION_STREAM_HEARTBEAT', 15)
+    max_duration = getattr(settings, 'NOTIFICATION_STREAM_MAX_DURATION', 300)
+
+    # 先订阅再查询数据库，避免两者之间产生的事件丢失
+    subscription = get_broker().subscribe(user_id)
+    try:
+        yield f'retry: {heartbeat * 1000}\n\n'
+        for event in await _missed_events(user_id, _parse_last_id(last_event_id)):
+            yield format_sse(event)
+
+        # 连接达到最长时间后主动断开，由浏览器自动重连
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + max_duration
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            event = await subscription.get(min(heartbeat, remaining))
+            yield format_sse(event) if event is not None else ': keepalive\n\n'
+    finally:
+        subscription.close()
+
+
+async def poll_events(user_id, last_event_id=None):
+    """长轮询：有错过的通知时立即返回，否则等待第一个事件或超时"""
+    timeout = getattr(settings, 'NOTIFICATION_POLL_TIMEOUT', 25)
+    last_id = _parse_last_id(last_event_id)
+
+    subscription = get_broker().subscribe(user_id)
+    try:
+        if last_id is not None:
+            events = await _missed_events(user_id, last_id)
+            if len(events) > 1:
+                return events
+        event = await subscription.get(timeout)
+        if event is None:
+            return []
+        return [event] + subscription.drain()
+    finally:
+        subscription.close()
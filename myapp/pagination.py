@@ -0,0 +1,254 @@
+"""
+游标（keyset）分页
+
+按排序字段的值定位下一页，而不是 OFFSET 跳过前面的行：翻页越深也不会变慢，
+也不需要对整个结果集执行 COUNT(*)。上一页/下一页游标是不透明的字符串，
+既可以放在页面链接里，也可以直接用于 JSON 接口。
+
+排序字段的最后一项必须唯一（一般为 id），以保证顺序确定。
+可为空的字段统一按“空值排在最后”处理，在 SQLite 和 PostgreSQL 上结果一致；
+为这类排序建立的索引使用 KeysetIndex。
+"""
+import base64
+import datetime
+import json
+import zlib
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections, models
+from django.db.models import F, Q
+
+
+def _json_default(value):
+    # DjangoJSONEncoder 会把时间截断到毫秒，这里保留完整精度以便精确定位
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+class KeysetIndex(models.Index):
+    """
+    与分页器排序一致的索引：可为空的降序字段空值在最后
+
+    PostgreSQL 的降序索引默认空值在前，不能用于“DESC NULLS LAST”的排序和定位，需要显式声明；
+    SQLite 中空值最小，降序本身就是空值在最后，而且索引定义不支持 NULLS LAST，按普通索引建立。
+    """
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        statement = super().create_sql(model, schema_editor, using=using, **kwargs)
+        if schema_editor.connection.vendor == 'postgresql':
+            columns = statement.parts['columns']
+            columns.col_suffixes = [
+                f'{suffix} NULLS LAST' if suffix == 'DESC' and model._meta.get_field(name).null else suffix
+                for (name, _), suffix in zip(self.fields_orders, columns.col_suffixes)
+            ]
+        return statement
+
+
+class InvalidCursor(Exception):
+    """游标格式错误或与当前排序不匹配"""
+
+
+class KeysetPage:
+    """一页数据，可以像列表一样迭代"""
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __repr__(self):
+        return f'<KeysetPage: {len(self)} 条>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    游标分页器
+
+    ordering 为排序字段元组，如 ('-is_top', '-last_reply_at', '-created_at', '-id')。
+    count 参数控制总数的计算方式：None 不计算；'exact' 精确计数；
+    'estimate' 在 PostgreSQL 上读取查询计划的估算行数，其他数据库上最多数到 estimate_limit 行。
+    """
+
+    def __init__(self, queryset, ordering, per_page=20, count=None, estimate_limit=1000):
+        self.queryset = queryset
+        self.model = queryset.model
+        self.fields = []
+        for field in ordering:
+            descending = field.startswith('-')
+            name = field.lstrip('-')
+            try:
+                nullable = self.model._meta.get_field(name).null
+            except FieldDoesNotExist:
+                # 注解字段（如搜索相关度），视为非空
+                nullable = False
+            self.fields.append((name, descending, nullable))
+        # 游标中记录排序签名，换了排序方式后旧游标自动失效
+        self.signature = format(zlib.crc32(','.join(ordering).encode('utf-8')), 'x')
+        self.per_page = per_page
+        self.count_mode = count
+        self.estimate_limit = estimate_limit
+        self._count = None
+        self._count_is_estimate = False
+
+    # ---------- 游标编码 ----------
+
+    def encode_cursor(self, obj, direction):
+        values = [getattr(obj, name) for name, _, _ in self.fields]
+        payload = json.dumps({'o': self.signature, 'd': direction, 'k': values}, default=_json_default, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+            direction, values = payload['d'], payload['k']
+            if payload.get('o') != self.signature or direction not in ('n', 'p'):
+                raise ValueError
+            if len(values) != len(self.fields):
+                raise ValueError
+            values = [self._to_python(name, value) for (name, _, _), value in zip(self.fields, values)]
+        except Exception:
+            raise InvalidCursor(cursor)
+        return direction, values
+
+    def _to_python(self, name, value):
+        if value is None:
+            return None
+        try:
+            field = self.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return value
+        return field.to_python(value)
+
+    # ---------- 查询条件 ----------
+
+    def _order_by(self, reverse=False):
+        expressions = []
+        for name, descending, nullable in self.fields:
+            expression = F(name).desc if descending != reverse else F(name).asc
+            if nullable:
+                # 正向“空值在最后”，反向取上一页时则在最前
+                nulls = {'nulls_first': True} if reverse else {'nulls_last': True}
+                expressions.append(expression(**nulls))
+            else:
+                expressions.append(expression())
+        return expressions
+
+    def _beyond(self, name, descending, nullable, value, reverse):
+        """在当前排序方向上位于 value 之后（reverse 时为之前）的条件，不存在时返回 None"""
+        if value is None:
+            # 空值排在最后：之后没有任何行，之前是所有非空行
+            return Q(**{f'{name}__isnull': False}) if reverse else None
+        lookup = 'lt' if descending != reverse else 'gt'
+        condition = Q(**{f'{name}__{lookup}': value})
+        if nullable and not reverse:
+            condition |= Q(**{f'{name}__isnull': True})
+        return condition
+
+    def _seek(self, values, reverse=False):
+        """构造 (a, b, c) 元组比较的等价条件：a 之后 OR (a 相等 AND b 之后) OR ..."""
+        condition = Q(pk__in=[])
+        equal = Q()
+        for (name, descending, nullable), value in zip(self.fields, values):
+            beyond = self._beyond(name, descending, nullable, value, reverse)
+            if beyond is not None:
+                condition |= equal & beyond
+            equal &= Q(**{f'{name}__isnull': True}) if value is None else Q(**{name: value})
+        return condition
+
+    # ---------- 取页 ----------
+
+    def _position(self, cursor):
+        if cursor:
+            try:
+                return self.decode_cursor(cursor)
+            except InvalidCursor:
+                pass
+        return 'n', None
+
+    def page_queryset(self, cursor=None):
+        """游标对应页的查询集（已排序、已按游标过滤，未切片），游标无效时为第一页"""
+        direction, values = self._position(cursor)
+        reverse = direction == 'p'
+        queryset = self.queryset.order_by(*self._order_by(reverse))
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, reverse))
+        return queryset
+
+    def get_page(self, cursor=None):
+        """获取一页数据，游标无效时返回第一页"""
+        direction, values = self._position(cursor)
+        reverse = direction == 'p'
+        queryset = self.page_queryset(cursor)
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+
+        if not rows:
+            return KeysetPage(rows, self)
+
+        if reverse:
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+
+        return KeysetPage(
+            rows,
+            self,
+            next_cursor=self.encode_cursor(rows[-1], 'n') if has_next else None,
+            previous_cursor=self.encode_cursor(rows[0], 'p') if has_previous else None,
+        )
+
+    # ---------- 总数 ----------
+
+    @property
+    def count(self):
+        """结果总数；count 参数为 None 时返回 None"""
+        if self._count is None and self.count_mode is not None:
+            if self.count_mode == 'estimate':
+                self._count, self._count_is_estimate = self._estimate_count()
+            else:
+                self._count = self.queryset.count()
+        return self._count
+
+    @property
+    def count_is_estimate(self):
+        self.count
+        return self._count_is_estimate
+
+    def _estimate_count(self):
+        queryset = self.queryset.order_by()
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql':
+            plan = json.loads(queryset.explain(format='json'))
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]['Plan']['Plan Rows']), True
+
+        limited = queryset.values('pk')[:self.estimate_limit + 1].count()
+        if limited > self.estimate_limit:
+            return self.estimate_limit, True
+        return limited, False
@@ -0,0 +1,118 @@
+"""
+查询预算
+
+统计一次请求（或一段代码）执行的 SQL 条数、总耗时和重复查询：
+- ``QueryStats``：通过 connection.execute_wrapper 记录查询，不依赖 DEBUG；
+- ``QueryBudgetMiddleware``：开启 QUERY_BUDGET_ENABLED 后为每个响应添加 Server-Timing 头，
+  浏览器开发者工具的“时间”面板中可直接查看；超过 QUERY_BUDGET_WARN_THRESHOLD 时记录警告日志；
+- ``QueryBudgetMixin``：测试用例断言视图的查询条数不超过预算，失败时列出全部查询和重复查询。
+
+“重复查询”指 SQL 和参数都相同的查询；“相似查询”指 SQL 相同而参数不同，通常意味着 N+1 问题。
+"""
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class QueryStats:
+    """在 with 语句块内记录所有数据库连接上执行的查询"""
+
+    def __init__(self, using=None):
+        self.using = using
+        self.queries = []
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, params, time.perf_counter() - started))
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        aliases = [self.using] if self.using else list(connections)
+        for alias in aliases:
+            self._stack.enter_context(connections[alias].execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        """总耗时（毫秒）"""
+        return sum(duration for _, _, duration in self.queries) * 1000
+
+    def duplicates(self):
+        """SQL 和参数都相同、执行了多次的查询：{sql: 次数}"""
+        counts = Counter((sql, repr(params)) for sql, params, _ in self.queries)
+        return {sql: count for (sql, _), count in counts.items() if count > 1}
+
+    def similar(self):
+        """SQL 相同、执行了多次的查询（不论参数）：{sql: 次数}"""
+        counts = Counter(sql for sql, _, _ in self.queries)
+        return {sql: count for sql, count in counts.items() if count > 1}
+
+    def server_timing(self):
+        """Server-Timing 头的值"""
+        duplicated = sum(count - 1 for count in self.duplicates().values())
+        return (
+            f'db;dur={self.duration:.1f};desc="{self.count} queries", '
+            f'dbdup;desc="{duplicated} duplicate queries"'
+        )
+
+
+class QueryBudgetMiddleware:
+    """为每个请求统计查询并输出 Server-Timing 头，未开启 QUERY_BUDGET_ENABLED 时不加载"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_BUDGET_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.warn_threshold = getattr(settings, 'QUERY_BUDGET_WARN_THRESHOLD', 0)
+
+    def __call__(self, request):
+        with QueryStats() as stats:
+            response = self.get_response(request)
+
+        response['Server-Timing'] = stats.server_timing()
+        if self.warn_threshold and stats.count > self.warn_threshold:
+            logger.warning(
+                '%s %s 执行了 %d 条查询（%.1f ms），重复查询 %d 条',
+                request.method, request.path, stats.count, stats.duration, len(stats.duplicates()),
+            )
+        return response
+
+
+class QueryBudgetMixin:
+    """TestCase 混入类：断言一段代码的查询条数不超过预算"""
+
+    def assertQueryBudget(self, budget, func, *args, **kwargs):
+        """执行 func(*args, **kwargs)，查询条数超过 budget 或有重复查询时失败，返回 func 的结果"""
+        with QueryStats() as stats:
+            result = func(*args, **kwargs)
+
+        problems = []
+        if stats.count > budget:
+            problems.append(f'执行了 {stats.count} 条查询，超过预算 {budget} 条')
+        duplicates = stats.duplicates()
+        if duplicates:
+            problems.append(f'有 {len(duplicates)} 条重复查询')
+        if problems:
+            lines = ['，'.join(problems)]
+            lines.extend(f'{index}. {sql}' for index, (sql, _, _) in enumerate(stats.queries, 1))
+            lines.extend(f'重复 {count} 次：{sql}' for sql, count in duplicates.items())
+            self.fail('\n'.join(lines))
+        return result
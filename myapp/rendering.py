@@ -0,0 +1,75 @@
+"""
+帖子和回复内容的预渲染
+
+摘要和展示用的 HTML 在保存时计算一次，存入 excerpt / content_html 字段，
+列表页只读摘要，详情页直接输出 content_html，都不再对正文做 strip_tags 或 linebreaks。
+bulk_create / update 绕过了 save，需要调用 render_fields 或执行 backfill_rendered_content 命令。
+"""
+from django.utils.html import linebreaks, strip_tags
+
+POST_EXCERPT_LENGTH = 100
+REPLY_EXCERPT_LENGTH = 50
+
+RENDERED_FIELDS = ('excerpt', 'content_html')
+
+
+def make_excerpt(content, length):
+    """去掉 HTML 标签后截取前 length 个字符"""
+    text = strip_tags(content)
+    if len(text) <= length:
+        return text
+    return text[:length] + '...'
+
+
+def render_html(content):
+    """转义正文并按换行分段，结果可以直接在模板中以 safe 输出"""
+    return linebreaks(content, autoescape=True)
+
+
+def render_fields(instance, excerpt_length):
+    """根据 instance.content 填充 excerpt 和 content_html"""
+    instance.excerpt = make_excerpt(instance.content, excerpt_length)
+    instance.content_html = render_html(instance.content)
+
+
+def prepare_save(instance, excerpt_length, kwargs):
+    """
+    在 save 之前更新预渲染字段
+
+    正文未加载（defer）或 update_fields 不含 content 时不重新渲染；
+    update_fields 含 content 时把预渲染字段一并加入。
+    """
+    if 'content' not in instance.__dict__:
+        return
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None:
+        if 'content' not in update_fields:
+            return
+        kwargs['update_fields'] = {*update_fields, *RENDERED_FIELDS}
+    render_fields(instance, excerpt_length)
+
+
+def backfill(model, excerpt_length, batch_size=500, only_missing=True, progress=None):
+    """
+    按主键分批为已有数据计算预渲染字段，返回更新的行数
+
+    only_missing 为 True 时只处理 content_html 为空的行，否则全部重新渲染
+    （修改了渲染规则后使用）。每批只读取 id 和 content，用 bulk_update 写回。
+    """
+    queryset = model.objects.order_by('pk').only('pk', 'content')
+    if only_missing:
+        queryset = queryset.filter(content_html='')
+
+    total = 0
+    last_pk = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+        if not rows:
+            return total
+        for row in rows:
+            render_fields(row, excerpt_length)
+        model.objects.bulk_update(rows, RENDERED_FIELDS)
+        total += len(rows)
+        last_pk = rows[-1].pk
+        if progress is not None:
+            progress(total)
@@ -0,0 +1,68 @@
+"""
+帖子回复楼层
+
+回复按“楼层”展示：顶层回复按时间分页，每层下面按时间顺序列出楼中楼（对该层任意回复的回复），
+不论嵌套多深都只缩进一级。父回复已删除的回复视为顶层回复。
+
+一页回复固定只需三条查询，与回复数量和嵌套深度无关：
+1. 当前页的顶层回复（游标分页），连同作者和作者资料；
+2. 帖子中全部楼中楼的 (id, 父回复 id)，只取两列，在内存中以 O(n) 归到各楼层；
+3. 属于当前页楼层的楼中楼，连同作者和作者资料。
+"""
+from django.db.models import Q
+
+from .models import Reply
+from .pagination import KeysetPaginator
+
+ORDERING = ('created_at', 'id')
+
+
+def _replies(post):
+    # 楼层只输出渲染后的内容，原始正文不读取
+    return Reply.objects.filter(post=post, is_deleted=False).select_related('author__profile').defer('content')
+
+
+def _set_parent(reply, parent):
+    # 直接写入外键缓存，模板访问 reply.parent_reply 时不再查询
+    Reply.parent_reply.field.set_cached_value(reply, parent)
+
+
+def load_thread(post, cursor=None, per_page=50):
+    """
+    加载一页回复楼层
+
+    返回顶层回复的 KeysetPage，每个顶层回复的 thread_replies 为其楼中楼列表（按时间顺序）。
+    """
+    roots = _replies(post).filter(
+        Q(parent_reply__isnull=True) | Q(parent_reply__is_deleted=True)
+    )
+    page = KeysetPaginator(roots, ORDERING, per_page=per_page).get_page(cursor)
+    if not page.object_list:
+        return page
+
+    # 楼中楼的父子关系：每个回复记录所属楼层（顶层回复的 id）
+    edges = _replies(post).filter(parent_reply__is_deleted=False).order_by(*ORDERING).values_list(
+        'pk', 'parent_reply_id'
+    )
+    root_of = {root.pk: root.pk for root in page}
+    wanted = []
+    # 父回复一定早于子回复创建，按时间顺序一次遍历即可确定所属楼层
+    for pk, parent_id in edges:
+        root_id = root_of.get(parent_id)
+        if root_id is not None:
+            root_of[pk] = root_id
+            wanted.append(pk)
+
+    by_id = {root.pk: root for root in page}
+    for root in page:
+        root.thread_replies = []
+        if root.parent_reply_id is not None:
+            # 父回复已删除，作为顶层回复展示，不再引用
+            _set_parent(root, None)
+
+    if wanted:
+        for reply in _replies(post).filter(pk__in=wanted).order_by(*ORDERING):
+            by_id[reply.pk] = reply
+            _set_parent(reply, by_id[reply.parent_reply_id])
+            by_id[root_of[reply.pk]].thread_replies.append(reply)
+    return page
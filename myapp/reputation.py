@@ -0,0 +1,114 @@
+"""
+用户统计与声望值的批量重算
+
+日常的发帖、回复、精华操作通过 UserProfile.apply_stats_delta 增量维护统计数据；
+这里根据帖子和回复表重新精确计算，用于：
+- 处理 ReputationJob 队列中积压的重算请求（同一用户的多次请求已合并）；
+- 修改声望规则或数据不一致后，全量重算所有用户。
+
+每批用户在一个事务中锁定用户资料后，只需两条分组聚合查询（帖子、回复各一条）和一次 bulk_update。
+"""
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import Post, Reply, ReputationJob, UserProfile
+
+STAT_FIELDS = ['post_count', 'reply_count', 'essence_count', 'reputation']
+
+
+def _aggregate(user_ids):
+    """按作者分组统计未删除的帖子数、精华帖数和回复数"""
+    stats = {user_id: [0, 0, 0] for user_id in user_ids}
+    posts = (
+        Post.objects.filter(author_id__in=user_ids, is_deleted=False)
+        .order_by()
+        .values('author_id')
+        .annotate(total=Count('pk'), essences=Count('pk', filter=Q(is_essence=True)))
+        .values_list('author_id', 'total', 'essences')
+    )
+    for author_id, total, essences in posts:
+        stats[author_id][0] = total
+        stats[author_id][2] = essences
+
+    replies = (
+        Reply.objects.filter(author_id__in=user_ids, is_deleted=False)
+        .order_by()
+        .values('author_id')
+        .annotate(total=Count('pk'))
+        .values_list('author_id', 'total')
+    )
+    for author_id, total in replies:
+        stats[author_id][1] = total
+    return stats
+
+
+def _recompute_chunk(profiles, batch_size):
+    """重算一批用户资料，只写回发生变化的行，返回更新的行数"""
+    stats = _aggregate([profile.user_id for profile in profiles])
+    changed = []
+    for profile in profiles:
+        post_count, reply_count, essence_count = stats[profile.user_id]
+        reputation = (
+            post_count * UserProfile.POST_REPUTATION
+            + reply_count * UserProfile.REPLY_REPUTATION
+            + essence_count * UserProfile.ESSENCE_REPUTATION
+        )
+        values = (post_count, reply_count, essence_count, reputation)
+        if values != tuple(getattr(profile, field) for field in STAT_FIELDS):
+            for field, value in zip(STAT_FIELDS, values):
+                setattr(profile, field, value)
+            changed.append(profile)
+
+    if changed:
+        UserProfile.objects.bulk_update(changed, STAT_FIELDS, batch_size=batch_size)
+    return len(changed)
+
+
+def recompute(user_ids=None, chunk_size=1000):
+    """
+    重算指定用户（默认全部用户）的统计和声望值
+
+    按主键分块读取用户资料，内存占用与总用户数无关。返回 (处理的用户数, 更新的用户数)。
+    """
+    profiles = UserProfile.objects.only('pk', 'user_id', *STAT_FIELDS).order_by('pk')
+    if user_ids is not None:
+        profiles = profiles.filter(user_id__in=user_ids)
+
+    processed = updated = 0
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            # 先锁住这批资料再统计：并发的 apply_stats_delta 要等写回提交后才能执行，
+            # 已提交的增量对应的帖子和回复都在统计之内，写回的绝对值不会覆盖任何增量
+            chunk = list(profiles.select_for_update().filter(pk__gt=last_pk)[:chunk_size])
+            if not chunk:
+                break
+            updated += _recompute_chunk(chunk, chunk_size)
+        processed += len(chunk)
+        last_pk = chunk[-1].pk
+    return processed, updated
+
+
+def process_pending(chunk_size=1000):
+    """
+    处理重算队列，返回 (处理的用户数, 更新的用户数)
+
+    处理期间再次提交的请求会刷新 requested_at，这些任务不会被删除，留待下一轮处理。
+    """
+    processed = updated = 0
+    last_pk = 0
+    while True:
+        jobs = list(ReputationJob.objects.filter(pk__gt=last_pk).order_by('pk')[:chunk_size])
+        if not jobs:
+            break
+        claimed_at = timezone.now()
+        user_ids = [job.user_id for job in jobs]
+        chunk_processed, chunk_updated = recompute(user_ids, chunk_size)
+        ReputationJob.objects.filter(
+            pk__in=[job.pk for job in jobs], requested_at__lte=claimed_at
+        ).delete()
+        processed += chunk_processed
+        updated += chunk_updated
+        last_pk = jobs[-1].pk
+    return processed, updated
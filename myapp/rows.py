@@ -0,0 +1,74 @@
+"""
+列表页使用的轻量只读行
+
+列表只显示标题、计数和时间等少数字段，没有必要为每一行构造模型实例、读取正文这样的大字段。
+as_rows 让查询集只选出指定的列，迭代时返回 Row：可以像模型实例一样在模板里用属性访问，
+但没有 save() 和延迟加载，访问未选出的字段会直接报错，而不是悄悄多发一条查询。
+
+关联字段用双下划线指定，如 'author__username'，结果中为嵌套的 Row（post.author.username）。
+"""
+from django.db.models.query import ValuesIterable
+
+
+class Row:
+    """只读的一行数据"""
+
+    __slots__ = ('_values',)
+
+    def __init__(self, values):
+        object.__setattr__(self, '_values', values)
+
+    @classmethod
+    def from_values(cls, values):
+        """把 values() 的字典转换为 Row，'a__b' 形式的键转换为嵌套的 Row"""
+        flat, nested = {}, {}
+        for key, value in values.items():
+            head, separator, rest = key.partition('__')
+            if separator:
+                nested.setdefault(head, {})[rest] = value
+            else:
+                flat[key] = value
+        for head, related in nested.items():
+            flat[head] = cls.from_values(related)
+        return cls(flat)
+
+    def __getattr__(self, name):
+        try:
+            return self._values[name]
+        except KeyError:
+            raise AttributeError(f'行中没有字段 {name}') from None
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Row 是只读的，请使用 replace() 生成新的行')
+
+    def __eq__(self, other):
+        return isinstance(other, Row) and self._values == other._values
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f'<Row: {self._values!r}>'
+
+    def replace(self, **changes):
+        """返回修改了部分字段的新行"""
+        return Row({**self._values, **changes})
+
+
+class RowIterable(ValuesIterable):
+    """values() 的迭代方式，每行转换为 Row"""
+
+    def __iter__(self):
+        for values in super().__iter__():
+            yield Row.from_values(values)
+
+
+def as_rows(queryset, *fields):
+    """
+    只查询 fields 中的列，结果为 Row
+
+    返回的仍是查询集，可以继续过滤、排序、切片，也可以交给 KeysetPaginator 分页
+    （排序字段需要包含在 fields 中）。
+    """
+    queryset = queryset.values(*fields)
+    queryset._iterable_class = RowIterable
+    return queryset
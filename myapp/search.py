@@ -0,0 +1,223 @@
+"""
+帖子全文搜索
+
+SQLite 使用 FTS5 虚拟表，PostgreSQL 使用 tsvector + GIN 索引，索引表均为 ``myapp_post_fts``
+（见 0004_post_search_index 迁移），由 Post 的保存/删除信号同步维护，可用 rebuild_search_index 命令重建。
+
+两种数据库自带的分词器都不能切分中文，因此入库前先在 Python 中分词：
+中日韩文字按单字切分，其他文字按单词切分并转为小写；查询时把每个关键词转换为短语查询
+（单字必须相邻），效果等同于子串匹配，但可以利用索引并按相关度排序。
+
+数据库不支持或索引表不存在时，退回到原来的 icontains 查询。
+"""
+import re
+
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape, strip_tags
+from django.utils.safestring import mark_safe
+
+FTS_TABLE = 'myapp_post_fts'
+
+# 按相关度排序（游标分页使用，search_rank 由 search_posts 注解）
+RANK_ORDERING = ('-search_rank', '-id')
+
+_CJK_RANGES = (
+    '\u3040-\u30ff'  # 日文假名
+    '\u3400-\u4dbf'  # 中日韩统一表意文字扩展A
+    '\u4e00-\u9fff'  # 中日韩统一表意文字
+    '\uf900-\ufaff'  # 中日韩兼容表意文字
+    '\uac00-\ud7af'  # 韩文音节
+)
+_TOKEN_RE = re.compile(rf'[{_CJK_RANGES}]|[^\W_{_CJK_RANGES}]+')
+
+_available = None
+
+
+def tokenize(text):
+    """切分文本：中日韩文字每字一个词，其他按单词切分并转为小写"""
+    return [token.lower() for token in _TOKEN_RE.findall(text or '')]
+
+
+def segment(text):
+    """把文本转换为以空格分隔的词序列，供数据库分词器使用"""
+    return ' '.join(tokenize(strip_tags(text or '')))
+
+
+def _query_terms(query):
+    """把用户输入按空白拆分为关键词，每个关键词是一组相邻的词"""
+    terms = []
+    for word in (query or '').split():
+        tokens = tokenize(word)
+        if tokens:
+            terms.append(tokens)
+    return terms
+
+
+def is_available():
+    """当前数据库是否已建立全文索引"""
+    global _available
+    if _available is None:
+        _available = (
+            connection.vendor in ('sqlite', 'postgresql')
+            and FTS_TABLE in connection.introspection.table_names()
+        )
+    return _available
+
+
+# ==================== 索引维护 ====================
+
+def _pg_document_sql():
+    return (
+        "setweight(to_tsvector('simple', %s), 'A') || "
+        "setweight(to_tsvector('simple', %s), 'B')"
+    )
+
+
+def index_post(post):
+    """写入或更新单个帖子的索引，已删除的帖子从索引中移除"""
+    if not is_available():
+        return
+    if post.is_deleted:
+        remove_post(post.pk)
+        return
+
+    title, content = segment(post.title), segment(post.content)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post.pk])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, content) VALUES (%s, %s, %s)',
+                [post.pk, title, content],
+            )
+        else:
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (post_id, document) VALUES (%s, {_pg_document_sql()}) '
+                f'ON CONFLICT (post_id) DO UPDATE SET document = EXCLUDED.document',
+                [post.pk, title, content],
+            )
+
+
+def remove_post(post_id):
+    """从索引中移除帖子"""
+    if not is_available():
+        return
+    column = 'rowid' if connection.vendor == 'sqlite' else 'post_id'
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE {column} = %s', [post_id])
+
+
+def rebuild(batch_size=500):
+    """清空并重建全部未删除帖子的索引，按批写入，返回索引的帖子数"""
+    from .models import Post
+
+    if not is_available():
+        return 0
+
+    if connection.vendor == 'sqlite':
+        insert_sql = f'INSERT INTO {FTS_TABLE} (rowid, title, content) VALUES (%s, %s, %s)'
+    else:
+        insert_sql = f'INSERT INTO {FTS_TABLE} (post_id, document) VALUES (%s, {_pg_document_sql()})'
+
+    total = 0
+    batch = []
+    posts = Post.objects.filter(is_deleted=False).order_by().values_list('pk', 'title', 'content')
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        for pk, title, content in posts.iterator(chunk_size=batch_size):
+            batch.append((pk, segment(title), segment(content)))
+            if len(batch) >= batch_size:
+                cursor.executemany(insert_sql, batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany(insert_sql, batch)
+            total += len(batch)
+    return total
+
+
+# ==================== 查询 ====================
+
+def _fts5_match(terms):
+    # 每个关键词是一个短语，多个关键词之间为 AND
+    return ' '.join('"%s"' % ' '.join(tokens).replace('"', '""') for tokens in terms)
+
+
+def _tsquery(terms):
+    # 词已经过 tokenize 过滤，只含文字和数字；仍按 tsquery 语法加引号
+    def quote(token):
+        return "'%s'" % token.replace("'", "''")
+    return ' & '.join('(%s)' % ' <-> '.join(quote(token) for token in tokens) for tokens in terms)
+
+
+def search_posts(queryset, query):
+    """
+    在帖子查询集中搜索关键词
+
+    返回过滤后的查询集，并注解 search_rank（越大越相关），可配合 RANK_ORDERING 排序。
+    """
+    terms = _query_terms(query)
+    if not terms:
+        # 只有标点等无法切分的输入：没有结果，但仍注解 search_rank，调用方可以照常排序和分页
+        return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    table = queryset.model._meta.db_table
+    if not is_available():
+        condition = Q()
+        for word in query.split():
+            condition &= Q(title__icontains=word) | Q(content__icontains=word)
+        return queryset.filter(condition).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    if connection.vendor == 'sqlite':
+        match = _fts5_match(terms)
+        # bm25 越小越相关，取负数统一为越大越相关；标题权重高于正文
+        rank = RawSQL(
+            f'(SELECT -bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid = {table}.id)',
+            [match],
+            output_field=FloatField(),
+        )
+        matched = RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+    else:
+        tsquery = _tsquery(terms)
+        rank = RawSQL(
+            f"(SELECT ts_rank(document, to_tsquery('simple', %s)) FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE}.post_id = {table}.id)",
+            [tsquery],
+            output_field=FloatField(),
+        )
+        matched = RawSQL(
+            f"SELECT post_id FROM {FTS_TABLE} WHERE document @@ to_tsquery('simple', %s)", [tsquery]
+        )
+
+    return queryset.filter(pk__in=matched).annotate(search_rank=rank)
+
+
+def highlight(text, query, length=120):
+    """
+    生成高亮摘要：截取第一个关键词附近的文本，转义后用 <mark> 标出所有关键词
+    """
+    text = strip_tags(text or '')
+    words = sorted({word for word in (query or '').split() if word}, key=len, reverse=True)
+    if not words:
+        return escape(text[:length])
+
+    pattern = re.compile('|'.join(re.escape(word) for word in words), re.IGNORECASE)
+    first = pattern.search(text)
+    start = 0
+    if first and first.start() > length // 3 and len(text) > length:
+        start = first.start() - length // 3
+    excerpt = text[start:start + length]
+
+    parts = []
+    position = 0
+    for match in pattern.finditer(excerpt):
+        parts.append(escape(excerpt[position:match.start()]))
+        parts.append('<mark>%s</mark>' % escape(match.group(0)))
+        position = match.end()
+    parts.append(escape(excerpt[position:]))
+
+    prefix = '...' if start > 0 else ''
+    suffix = '...' if start + length < len(text) else ''
+    return mark_safe(prefix + ''.join(parts) + suffix)
@@ -0,0 +1,271 @@
+"""
+合成论坛数据
+
+为压力测试生成规模可配置的用户、板块、帖子、回复和通知，数据分布尽量接近真实论坛：
+- 少数活跃用户贡献大部分帖子和回复，少数热门板块集中大部分帖子（Zipf 分布）；
+- 每个帖子的回复数呈长尾分布，大部分帖子只有几条回复，少数热帖有成百上千条；
+- 回复中约三成是楼中楼，时间都晚于所回复的内容；通知中较早的大多已读。
+
+全部使用 bulk_create 分批写入，帖子和其回复按批生成，内存占用与数据总量无关。
+bulk_create 不触发模型信号，帖子的回复数和最后回复时间在写入前算好，
+板块统计、用户统计、未读通知数和搜索索引在全部写入后统一重建。
+"""
+import itertools
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from . import rendering
+from .models import Forum, Notification, Post, Reply, UserProfile
+
+# 生成的用户名前缀，压力测试使用 <前缀>00001 等账号登录
+USERNAME_PREFIX = 'bench_'
+DEFAULT_PASSWORD = 'benchmark'
+
+# 生成通知时引用的帖子样本数
+POST_SAMPLE_SIZE = 10000
+
+_WORDS = (
+    'Django', 'Python', '数据库', '索引', '缓存', '性能', '部署', '模板', '视图', '中间件',
+    '查询', '分页', '异步', '测试', '迁移', '信号', '事务', '日志', '安全', '配置',
+    'Redis', 'PostgreSQL', 'SQLite', 'gunicorn', 'nginx', '前端', '接口', '并发', '优化', '经验',
+)
+_FORUM_NAMES = ('综合讨论', '技术交流', '问答求助', '经验分享', '资源推荐', '新手入门', '灌水闲聊', '站务公告')
+
+
+def _zipf_weights(count, exponent=1.1):
+    """第 k 名的权重为 1/k^exponent，返回累积权重（供 random.choices 使用）"""
+    return list(itertools.accumulate(1 / (rank ** exponent) for rank in range(1, count + 1)))
+
+
+def _sentence(rng, words):
+    return ''.join(rng.choice(_WORDS) for _ in range(words))
+
+
+def _long_tail(rng, mean):
+    """均值约为 mean 的长尾整数（Pareto 分布，alpha=1.5，截断在 50 倍均值）"""
+    if mean <= 0:
+        return 0
+    return min(int(mean * (rng.paretovariate(1.5) - 1) / 2), int(mean * 50))
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """临时关闭 auto_now / auto_now_add，使 bulk_create 写入生成的时间"""
+    saved = []
+    for model in models:
+        for field in model._meta.concrete_fields:
+            if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                saved.append((field, field.auto_now, field.auto_now_add))
+                field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class DatasetGenerator:
+    """
+    合成数据生成器
+
+    users / forums / posts / notifications 为生成的条数，replies 为回复的目标总数
+    （按长尾分布分配到各帖子，实际条数会有少量偏差）。相同 seed 生成相同的数据。
+    """
+
+    def __init__(self, users=1000, forums=8, posts=10000, replies=50000, notifications=20000,
+                 days=365, batch_size=1000, seed=0, password=DEFAULT_PASSWORD, progress=None):
+        self.counts = {
+            'users': users, 'forums': forums, 'posts': posts,
+            'replies': replies, 'notifications': notifications,
+        }
+        self.batch_size = batch_size
+        self.password = password
+        self.progress = progress
+        self.rng = random.Random(seed)
+        self.now = timezone.now()
+        self.start = self.now - timedelta(days=days)
+        self.created = dict.fromkeys(self.counts, 0)
+        self.user_ids = []
+        self.user_weights = []
+        # 通知引用的帖子：从生成的帖子中均匀抽样（蓄水池抽样）
+        self.post_sample = []
+        self._posts_seen = 0
+
+    def _report(self, kind, count):
+        self.created[kind] += count
+        if self.progress is not None:
+            self.progress(kind, self.created[kind])
+
+    def _random_time(self, after=None):
+        """after 之后（默认时间范围起点）到现在之间的随机时间，越靠近现在越密集"""
+        start = after or self.start
+        span = (self.now - start).total_seconds()
+        return start + timedelta(seconds=span * (1 - self.rng.random() ** 2))
+
+    def _sample_posts(self, posts):
+        for post in posts:
+            self._posts_seen += 1
+            if len(self.post_sample) < POST_SAMPLE_SIZE:
+                self.post_sample.append((post.pk, post.author_id))
+            else:
+                index = self.rng.randrange(self._posts_seen)
+                if index < POST_SAMPLE_SIZE:
+                    self.post_sample[index] = (post.pk, post.author_id)
+
+    def _pick_user(self):
+        return self.rng.choices(self.user_ids, cum_weights=self.user_weights)[0]
+
+    # ---------- 各类数据 ----------
+
+    def create_users(self):
+        password = make_password(self.password)
+        offset = User.objects.filter(username__startswith=USERNAME_PREFIX).count()
+        total = self.counts['users']
+        for start in range(0, total, self.batch_size):
+            users = [
+                User(
+                    username=f'{USERNAME_PREFIX}{offset + index:05d}',
+                    email=f'{USERNAME_PREFIX}{offset + index:05d}@example.com',
+                    password=password,
+                    date_joined=self._random_time(),
+                )
+                for index in range(start + 1, min(start + self.batch_size, total) + 1)
+            ]
+            with transaction.atomic():
+                User.objects.bulk_create(users)
+                UserProfile.objects.bulk_create([UserProfile(user=user) for user in users])
+            self.user_ids.extend(user.pk for user in users)
+            self._report('users', len(users))
+        # 活跃度与注册顺序无关
+        self.rng.shuffle(self.user_ids)
+        self.user_weights = _zipf_weights(len(self.user_ids))
+
+    def create_forums(self):
+        forums = []
+        for index in range(self.counts['forums']):
+            name = _FORUM_NAMES[index % len(_FORUM_NAMES)]
+            if index >= len(_FORUM_NAMES):
+                name = f'{name} {index // len(_FORUM_NAMES) + 1}'
+            forums.append(Forum(name=name, description=_sentence(self.rng, 6), order=index % 10 + 1))
+        Forum.objects.bulk_create(forums)
+        self._report('forums', len(forums))
+        return forums
+
+    def _build_post(self, forum):
+        created_at = self._random_time()
+        post = Post(
+            forum=forum,
+            author_id=self._pick_user(),
+            title=_sentence(self.rng, self.rng.randint(3, 8)),
+            content='\n'.join(_sentence(self.rng, self.rng.randint(10, 40)) for _ in range(self.rng.randint(1, 6))),
+            is_top=self.rng.random() < 0.005,
+            is_essence=self.rng.random() < 0.02,
+            view_count=_long_tail(self.rng, 200),
+            created_at=created_at,
+            updated_at=created_at,
+        )
+        # bulk_create 不调用 save，预渲染字段在这里生成
+        rendering.render_fields(post, rendering.POST_EXCERPT_LENGTH)
+        return post
+
+    def _build_replies(self, post, count):
+        """生成帖子的回复，返回 (顶层回复, 楼中楼)"""
+        roots, children = [], []
+        for _ in range(count):
+            if roots and self.rng.random() < 0.3:
+                parent = self.rng.choice(roots)
+                created_at = self._random_time(parent.created_at)
+            else:
+                parent = None
+                created_at = self._random_time(post.created_at)
+            reply = Reply(
+                post=post,
+                parent_reply=parent,
+                author_id=self._pick_user(),
+                content=_sentence(self.rng, self.rng.randint(4, 30)),
+                created_at=created_at,
+                updated_at=created_at,
+            )
+            rendering.render_fields(reply, rendering.REPLY_EXCERPT_LENGTH)
+            (roots if parent is None else children).append(reply)
+        return roots, children
+
+    def create_posts_and_replies(self, forums):
+        forum_weights = _zipf_weights(len(forums), exponent=0.8)
+        mean_replies = self.counts['replies'] / max(self.counts['posts'], 1)
+        total = self.counts['posts']
+        for start in range(0, total, self.batch_size):
+            size = min(self.batch_size, total - start)
+            posts = [self._build_post(forum) for forum in self.rng.choices(forums, cum_weights=forum_weights, k=size)]
+
+            # 回复数和最后回复时间在写入帖子前算好，不需要事后再更新
+            roots, children = [], []
+            for post in posts:
+                post_roots, post_children = self._build_replies(post, _long_tail(self.rng, mean_replies))
+                replies = post_roots + post_children
+                post.reply_count = len(replies)
+                post.last_reply_at = max((reply.created_at for reply in replies), default=None)
+                roots.extend(post_roots)
+                children.extend(post_children)
+
+            # 先写帖子、再写顶层回复、最后写楼中楼，bulk_create 会把取得的主键填入关联的外键
+            with transaction.atomic():
+                Post.objects.bulk_create(posts)
+                Reply.objects.bulk_create(roots, batch_size=self.batch_size)
+                Reply.objects.bulk_create(children, batch_size=self.batch_size)
+            self._sample_posts(posts)
+            self._report('posts', len(posts))
+            self._report('replies', len(roots) + len(children))
+
+    def create_notifications(self):
+        total = self.counts['notifications']
+        kinds = ('reply', 'mention', 'system')
+        for start in range(0, total, self.batch_size):
+            notifications = []
+            for _ in range(min(self.batch_size, total - start)):
+                kind = self.rng.choices(kinds, weights=(70, 20, 10))[0]
+                created_at = self._random_time()
+                notification = Notification(
+                    recipient_id=self._pick_user(),
+                    notification_type=kind,
+                    title=_sentence(self.rng, 4),
+                    content=_sentence(self.rng, 8),
+                    # 一周前的通知 90% 已读，最近的 40% 已读
+                    is_read=self.rng.random() < (0.9 if created_at < self.now - timedelta(days=7) else 0.4),
+                    created_at=created_at,
+                )
+                if kind != 'system' and self.post_sample:
+                    post_id, author_id = self.rng.choice(self.post_sample)
+                    if kind == 'reply':
+                        notification.recipient_id = author_id
+                    notification.sender_id = self._pick_user()
+                    notification.url = f'/post/{post_id}/'
+                notifications.append(notification)
+            Notification.objects.bulk_create(notifications)
+            self._report('notifications', len(notifications))
+
+    def rebuild_derived(self):
+        """重建 bulk_create 跳过的统计数据和索引"""
+        from . import hot, notification_counter, reputation, search
+
+        Forum.rebuild_stats()
+        hot.refresh(Post, batch_size=self.batch_size)
+        reputation.recompute(self.user_ids, chunk_size=self.batch_size)
+        notification_counter.rebuild(self.user_ids)
+        search.rebuild(batch_size=self.batch_size)
+
+    def generate(self):
+        """生成全部数据，返回各类数据实际生成的条数"""
+        with explicit_timestamps(Post, Reply, Notification):
+            self.create_users()
+            forums = self.create_forums()
+            self.create_posts_and_replies(forums)
+            self.create_notifications()
+        self.rebuild_derived()
+        return dict(self.created)
@@ -1,4 +1,1576 @@
-from django.test import TestCase
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
 
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.db.models.query import QuerySet
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
 
-# Create your tests here.
\ No newline at end of file
+from myproject.database import parse_database_url, sqlite_pragmas
+
+from . import fragment_cache, hot, notification_counter, notification_fanout, rendering, reply_thread, reputation, urls, view_counter
+from .models import Forum, Post, Reply, Notification, ReputationJob, Theme, ThemeVariable, UserProfile
+from .notification_stream import get_broker, publish_notification
+from .pagination import KeysetPaginator
+from .query_budget import QueryBudgetMixin, QueryStats
+from .theme_cache import get_active_theme, get_theme_css, get_themes, invalidate_theme_cache
+
+try:
+    import psycopg2
+except ImportError:
+    psycopg2 = None
+
+
+@skipUnless(connection.vendor in ('sqlite', 'postgresql'), '仅在 SQLite 和 PostgreSQL 上检查查询计划')
+class QueryPlanIndexTests(TestCase):
+    """确认列表页的热点查询命中了 0003_list_indexes 中的复合索引"""
+
+    # 查询计划中表示额外排序的标记
+    SORT_MARKERS = {'sqlite': 'TEMP B-TREE', 'postgresql': 'Sort'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', password='password')
+        cls.forum = Forum.objects.create(name='综合讨论')
+        cls.post = Post.objects.create(forum=cls.forum, author=cls.user, title='标题', content='内容')
+        Reply.objects.create(post=cls.post, author=cls.user, content='回复')
+        Notification.objects.create(recipient=cls.user, notification_type='system', title='通知', content='内容')
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            # 测试数据只有几行，不禁用顺序扫描时 PostgreSQL 不会选择索引
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+
+    def assertKeysetUsesIndex(self, queryset, ordering, index_name):
+        """游标分页的下一页查询：排序完全由索引提供，不需要额外排序"""
+        paginator = KeysetPaginator(queryset, ordering)
+        cursor = paginator.encode_cursor(queryset.get(), 'n')
+        plan = paginator.page_queryset(cursor)[:paginator.per_page + 1].explain()
+        self.assertIn(index_name, plan)
+        self.assertNotIn(self.SORT_MARKERS[connection.vendor], plan)
+
+    def test_forum_detail_latest_uses_index(self):
+        posts = Post.objects.filter(forum=self.forum, is_deleted=False, status='published')
+        self.assertKeysetUsesIndex(posts, Post.LATEST_ORDERING, 'post_forum_latest_idx')
+
+    def test_forum_detail_hot_uses_index(self):
+        posts = Post.objects.filter(forum=self.forum, is_deleted=False, status='published')
+        self.assertKeysetUsesIndex(posts, Post.HOT_ORDERING, 'post_forum_hot_idx')
+
+    def test_post_detail_replies_use_index(self):
+        replies = self.post.replies.filter(is_deleted=False).order_by('created_at')
+        self.assertUsesIndex(replies, 'reply_post_created_idx')
+
+    def test_unread_notifications_use_index(self):
+        unread = Notification.objects.filter(recipient=self.user, is_read=False)
+        self.assertUsesIndex(unread, 'notification_unread_idx')
+
+    def test_notification_list_uses_index(self):
+        self.assertKeysetUsesIndex(self.user.notifications.all(), Notification.LIST_ORDERING, 'notification_recent_idx')
+
+
+class KeysetIndexSqlTests(SimpleTestCase):
+    """可为空的降序字段在 PostgreSQL 上按空值在最后建立索引，SQLite 不支持 NULLS LAST"""
+
+    def create_sql(self, wrapper_class):
+        settings_dict = {
+            'ENGINE': '', 'NAME': ':memory:', 'USER': '', 'PASSWORD': '', 'HOST': '', 'PORT': '', 'OPTIONS': {},
+            'TIME_ZONE': None, 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'AUTOCOMMIT': True,
+            'ATOMIC_REQUESTS': False, 'TEST': {},
+        }
+        index = next(index for index in Post._meta.indexes if index.name == 'post_forum_latest_idx')
+        with wrapper_class(settings_dict, 'index-sql').schema_editor(collect_sql=True, atomic=False) as editor:
+            return str(index.create_sql(Post, editor))
+
+    @skipUnless(psycopg2 is not None, '需要 psycopg2')
+    def test_postgresql_nulls_last(self):
+        from django.db.backends.postgresql.base import DatabaseWrapper
+
+        sql = self.create_sql(DatabaseWrapper)
+        self.assertIn('"last_reply_at" DESC NULLS LAST', sql)
+        self.assertIn('"created_at" DESC,', sql)
+
+    def test_sqlite_plain_desc(self):
+        from django.db.backends.sqlite3.base import DatabaseWrapper
+
+        sql = self.create_sql(DatabaseWrapper)
+        self.assertIn('"last_reply_at" DESC,', sql)
+        self.assertNotIn('NULLS', sql)
+
+
+# ==================== 测试数据 ====================
+
+def make_user(username, **kwargs):
+    return User.objects.create_user(username=username, password='password', **kwargs)
+
+
+def make_forum(name, **kwargs):
+    return Forum.objects.create(name=name, description=f'{name}板块', **kwargs)
+
+
+def make_post(forum, author, title, **kwargs):
+    kwargs.setdefault('content', f'{title}的正文内容，用于测试帖子列表和详情页。')
+    return Post.objects.create(forum=forum, author=author, title=title, **kwargs)
+
+
+def make_reply(post, author, parent_reply=None, **kwargs):
+    kwargs.setdefault('content', f'{author.username}的回复')
+    return Reply.objects.create(post=post, author=author, parent_reply=parent_reply, **kwargs)
+
+
+def make_notification(recipient, sender=None, **kwargs):
+    kwargs.setdefault('notification_type', 'system')
+    kwargs.setdefault('title', '系统通知')
+    kwargs.setdefault('content', '通知内容')
+    return Notification.objects.create(recipient=recipient, sender=sender, **kwargs)
+
+
+def seed_forum_data(posts_per_forum=12, replies_per_post=6):
+    """
+    生成接近真实情况的论坛数据：多个板块和用户，帖子带有置顶、精华，回复带有楼中楼，
+    每个用户都有已读和未读通知。查询预算不应随数据量增长，数据量只需足以暴露 N+1 问题。
+    主题使用数据迁移创建的初始主题。
+    """
+    data = type('SeedData', (), {})()
+    data.users = [make_user(f'user{index}') for index in range(6)]
+    data.staff = make_user('moderator', is_staff=True)
+    data.forums = [make_forum(name) for name in ('综合讨论', '技术交流', '站务公告')]
+    data.theme = Theme.objects.get(identifier='light')
+    data.other_theme = Theme.objects.get(identifier='dark')
+
+    data.posts = []
+    for forum in data.forums:
+        for index in range(posts_per_forum):
+            author = data.users[index % len(data.users)]
+            post = make_post(
+                forum, author, f'{forum.name}的第{index}个帖子',
+                is_top=index == 0, is_essence=index % 5 == 0,
+            )
+            data.posts.append(post)
+            parent = None
+            for reply_index in range(replies_per_post):
+                replier = data.users[(index + reply_index + 1) % len(data.users)]
+                reply = make_reply(post, replier, parent_reply=parent if reply_index % 2 else None)
+                parent = reply
+
+    data.post = data.posts[1]
+    for user in data.users + [data.staff]:
+        for index in range(3):
+            make_notification(user, sender=data.users[0], is_read=index == 0)
+    return data
+
+
+# ==================== 查询预算 ====================
+
+@override_settings(
+    VIEW_COUNT_FLUSH_INTERVAL=0,
+    NOTIFICATION_STREAM_MAX_DURATION=0,
+    NOTIFICATION_POLL_TIMEOUT=0,
+)
+class ViewQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """
+    myapp/urls.py 中每个 URL 的查询预算
+
+    预算在片段缓存为空时测量（最坏情况），包含会话和当前用户的查询；主题缓存已预热。
+    新增 URL 时必须在 BUDGETS 中声明预算，否则 test_every_url_has_budget 失败。
+    """
+
+    BUDGETS = {
+        'index': 0,
+        'theme_list': 0,
+        'create_theme': 0,
+        'edit_theme': 1,
+        'delete_theme': 4,
+        'switch_theme': 3,
+        'theme_css': 2,
+        'get_theme_variables': 0,
+        'forum_index': 4,
+        'forum_detail': 6,
+        'post_create': 4,
+        'post_detail': 8,
+        'post_edit': 9,
+        'post_delete': 11,
+        'add_reply': 14,
+        'delete_reply': 10,
+        'user_profile': 7,
+        'user_profile_detail': 8,
+        'notifications': 8,
+        'mark_notification_read': 7,
+        'notification_stream': 3,
+        'notification_poll': 2,
+        'toggle_essence': 9,
+        'toggle_top': 8,
+        'login': 0,
+        'logout': 4,
+        'signup': 0,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_forum_data()
+
+    def setUp(self):
+        cache.clear()
+        invalidate_theme_cache()
+        # 主题数据常驻进程内缓存，预热后预算只计视图本身的查询
+        get_themes()
+        get_active_theme()
+        get_theme_css('light')
+
+    def request(self, name, kwargs=None, method='get', user=None, data=None, status=200, **extra):
+        """请求 URL 并断言查询预算和状态码；流式响应读取完整内容后才计算"""
+        if user is not None:
+            self.client.force_login(user)
+        url = reverse(name, kwargs=kwargs)
+
+        def fetch():
+            response = getattr(self.client, method)(url, data or {}, **extra)
+            if response.streaming:
+                response.streamed_content = b''.join(response)
+            return response
+
+        response = self.assertQueryBudget(self.BUDGETS[name], fetch)
+        self.assertEqual(response.status_code, status)
+        return response
+
+    def test_every_url_has_budget(self):
+        names = {pattern.name for pattern in urls.urlpatterns}
+        self.assertEqual(names, set(self.BUDGETS))
+
+    # ---------- 主题 ----------
+
+    def test_index(self):
+        self.request('index')
+
+    def test_theme_list(self):
+        self.request('theme_list')
+
+    def test_create_theme(self):
+        self.request('create_theme', status=302)
+
+    def test_edit_theme(self):
+        self.request('edit_theme', {'theme_id': self.data.theme.pk}, status=302)
+
+    def test_delete_theme(self):
+        self.request('delete_theme', {'theme_id': self.data.other_theme.pk}, status=302)
+
+    def test_switch_theme(self):
+        self.request('switch_theme', {'theme_id': self.data.other_theme.pk}, status=302)
+
+    def test_theme_css(self):
+        version = get_theme_css('light')['version']
+        cache.clear()
+        invalidate_theme_cache()
+        self.request('theme_css', {'identifier': 'light', 'version': version})
+
+    def test_get_theme_variables(self):
+        self.request('get_theme_variables', method='post')
+
+    # ---------- 论坛 ----------
+
+    def test_forum_index(self):
+        self.request('forum_index', user=self.data.users[0])
+
+    def test_forum_detail(self):
+        self.request('forum_detail', {'forum_id': self.data.forums[0].pk}, user=self.data.users[0])
+
+    def test_forum_detail_anonymous_cached(self):
+        url = reverse('forum_detail', kwargs={'forum_id': self.data.forums[0].pk})
+        self.client.get(url)
+        # 片段缓存命中后只剩板块本身的查询
+        self.assertQueryBudget(1, self.client.get, url)
+
+    def test_post_create(self):
+        self.request('post_create', {'forum_id': self.data.forums[0].pk}, user=self.data.users[0])
+
+    def test_post_detail(self):
+        self.request('post_detail', {'post_id': self.data.post.pk}, user=self.data.users[0])
+
+    def test_post_edit(self):
+        data = {'title': '新标题', 'content': '新内容'}
+        self.request('post_edit', {'post_id': self.data.post.pk}, 'post', self.data.post.author, data, status=302)
+
+    def test_post_delete(self):
+        self.request('post_delete', {'post_id': self.data.post.pk}, method='post', user=self.data.post.author, status=302)
+
+    def test_add_reply(self):
+        self.request(
+            'add_reply', {'post_id': self.data.post.pk}, method='post', user=self.data.users[5],
+            data={'content': f'回复 @{self.data.users[2].username}'}, status=302,
+        )
+
+    def test_delete_reply(self):
+        reply = self.data.post.replies.first()
+        self.request('delete_reply', {'reply_id': reply.pk}, method='post', user=reply.author, status=302)
+
+    def test_toggle_essence(self):
+        self.request('toggle_essence', {'post_id': self.data.post.pk}, method='post', user=self.data.staff)
+
+    def test_toggle_top(self):
+        self.request('toggle_top', {'post_id': self.data.post.pk}, method='post', user=self.data.staff)
+
+    # ---------- 用户与通知 ----------
+
+    def test_user_profile(self):
+        self.request('user_profile', user=self.data.users[0])
+
+    def test_user_profile_detail(self):
+        self.request('user_profile_detail', {'username': self.data.users[1].username}, user=self.data.users[0])
+
+    def test_notifications(self):
+        self.request('notifications', user=self.data.users[0])
+
+    def test_mark_notification_read(self):
+        notification = self.data.users[0].notifications.filter(is_read=False).first()
+        self.request(
+            'mark_notification_read', {'notification_id': notification.pk}, method='post', user=self.data.users[0]
+        )
+
+    def test_notification_stream(self):
+        # 事件流只在 ASGI 下提供，通过异步测试客户端请求并读完整个流
+        self.async_client.force_login(self.data.users[0])
+        url = reverse('notification_stream')
+
+        async def fetch():
+            response = await self.async_client.get(url)
+            response.streamed_content = b''.join([chunk async for chunk in response.streaming_content])
+            return response
+
+        response = self.assertQueryBudget(self.BUDGETS['notification_stream'], async_to_sync(fetch))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'event: unread', response.streamed_content)
+
+    def test_notification_stream_under_wsgi(self):
+        self.client.force_login(self.data.users[0])
+        response = self.assertQueryBudget(0, self.client.get, reverse('notification_stream'))
+        self.assertEqual(response.status_code, 204)
+
+    def test_notification_poll(self):
+        self.request('notification_poll', user=self.data.users[0])
+
+    # ---------- 认证 ----------
+
+    def test_login(self):
+        self.request('login')
+
+    def test_logout(self):
+        self.request('logout', method='post', user=self.data.users[0], status=302)
+
+    def test_signup(self):
+        self.request('signup')
+
+
+# ==================== 用户资料写入 ====================
+
+class UserProfileWriteTests(TestCase):
+    """只保存 User 的操作不应查询或写入用户资料，资料改动只写回改动的字段"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('writer')
+
+    def profile_queries(self, func, *args, **kwargs):
+        with QueryStats() as stats:
+            result = func(*args, **kwargs)
+        return result, [sql for sql, _, _ in stats.queries if 'myapp_userprofile' in sql]
+
+    def test_login_does_not_touch_profile(self):
+        updated_at = UserProfile.objects.get(user=self.user).updated_at
+        response, queries = self.profile_queries(
+            self.client.post, reverse('login'), {'username': 'writer', 'password': 'password'}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(queries, [])
+        self.assertEqual(UserProfile.objects.get(user=self.user).updated_at, updated_at)
+
+    def test_user_save_with_unchanged_profile(self):
+        user = User.objects.select_related('profile').get(pk=self.user.pk)
+        _, queries = self.profile_queries(user.save)
+        self.assertEqual(queries, [])
+
+    def test_changed_fields_are_saved_without_stale_counters(self):
+        user = User.objects.select_related('profile').get(pk=self.user.pk)
+        # 资料加载后统计被其他请求原子地修改
+        UserProfile.apply_stats_delta(user.pk, posts=1)
+        user.profile.bio = '新的简介'
+        _, queries = self.profile_queries(user.save)
+
+        self.assertEqual(len(queries), 1)
+        self.assertIn('"bio"', queries[0])
+        self.assertNotIn('"post_count"', queries[0])
+        profile = UserProfile.objects.get(user=user)
+        self.assertEqual(profile.bio, '新的简介')
+        self.assertEqual(profile.post_count, 1)
+
+
+# ==================== 条件请求 ====================
+
+class ConditionalGetTests(QueryBudgetMixin, TestCase):
+    """帖子页和板块页在内容未变化时返回 304，且不执行渲染所需的查询"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('reader')
+        cls.forum = make_forum('综合讨论')
+        cls.post = make_post(cls.forum, cls.user, '标题')
+
+    def setUp(self):
+        cache.clear()
+        invalidate_theme_cache()
+        get_active_theme()
+        get_theme_css('light')
+
+    def revalidate(self, url, response, queries):
+        return self.assertQueryBudget(queries, self.client.get, url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_post_detail_not_modified(self):
+        url = reverse('post_detail', kwargs={'post_id': self.post.pk})
+        response = self.client.get(url)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        # 只查询验证值
+        revalidated = self.revalidate(url, response, 1)
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated['ETag'], response['ETag'])
+
+    def test_post_detail_modified_by_reply(self):
+        url = reverse('post_detail', kwargs={'post_id': self.post.pk})
+        response = self.client.get(url)
+        make_reply(self.post, self.user)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_post_detail_modified_by_author_stats(self):
+        # 作者在其他帖子下回复，只以 F() 表达式更新资料中的回复数
+        url = reverse('post_detail', kwargs={'post_id': self.post.pk})
+        response = self.client.get(url)
+        make_reply(make_post(self.forum, make_user('other'), '其他帖子'), self.user)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def written_by_other_process(self):
+        """其他进程中的写入：本进程的片段缓存版本号不变"""
+        return mock.patch.object(fragment_cache, 'bump')
+
+    def test_post_detail_modified_by_reply_removed_in_other_process(self):
+        # 回复者不是帖子作者，作者的统计不变
+        reply = make_reply(self.post, make_user('other'))
+        url = reverse('post_detail', kwargs={'post_id': self.post.pk})
+        response = self.client.get(url)
+        with self.written_by_other_process():
+            reply.is_deleted = True
+            reply.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_forum_detail_modified_in_other_process(self):
+        url = reverse('forum_detail', kwargs={'forum_id': self.forum.pk})
+        response = self.client.get(url)
+        with self.written_by_other_process():
+            make_reply(self.post, self.user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+        with self.written_by_other_process():
+            Post.objects.get(pk=self.post.pk).save(update_fields=['is_top', 'updated_at'])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_post_detail_with_queued_messages(self):
+        other = make_user('other')
+        self.client.force_login(other)
+        url = reverse('post_detail', kwargs={'post_id': self.post.pk})
+        response = self.client.get(url)
+
+        # 无权编辑时提示消息后重定向到帖子页，带消息的页面不能返回 304
+        self.client.get(reverse('post_edit', kwargs={'post_id': self.post.pk}))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+        self.assertIn('no-store', response['Cache-Control'])
+
+    def test_forum_detail_not_modified(self):
+        url = reverse('forum_detail', kwargs={'forum_id': self.forum.pk})
+        response = self.client.get(url)
+        # 只查询板块本身
+        self.assertEqual(self.revalidate(url, response, 1).status_code, 304)
+
+        make_post(self.forum, self.user, '新帖子')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_logged_in_response_is_private(self):
+        url = reverse('post_detail', kwargs={'post_id': self.post.pk})
+        anonymous = self.client.get(url)
+        self.client.force_login(self.user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=anonymous['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertFalse(response.has_header('Last-Modified'))
+
+
+# ==================== 删除用户 ====================
+
+class UserDeletionTests(TestCase):
+    """删除用户时级联删除其帖子和回复，统计调整不能为已删除的用户安排声望重算"""
+
+    def test_delete_user_with_posts_and_replies(self):
+        author, other = make_user('author'), make_user('other')
+        forum = make_forum('综合讨论')
+        own_post = make_post(forum, author, '作者的帖子')
+        other_post = make_post(forum, other, '其他人的帖子')
+        make_reply(own_post, other)
+        make_reply(other_post, author)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            author.delete()
+
+        self.assertFalse(User.objects.filter(pk=author.pk).exists())
+        self.assertFalse(Post.objects.filter(pk=own_post.pk).exists())
+        # 其他用户在被删帖子下的回复也被删除，仍需重算
+        self.assertEqual(list(ReputationJob.objects.values_list('user_id', flat=True)), [other.pk])
+
+
+# ==================== 浏览次数写回 ====================
+
+class ViewCountFlushTests(TestCase):
+    """浏览次数先在缓存中累计，批量写回；同一时间只有一个进程写回，锁只能由持有者释放"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = make_user('reader')
+        cls.post = make_post(make_forum('综合讨论'), user, '标题')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_flush_skipped_while_another_flush_holds_the_lock(self):
+        view_counter.record_view(self.post.pk)
+        view_counter.record_view(self.post.pk)
+
+        other = view_counter._CacheLock(view_counter.FLUSH_LOCK_KEY, wait=0)
+        self.assertTrue(other.acquire())
+        self.assertEqual(view_counter.flush(), (0, 0))
+        other.release()
+
+        self.assertEqual(view_counter.flush(), (1, 2))
+        self.assertEqual(view_counter.flush(), (0, 0))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.view_count, 2)
+        self.assertEqual(view_counter.pending_views(self.post.pk), 0)
+
+    def test_views_buffered_in_cache(self):
+        with QueryStats() as stats:
+            for _ in range(3):
+                view_counter.record_view(self.post.pk)
+        self.assertEqual(len(stats.queries), 0)
+        self.assertEqual(view_counter.pending_views(self.post.pk), 3)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).view_count, 0)
+
+        # 帖子页显示的浏览次数包含尚未写回的部分
+        response = self.client.get(reverse('post_detail', kwargs={'post_id': self.post.pk}))
+        self.assertEqual(response.context['post'].view_count, 4)
+
+    def test_flush_groups_equal_increments(self):
+        user = make_user('author')
+        posts = [make_post(self.post.forum, user, f'帖子{i}') for i in range(3)]
+        for post, views in zip(posts, (2, 2, 1)):
+            for _ in range(views):
+                view_counter.record_view(post.pk)
+
+        with QueryStats() as stats:
+            self.assertEqual(view_counter.flush(), (3, 5))
+        updates = [sql for sql, _, _ in stats.queries if sql.startswith('UPDATE "myapp_post"')]
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(
+            list(Post.objects.filter(pk__in=[post.pk for post in posts]).order_by('pk').values_list('view_count', flat=True)),
+            [2, 2, 1],
+        )
+
+    def test_views_after_flush_kept_for_next_flush(self):
+        view_counter.record_view(self.post.pk)
+        view_counter.flush()
+        view_counter.record_view(self.post.pk)
+        self.assertEqual(view_counter.pending_views(self.post.pk), 1)
+        self.assertEqual(view_counter.flush(), (1, 1))
+        self.assertEqual(Post.objects.get(pk=self.post.pk).view_count, 2)
+
+    def test_failed_flush_keeps_counts(self):
+        view_counter.record_view(self.post.pk)
+        with mock.patch.object(hot, 'adjusted', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                view_counter.flush()
+        self.assertEqual(view_counter.pending_views(self.post.pk), 1)
+
+        self.assertEqual(view_counter.flush(), (1, 1))
+        self.assertEqual(Post.objects.get(pk=self.post.pk).view_count, 1)
+
+    @override_settings(VIEW_COUNT_DEDUPE_WINDOW=60)
+    def test_repeated_view_deduplicated(self):
+        request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.1')
+        self.assertTrue(view_counter.record_view(self.post.pk, request))
+        self.assertFalse(view_counter.record_view(self.post.pk, request))
+        self.assertTrue(view_counter.record_view(self.post.pk, RequestFactory().get('/', REMOTE_ADDR='10.0.0.2')))
+        self.assertEqual(view_counter.pending_views(self.post.pk), 2)
+
+    def test_release_keeps_a_lock_taken_over_after_expiry(self):
+        lock = view_counter._CacheLock('test:lock', wait=0)
+        self.assertTrue(lock.acquire())
+        # 锁过期后被其他进程获得
+        cache.set('test:lock', 'other', None)
+        lock.release()
+        self.assertEqual(cache.get('test:lock'), 'other')
+
+
+# ==================== 帖子管理操作 ====================
+
+class PostStaleWriteTests(TestCase):
+    """编辑、删除、置顶、精华只写回修改的字段，不覆盖其他请求原子更新的计数和热度"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = make_user('moderator', is_staff=True)
+        cls.post = make_post(make_forum('综合讨论'), cls.staff, '标题')
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def assertCountersKept(self, action, data=None):
+        """视图读出帖子后，其他请求增加了回复和浏览次数"""
+        loaded = Post.from_db.__func__
+        concurrent = []
+
+        def from_db(cls, *args):
+            instance = loaded(cls, *args)
+            if not concurrent:
+                concurrent.append(instance)
+                make_reply(self.post, self.staff)
+                self.post.increase_view_count(10)
+            return instance
+
+        with mock.patch.object(Post, 'from_db', classmethod(from_db)):
+            self.client.post(reverse(action, kwargs={'post_id': self.post.pk}), data or {})
+
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual((post.reply_count, post.view_count), (1, 10))
+        self.assertAlmostEqual(post.hot_score, hot.score_post(post))
+        return post
+
+    def test_post_edit(self):
+        self.assertEqual(self.assertCountersKept('post_edit', {'title': '新标题', 'content': '新内容'}).title, '新标题')
+
+    def test_post_delete(self):
+        self.assertTrue(self.assertCountersKept('post_delete').is_deleted)
+
+    def test_toggle_essence(self):
+        self.assertTrue(self.assertCountersKept('toggle_essence').is_essence)
+
+    def test_toggle_top(self):
+        self.assertTrue(self.assertCountersKept('toggle_top').is_top)
+
+
+# ==================== 片段缓存失效 ====================
+
+class ReplyFragmentInvalidationTests(TestCase):
+    """回复变化时使帖子页和板块列表失效，只为板块 ID 查询帖子的一列"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_reply_delete_bumps_forum_without_loading_post(self):
+        user = make_user('author')
+        forum = make_forum('综合讨论')
+        reply = make_reply(make_post(forum, user, '标题'), user)
+        reply = Reply.objects.get(pk=reply.pk)
+        forum_version = fragment_cache.get_version('forum', forum.pk)
+
+        with QueryStats() as stats:
+            reply.delete()
+
+        self.assertNotEqual(fragment_cache.get_version('forum', forum.pk), forum_version)
+        post_queries = [sql for sql, _, _ in stats.queries if sql.startswith('SELECT') and 'FROM "myapp_post"' in sql]
+        self.assertEqual(len(post_queries), 1)
+        self.assertNotIn('"content"', post_queries[0])
+
+    def test_reply_in_other_process_reaches_cached_fragments(self):
+        # 进程内缓存时其他进程的写入不会更换本进程的版本号，片段键中的板块 updated_at 仍会变化
+        user = make_user('author')
+        forum = make_forum('综合讨论')
+        post = make_post(forum, user, '标题')
+        post_url = reverse('post_detail', kwargs={'post_id': post.pk})
+        forum_url = reverse('forum_detail', kwargs={'forum_id': forum.pk})
+        self.client.get(post_url)
+        self.assertNotContains(self.client.get(forum_url), '最后回复')
+
+        with mock.patch.object(fragment_cache, 'bump'):
+            make_reply(post, make_user('other'), content='其他进程中的回复')
+
+        self.assertContains(self.client.get(post_url), '其他进程中的回复')
+        self.assertContains(self.client.get(forum_url), '最后回复')
+
+
+# ==================== 数据库配置 ====================
+
+class DatabaseUrlTests(SimpleTestCase):
+    """连接串的查询参数按驱动要求的类型放入 OPTIONS"""
+
+    def test_sqlite_options_are_cast(self):
+        config = parse_database_url('sqlite:///db.sqlite3?timeout=20&check_same_thread=false', '/srv')
+        self.assertEqual(config['OPTIONS'], {'timeout': 20.0, 'check_same_thread': False})
+        self.assertEqual(str(config['NAME']), '/srv/db.sqlite3')
+
+    def test_postgres_options(self):
+        config = parse_database_url('postgres://forum:secret@db:5432/forum?sslmode=require&isolation_level=1', '/srv')
+        self.assertEqual(config['OPTIONS'], {'sslmode': 'require', 'isolation_level': 1})
+
+    def test_invalid_option_value(self):
+        with self.assertRaises(ImproperlyConfigured):
+            parse_database_url('sqlite:///db.sqlite3?timeout=soon', '/srv')
+
+
+class SqliteTunedTests(SimpleTestCase):
+    """调优后端在新连接上执行 PRAGMA，事务以 BEGIN IMMEDIATE 开启"""
+
+    def test_profiles(self):
+        self.assertEqual(sqlite_pragmas('default', busy_timeout='100'), {})
+        pragmas = sqlite_pragmas('production', busy_timeout='100', mmap_size=None)
+        self.assertEqual(pragmas['journal_mode'], 'WAL')
+        self.assertEqual(pragmas['busy_timeout'], 100)
+        self.assertEqual(pragmas['mmap_size'], 256 * 1024 * 1024)
+        with self.assertRaises(ImproperlyConfigured):
+            sqlite_pragmas('fast')
+
+    def connect(self, path):
+        from myproject.sqlite_tuned.base import DatabaseWrapper
+
+        settings_dict = {
+            'ENGINE': 'myproject.sqlite_tuned', 'NAME': path, 'USER': '', 'PASSWORD': '', 'HOST': '', 'PORT': '',
+            'OPTIONS': {}, 'TIME_ZONE': None, 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'AUTOCOMMIT': True,
+            'ATOMIC_REQUESTS': False, 'TEST': {},
+            'PRAGMAS': sqlite_pragmas('production', busy_timeout=50),
+        }
+        wrapper = DatabaseWrapper(settings_dict, 'sqlite-tuned')
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def test_pragmas_applied_and_transactions_take_write_lock(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'tuned.sqlite3')
+            wrapper = self.connect(path)
+            with wrapper.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                self.assertEqual(cursor.fetchone()[0], 'wal')
+                cursor.execute('PRAGMA busy_timeout')
+                self.assertEqual(cursor.fetchone()[0], 50)
+                cursor.execute('PRAGMA synchronous')
+                self.assertEqual(cursor.fetchone()[0], 1)
+
+            other = sqlite3.connect(path, timeout=0, isolation_level=None)
+            self.addCleanup(other.close)
+            # 与 transaction.atomic 相同的方式开启事务：尚未写入就已持有写锁
+            wrapper.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+            with self.assertRaisesMessage(sqlite3.OperationalError, 'database is locked'):
+                other.execute('BEGIN IMMEDIATE')
+            wrapper.rollback()
+            wrapper.set_autocommit(True)
+
+            other.execute('BEGIN IMMEDIATE')
+            other.execute('ROLLBACK')
+            other.close()
+            wrapper.close()
+
+
+# ==================== 全文搜索 ====================
+
+class PostSearchTests(TestCase):
+    """板块页按关键词搜索帖子，结果按相关度排序"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = make_user('author')
+        cls.forum = make_forum('综合讨论')
+        cls.match = make_post(cls.forum, user, '数据库索引', content='复合索引的列顺序')
+        make_post(cls.forum, user, '前端样式', content='主题颜色')
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query):
+        return self.client.get(reverse('forum_detail', kwargs={'forum_id': self.forum.pk}), {'search': query})
+
+    def test_search_finds_post(self):
+        response = self.search('索引')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([post.id for post in response.context['posts']], [self.match.pk])
+
+    def test_search_without_terms(self):
+        # 只有标点时切分不出关键词，不能因为缺少 search_rank 而出错
+        response = self.search('!!!')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['posts']), [])
+
+
+# ==================== PostgreSQL 连接池 ====================
+
+class FakePgConnection:
+    """代替 psycopg2 连接，只实现连接池用到的方法"""
+
+    def __init__(self, healthy=True):
+        self.closed = 0
+        self.healthy = healthy
+        self.rollbacks = 0
+
+    def cursor(self):
+        if not self.healthy:
+            raise psycopg2.OperationalError('server closed the connection unexpectedly')
+        return mock.MagicMock()
+
+    def rollback(self):
+        if not self.healthy:
+            raise psycopg2.OperationalError('server closed the connection unexpectedly')
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = 1
+
+
+@skipUnless(psycopg2 is not None, '需要 psycopg2')
+class PostgresPoolTests(SimpleTestCase):
+    """连接池的取出、归还、等待超时、失效连接和 atomic 块中的关闭"""
+
+    def setUp(self):
+        from myproject.postgresql_pool import base as pool_base
+
+        self.pool_base = pool_base
+        self.alias = f'pool-{self._testMethodName}'
+        self.addCleanup(pool_base._pools.pop, self.alias, None)
+        self.opened = []
+
+        def connect(wrapper, conn_params):
+            # 与 Django 的实现一样记录连接的隔离级别
+            wrapper.isolation_level = psycopg2.extensions.ISOLATION_LEVEL_READ_COMMITTED
+            connection = FakePgConnection()
+            self.opened.append(connection)
+            return connection
+
+        patcher = mock.patch('django.db.backends.postgresql.base.DatabaseWrapper.get_new_connection', connect)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def wrapper(self, max_size=2, timeout=0.01):
+        settings_dict = {
+            'ENGINE': 'myproject.postgresql_pool', 'NAME': 'forum', 'USER': '', 'PASSWORD': '', 'HOST': '',
+            'PORT': '', 'OPTIONS': {}, 'CONN_HEALTH_CHECKS': True, 'CONN_MAX_AGE': 0, 'TIME_ZONE': None,
+            'ATOMIC_REQUESTS': False, 'AUTOCOMMIT': True, 'TEST': {},
+            'POOL': {'MAX_SIZE': max_size, 'TIMEOUT': timeout},
+        }
+        return self.pool_base.DatabaseWrapper(settings_dict, self.alias)
+
+    def open(self, wrapper):
+        wrapper.connection = wrapper.get_new_connection({})
+        return wrapper.connection
+
+    def test_closed_connection_is_reused(self):
+        first = self.wrapper()
+        connection = self.open(first)
+        first.close()
+        self.assertIsNone(first.connection)
+        self.assertEqual(connection.rollbacks, 1)
+        self.assertFalse(connection.closed)
+
+        second = self.wrapper()
+        self.assertIs(self.open(second), connection)
+        self.assertEqual(len(self.opened), 1)
+
+    def test_acquire_times_out_when_pool_is_full(self):
+        self.open(self.wrapper(max_size=1))
+        with self.assertRaises(psycopg2.OperationalError):
+            self.open(self.wrapper(max_size=1))
+
+    def test_broken_idle_connection_is_discarded(self):
+        first = self.wrapper(max_size=1)
+        broken = self.open(first)
+        first.close()
+        broken.healthy = False
+
+        second = self.wrapper(max_size=1)
+        connection = self.open(second)
+        self.assertIsNot(connection, broken)
+        self.assertTrue(broken.closed)
+
+    def test_rollback_failure_releases_slot(self):
+        first = self.wrapper(max_size=1)
+        self.open(first).healthy = False
+        with self.assertRaises(DatabaseError):
+            first.close()
+        # 失效的连接已丢弃，名额已归还
+        self.assertIsNot(self.open(self.wrapper(max_size=1)), self.opened[0])
+
+    def test_close_inside_atomic_block_is_not_returned(self):
+        first = self.wrapper(max_size=1)
+        connection = self.open(first)
+        first.in_atomic_block = True
+        first.close()
+        # Django 仍保留 connection，池中不能再有同一个连接
+        self.assertIs(first.connection, connection)
+        self.assertTrue(first.closed_in_transaction)
+        self.assertTrue(connection.closed)
+
+        second = self.wrapper(max_size=1)
+        self.assertIsNot(self.open(second), connection)
+
+
+# ==================== 声望重算 ====================
+
+class ReputationRecomputeTests(TestCase):
+    """recompute_reputation 按帖子和回复精确重算统计，--pending 只处理并清空重算队列"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.other = make_user('author'), make_user('other')
+        forum = make_forum('综合讨论')
+        post = make_post(forum, cls.author, '精华帖', is_essence=True)
+        make_post(forum, cls.author, '普通帖')
+        make_reply(post, cls.author)
+
+    def setUp(self):
+        # 模拟统计偏差
+        UserProfile.objects.update(post_count=9, reply_count=9, essence_count=9, reputation=0)
+
+    def run_command(self, *args):
+        output = StringIO()
+        call_command('recompute_reputation', *args, stdout=output)
+        return output.getvalue()
+
+    def stats(self, user):
+        profile = UserProfile.objects.get(user=user)
+        return profile.post_count, profile.reply_count, profile.essence_count, profile.reputation
+
+    def expected(self, posts, replies, essences):
+        reputation = (
+            posts * UserProfile.POST_REPUTATION
+            + replies * UserProfile.REPLY_REPUTATION
+            + essences * UserProfile.ESSENCE_REPUTATION
+        )
+        return posts, replies, essences, reputation
+
+    def test_recompute_all(self):
+        self.assertIn('已处理 2 个用户，更新 2 个', self.run_command('--chunk-size', '1'))
+        self.assertEqual(self.stats(self.author), self.expected(2, 1, 1))
+        self.assertEqual(self.stats(self.other), self.expected(0, 0, 0))
+
+    def test_pending_drains_queue(self):
+        ReputationJob.schedule([self.author.pk])
+        self.run_command('--pending')
+        self.assertEqual(self.stats(self.author), self.expected(2, 1, 1))
+        # 不在队列中的用户不处理
+        self.assertEqual(self.stats(self.other), (9, 9, 9, 0))
+        self.assertFalse(ReputationJob.objects.exists())
+
+    def test_job_requested_during_processing_is_kept(self):
+        ReputationJob.schedule([self.author.pk])
+        recompute = reputation.recompute
+
+        def recompute_and_request_again(*args, **kwargs):
+            result = recompute(*args, **kwargs)
+            ReputationJob.schedule([self.author.pk])
+            return result
+
+        with mock.patch.object(reputation, 'recompute', recompute_and_request_again):
+            self.run_command('--pending')
+        self.assertTrue(ReputationJob.objects.filter(user=self.author).exists())
+
+    def test_profiles_locked_before_aggregating(self):
+        calls = []
+        select_for_update = QuerySet.select_for_update
+        aggregate = reputation._aggregate
+
+        def locking(queryset, *args, **kwargs):
+            calls.append('lock')
+            return select_for_update(queryset, *args, **kwargs)
+
+        def aggregating(user_ids):
+            calls.append('aggregate')
+            return aggregate(user_ids)
+
+        with mock.patch.object(QuerySet, 'select_for_update', locking), \
+                mock.patch.object(reputation, '_aggregate', aggregating):
+            reputation.recompute()
+        self.assertEqual(calls[:2], ['lock', 'aggregate'])
+
+
+# ==================== 通知保留 ====================
+
+class NotificationRetentionTests(TestCase):
+    """compact_notifications 按批删除通知，不逐行发送信号，未读计数按批调整后与通知表一致"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('reader')
+
+    def run_command(self, *args):
+        call_command('compact_notifications', *args, stdout=StringIO())
+
+    def assertUnreadCountConsistent(self):
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertEqual(
+            profile.unread_notification_count, Notification.objects.filter(recipient=self.user, is_read=False).count()
+        )
+
+    def test_collapse_replies(self):
+        for is_read in (False, False, True):
+            make_notification(self.user, notification_type='reply', url='/post/1/', is_read=is_read)
+        other = make_notification(self.user, notification_type='reply', url='/post/2/')
+
+        self.run_command('--keep', '0', '--read-days', '0')
+
+        kept = Notification.objects.get(recipient=self.user, url='/post/1/')
+        self.assertEqual(kept.aggregate_count, 3)
+        self.assertFalse(kept.is_read)
+        self.assertEqual(kept.title, '您的帖子收到了 3 条回复')
+        self.assertTrue(Notification.objects.filter(pk=other.pk).exists())
+        self.assertUnreadCountConsistent()
+
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get(reverse('notifications')), '合并 3 条')
+
+    def test_drop_expired_read_notifications(self):
+        expired = make_notification(self.user, is_read=True)
+        unread = make_notification(self.user)
+        Notification.objects.filter(pk__in=[expired.pk, unread.pk]).update(created_at=timezone.now() - timedelta(days=100))
+
+        self.run_command('--keep', '0', '--read-days', '90')
+        self.assertEqual(list(Notification.objects.values_list('pk', flat=True)), [unread.pk])
+        self.assertUnreadCountConsistent()
+
+    def test_keep_recent_in_constant_queries(self):
+        notifications = [make_notification(self.user) for _ in range(20)]
+
+        with QueryStats() as stats:
+            self.run_command('--keep', '5', '--read-days', '0', '--no-collapse')
+
+        self.assertEqual(
+            sorted(Notification.objects.values_list('pk', flat=True)),
+            sorted(notification.pk for notification in notifications[-5:]),
+        )
+        self.assertUnreadCountConsistent()
+        # 删除 15 条未读通知，查询数与删除的条数无关
+        self.assertLess(len(stats.queries), 15)
+
+
+# ==================== 未读通知计数 ====================
+
+class UnreadCountTests(TestCase):
+    """未读通知数只在共享缓存中缓存，进程内缓存时读取资料中的计数字段"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('reader')
+
+    def setUp(self):
+        cache.clear()
+
+    def written_by_other_process(self, count):
+        # 其他进程只能删除它自己进程内的缓存，本进程的缓存不受影响
+        UserProfile.objects.filter(user=self.user).update(unread_notification_count=count)
+
+    @override_settings(CACHE_IS_SHARED=False)
+    def test_local_cache_reads_profile(self):
+        self.assertEqual(notification_counter.get_unread_count(self.user.pk), 0)
+        self.written_by_other_process(3)
+        self.assertEqual(notification_counter.get_unread_count(self.user.pk), 3)
+
+    @override_settings(CACHE_IS_SHARED=True)
+    def test_shared_cache_is_used(self):
+        self.assertEqual(notification_counter.get_unread_count(self.user.pk), 0)
+        with QueryStats() as stats:
+            self.assertEqual(notification_counter.get_unread_count(self.user.pk), 0)
+        self.assertEqual(len(stats.queries), 0)
+
+        make_notification(self.user)
+        self.assertEqual(notification_counter.get_unread_count(self.user.pk), 1)
+
+    @override_settings(CACHE_IS_SHARED=False)
+    def test_badge_and_etag_read_once(self):
+        post = make_post(make_forum('综合讨论'), self.user, '标题')
+        self.written_by_other_process(2)
+        self.client.force_login(self.user)
+
+        with QueryStats() as stats:
+            response = self.client.get(reverse('post_detail', kwargs={'post_id': post.pk}))
+
+        self.assertTrue(response.has_header('ETag'))
+        self.assertContains(response, 'notification-badge">2</span>')
+        unread_queries = [
+            sql for sql, _, _ in stats.queries
+            if sql.startswith('SELECT "myapp_userprofile"."unread_notification_count" FROM')
+        ]
+        self.assertEqual(len(unread_queries), 1)
+
+
+# ==================== 主题缓存 ====================
+
+@override_settings(THEME_CACHE_TIMEOUT=60 * 60 * 24, THEME_LOCAL_CACHE_TTL=5)
+class ThemeCacheExpiryTests(TestCase):
+    """缓存只在本进程内有效时，其他进程切换主题后最多滞后 THEME_LOCAL_CACHE_TTL 秒"""
+
+    def setUp(self):
+        cache.clear()
+        invalidate_theme_cache()
+        Theme.objects.update(is_active=False)
+        self.light = Theme.objects.create(name='测试浅色', identifier='test-light', is_active=True)
+        self.dark = Theme.objects.create(name='测试深色', identifier='test-dark')
+
+    def tearDown(self):
+        # 测试主题随事务回滚，不能留在进程内缓存中
+        invalidate_theme_cache()
+
+    def later(self, seconds):
+        wall, monotonic = time.time(), time.monotonic()
+        return mock.patch.multiple(time, time=lambda: wall + seconds, monotonic=lambda: monotonic + seconds)
+
+    def switch_in_other_process(self):
+        # 不经过模型信号，本进程的主题缓存不会失效
+        Theme.objects.filter(pk=self.light.pk).update(is_active=False)
+        Theme.objects.filter(pk=self.dark.pk).update(is_active=True)
+
+    @override_settings(CACHE_IS_SHARED=False)
+    def test_local_cache_expires_with_local_ttl(self):
+        self.assertEqual(get_active_theme(), self.light)
+        self.switch_in_other_process()
+        self.assertEqual(get_active_theme(), self.light)
+        with self.later(6):
+            self.assertEqual(get_active_theme(), self.dark)
+
+    @override_settings(CACHE_IS_SHARED=True)
+    def test_shared_cache_keeps_long_timeout(self):
+        # 共享缓存由写入的进程负责失效，这里只验证条目没有被提前淘汰
+        self.assertEqual(get_active_theme(), self.light)
+        self.switch_in_other_process()
+        with self.later(6):
+            self.assertEqual(get_active_theme(), self.light)
+
+
+# ==================== 实时通知 ====================
+
+@override_settings(NOTIFICATION_STREAM_HEARTBEAT=1, NOTIFICATION_STREAM_MAX_DURATION=1)
+class NotificationStreamTests(TestCase):
+    """事件流通过 ASGI 测试客户端读取，进程内发布的通知推送到已建立的连接"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('reader')
+        cls.other = make_user('other')
+
+    def read_stream(self, on_connected):
+        """读完整个事件流，收到首个未读数事件（订阅已建立）后调用 on_connected"""
+        self.async_client.force_login(self.user)
+
+        async def fetch():
+            response = await self.async_client.get(reverse('notification_stream'))
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            chunks = []
+            async for chunk in response.streaming_content:
+                chunks.append(chunk.decode())
+                if len(chunks) == 2:
+                    await sync_to_async(on_connected)()
+            return ''.join(chunks)
+
+        return async_to_sync(fetch)()
+
+    def test_published_notification_arrives(self):
+        notification = make_notification(self.user, title='新回复')
+        other_notification = make_notification(self.other, title='其他用户的通知')
+
+        def publish():
+            self.assertTrue(get_broker().has_subscribers(self.user.pk))
+            publish_notification(other_notification)
+            publish_notification(notification)
+
+        content = self.read_stream(publish)
+
+        self.assertIn('event: unread', content)
+        self.assertIn(f'id: {notification.pk}\nevent: notification', content)
+        self.assertIn('新回复', content)
+        self.assertNotIn('其他用户的通知', content)
+        # 连接结束后取消订阅
+        self.assertFalse(get_broker().has_subscribers(self.user.pk))
+
+
+# ==================== 主题 CSS ====================
+
+class ThemeCssTests(TestCase):
+    """主题变量以带内容哈希的地址提供，可被浏览器永久缓存"""
+
+    def setUp(self):
+        cache.clear()
+        invalidate_theme_cache()
+
+    def tearDown(self):
+        invalidate_theme_cache()
+
+    def css_url(self, identifier='light'):
+        version = get_theme_css(identifier)['version']
+        return reverse('theme_css', kwargs={'identifier': identifier, 'version': version})
+
+    def test_page_links_hashed_css(self):
+        self.assertContains(self.client.get(reverse('forum_index')), f'href="{self.css_url()}"')
+
+    def test_css_is_immutable(self):
+        response = self.client.get(self.css_url())
+        self.assertEqual(response['Content-Type'], 'text/css; charset=utf-8')
+        self.assertContains(response, '--primary: #007bff;')
+        cache_control = response['Cache-Control']
+        self.assertIn('public', cache_control)
+        self.assertIn('immutable', cache_control)
+        self.assertIn('max-age=31536000', cache_control)
+
+        revalidated = self.client.get(self.css_url(), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_variable_change_changes_url(self):
+        old_url = self.css_url()
+        variable = ThemeVariable.objects.get(theme__identifier='light', name='primary')
+        variable.value = '#ff0000'
+        variable.save()
+
+        new_url = self.css_url()
+        self.assertNotEqual(new_url, old_url)
+        self.assertContains(self.client.get(new_url), '--primary: #ff0000;')
+        # 旧地址跳转到当前版本，不会把旧内容标记为永久缓存
+        self.assertRedirects(self.client.get(old_url), new_url)
+
+    def test_unknown_theme(self):
+        url = reverse('theme_css', kwargs={'identifier': 'missing', 'version': 'abc'})
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+# ==================== 板块统计 ====================
+
+class ForumStatsTests(TestCase):
+    """板块的帖子数和最新帖子随发帖、软删除、恢复和物理删除增量维护"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('author')
+        cls.forum = make_forum('综合讨论')
+
+    def assertStats(self, post_count, last_post):
+        forum = Forum.objects.get(pk=self.forum.pk)
+        self.assertEqual(forum.post_count, post_count)
+        self.assertEqual(forum.last_post, last_post)
+        self.assertEqual(forum.last_post_at, last_post.created_at if last_post else None)
+        # 与实时统计一致
+        self.assertEqual(forum.post_count, forum.get_post_count())
+        self.assertEqual(forum.last_post, forum.get_last_post())
+
+    def set_deleted(self, post, is_deleted):
+        post = Post.objects.get(pk=post.pk)
+        post.is_deleted = is_deleted
+        post.save()
+
+    def test_create(self):
+        self.assertStats(0, None)
+        first = make_post(self.forum, self.user, '第一帖')
+        self.assertStats(1, first)
+        second = make_post(self.forum, self.user, '第二帖')
+        self.assertStats(2, second)
+
+    def test_soft_delete_and_restore_latest(self):
+        first = make_post(self.forum, self.user, '第一帖')
+        second = make_post(self.forum, self.user, '第二帖')
+
+        self.set_deleted(second, True)
+        self.assertStats(1, first)
+        # 重复保存已删除的帖子不会再次减少
+        self.set_deleted(second, True)
+        self.assertStats(1, first)
+
+        self.set_deleted(second, False)
+        self.assertStats(2, second)
+
+    def test_soft_delete_older_post_keeps_latest(self):
+        first = make_post(self.forum, self.user, '第一帖')
+        second = make_post(self.forum, self.user, '第二帖')
+
+        self.set_deleted(first, True)
+        self.assertStats(1, second)
+
+    def test_physical_delete(self):
+        first = make_post(self.forum, self.user, '第一帖')
+        second = make_post(self.forum, self.user, '第二帖')
+
+        Post.objects.get(pk=second.pk).delete()
+        self.assertStats(1, first)
+        Post.objects.get(pk=first.pk).delete()
+        self.assertStats(0, None)
+
+
+# ==================== 通知批量分发 ====================
+
+class NotificationFanoutTests(TestCase):
+    """通知按批一条 INSERT 写入，未读计数按增量合并更新"""
+
+    def setUp(self):
+        cache.clear()
+
+    def unread_counts(self, users):
+        return [notification_counter.get_unread_count(user.pk) for user in users]
+
+    def statements(self, stats, prefix):
+        return [sql for sql, _, _ in stats.queries if sql.startswith(prefix)]
+
+    def test_parse_mentions(self):
+        self.assertEqual(
+            notification_fanout.parse_mentions('@alice 和 @bob. 还有 @alice，邮箱 carol@example.com'),
+            ['alice', 'bob'],
+        )
+
+    def test_reply_with_mentions(self):
+        author, replier, alice, bob = (make_user(name) for name in ('author', 'replier', 'alice', 'bob'))
+        post = make_post(make_forum('综合讨论'), author, '标题')
+        # 帖子作者只收到回复通知，回复者不通知自己，不存在的用户忽略
+        reply = make_reply(post, replier, content='@author @alice @bob @replier @nobody 看看')
+
+        with QueryStats() as stats:
+            self.assertEqual(notification_fanout.notify_reply(reply), 3)
+
+        self.assertEqual(len(self.statements(stats, 'INSERT INTO "myapp_notification"')), 1)
+        self.assertEqual(len(self.statements(stats, 'UPDATE "myapp_userprofile"')), 1)
+        self.assertEqual(
+            sorted(Notification.objects.values_list('recipient__username', 'notification_type')),
+            [('alice', 'mention'), ('author', 'reply'), ('bob', 'mention')],
+        )
+        self.assertEqual(self.unread_counts([author, replier, alice, bob]), [1, 0, 1, 1])
+
+    def test_broadcast_in_batches(self):
+        users = [make_user(f'user{i}') for i in range(5)]
+        make_user('inactive', is_active=False)
+        make_notification(users[0])
+        progress = []
+
+        with QueryStats() as stats:
+            sent = notification_fanout.broadcast('公告', '内容', batch_size=2, progress=progress.append)
+
+        self.assertEqual(sent, 5)
+        self.assertEqual(progress, [2, 4, 5])
+        # 每批一条 INSERT 和一条未读计数 UPDATE
+        self.assertEqual(len(self.statements(stats, 'INSERT INTO "myapp_notification"')), 3)
+        self.assertEqual(len(self.statements(stats, 'UPDATE "myapp_userprofile"')), 3)
+        self.assertEqual(self.unread_counts(users), [2, 1, 1, 1, 1])
+        self.assertFalse(Notification.objects.filter(recipient__username='inactive').exists())
+
+    def test_broadcast_command_staff_only(self):
+        staff = make_user('admin', is_staff=True)
+        member = make_user('member')
+        out = StringIO()
+
+        call_command('broadcast_system_notification', '维护通知', '今晚维护', '--staff-only', stdout=out)
+
+        self.assertIn('已向 1 个用户发送系统通知', out.getvalue())
+        self.assertEqual(self.unread_counts([staff, member]), [1, 0])
+
+
+# ==================== 回复楼层 ====================
+
+class ReplyThreadTests(TestCase):
+    """楼中楼只缩进一级，父回复已删除时升为顶层回复，每页固定三条查询"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('author')
+        cls.post = make_post(make_forum('综合讨论'), cls.user, '标题')
+
+    def load(self, **kwargs):
+        return reply_thread.load_thread(Post.objects.get(pk=self.post.pk), **kwargs)
+
+    def outline(self, page):
+        return [(root.pk, [reply.pk for reply in root.thread_replies]) for root in page]
+
+    def test_nested_replies_grouped_under_root(self):
+        first = make_reply(self.post, self.user)
+        child = make_reply(self.post, self.user, parent_reply=first)
+        grandchild = make_reply(self.post, self.user, parent_reply=child)
+        second = make_reply(self.post, self.user)
+
+        page = self.load()
+        self.assertEqual(self.outline(page), [(first.pk, [child.pk, grandchild.pk]), (second.pk, [])])
+
+    def test_reply_to_deleted_reply_becomes_root(self):
+        first = make_reply(self.post, self.user)
+        child = make_reply(self.post, self.user, parent_reply=first)
+        grandchild = make_reply(self.post, self.user, parent_reply=child)
+        second = make_reply(self.post, self.user)
+        Reply.objects.filter(pk=first.pk).update(is_deleted=True)
+
+        page = self.load()
+        self.assertEqual(self.outline(page), [(child.pk, [grandchild.pk]), (second.pk, [])])
+        self.assertIsNone(page[0].parent_reply)
+
+    def test_three_queries_per_page(self):
+        for i in range(3):
+            parent = make_reply(self.post, make_user(f'user{i}'))
+            for _ in range(3):
+                parent = make_reply(self.post, self.user, parent_reply=parent)
+        post = Post.objects.get(pk=self.post.pk)
+
+        with QueryStats() as stats:
+            page = reply_thread.load_thread(post)
+            # 模板访问的作者资料和父回复都已加载
+            for root in page:
+                for reply in [root, *root.thread_replies]:
+                    reply.author.profile.reputation
+                    reply.parent_reply
+        self.assertEqual(len(stats.queries), 3)
+        self.assertEqual([len(root.thread_replies) for root in page], [3, 3, 3])
+
+    def test_pages_split_by_root(self):
+        roots = [make_reply(self.post, self.user) for _ in range(3)]
+        make_reply(self.post, self.user, parent_reply=roots[1])
+
+        first_page = self.load(per_page=2)
+        self.assertEqual([root.pk for root in first_page], [roots[0].pk, roots[1].pk])
+        self.assertEqual(len(first_page[1].thread_replies), 1)
+        second_page = self.load(cursor=first_page.next_cursor, per_page=2)
+        self.assertEqual(self.outline(second_page), [(roots[2].pk, [])])
+
+
+# ==================== 内容预渲染 ====================
+
+class RenderedContentTests(TestCase):
+    """摘要和转义后的 HTML 在保存时生成，bulk_update 等绕过 save 的写入由 backfill 补齐"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('author')
+        cls.forum = make_forum('综合讨论')
+
+    def test_post_rendered_on_save(self):
+        post = make_post(self.forum, self.user, '标题', content='<b>加粗</b> & <script>alert(1)</script>\n\n第二段' + '字' * 200)
+        post = Post.objects.get(pk=post.pk)
+        self.assertEqual(post.content_html.count('<p>'), 2)
+        self.assertIn('&lt;b&gt;加粗&lt;/b&gt; &amp; &lt;script&gt;', post.content_html)
+        self.assertNotIn('<script>', post.content_html)
+        self.assertTrue(post.excerpt.startswith('加粗 & alert(1)'))
+        self.assertEqual(len(post.excerpt), rendering.POST_EXCERPT_LENGTH + 3)
+        self.assertTrue(post.excerpt.endswith('...'))
+
+    def test_update_fields_with_content_rerenders(self):
+        post = make_post(self.forum, self.user, '标题')
+        post.content = '新的<i>正文</i>'
+        post.save(update_fields=['content'])
+        post = Post.objects.get(pk=post.pk)
+        self.assertEqual(post.excerpt, '新的正文')
+        self.assertEqual(post.content_html, '<p>新的&lt;i&gt;正文&lt;/i&gt;</p>')
+
+    def test_update_fields_without_content_not_rerendered(self):
+        post = make_post(self.forum, self.user, '标题', content='正文')
+        post = Post.objects.get(pk=post.pk)
+        post.title = '新标题'
+        with QueryStats() as stats:
+            post.save(update_fields=['title'])
+        updates = [sql for sql, _, _ in stats.queries if sql.startswith('UPDATE "myapp_post"')]
+        self.assertFalse(any('"content_html"' in sql for sql in updates))
+        self.assertEqual(Post.objects.get(pk=post.pk).content_html, '<p>正文</p>')
+
+    def test_reply_rendered_and_displayed_escaped(self):
+        post = make_post(self.forum, self.user, '标题')
+        reply = make_reply(post, self.user, content='<img src=x onerror=alert(1)>' + '回' * 60)
+        reply = Reply.objects.get(pk=reply.pk)
+        self.assertEqual(len(reply.excerpt), rendering.REPLY_EXCERPT_LENGTH + 3)
+
+        response = self.client.get(reverse('post_detail', kwargs={'post_id': post.pk}))
+        self.assertContains(response, '&lt;img src=x onerror=alert(1)&gt;')
+        self.assertNotContains(response, '<img src=x')
+
+    def test_backfill_command(self):
+        post = make_post(self.forum, self.user, '标题', content='正文')
+        Post.objects.filter(pk=post.pk).update(excerpt='', content_html='')
+
+        call_command('backfill_rendered_content', stdout=StringIO())
+        post = Post.objects.get(pk=post.pk)
+        self.assertEqual((post.excerpt, post.content_html), ('正文', '<p>正文</p>'))
+
+
+# ==================== 帖子热度 ====================
+
+class HotScoreTests(TestCase):
+    """互动数据变化时以 UPDATE 表达式增量更新的热度，与按字段完整计算的结果一致"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('author')
+        cls.forum = make_forum('综合讨论')
+
+    def setUp(self):
+        cache.clear()
+        self.post = make_post(self.forum, self.user, '标题')
+
+    def assertScoreConsistent(self):
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertAlmostEqual(post.hot_score, hot.score_post(post))
+        return post
+
+    def test_reply_added_and_removed(self):
+        first = make_reply(self.post, self.user)
+        post = self.assertScoreConsistent()
+        self.assertEqual(post.last_reply_at, first.created_at)
+
+        second = make_reply(self.post, self.user)
+        self.assertScoreConsistent()
+
+        # 删除回复时最后活跃时间不变，只调整互动权重
+        second.is_deleted = True
+        second.save()
+        post = self.assertScoreConsistent()
+        self.assertEqual((post.reply_count, post.last_reply_at), (1, second.created_at))
+
+        # 恢复较早的回复不会把最后活跃时间往回改
+        first.is_deleted = True
+        first.save()
+        first.is_deleted = False
+        first.save()
+        post = self.assertScoreConsistent()
+        self.assertEqual((post.reply_count, post.last_reply_at), (1, second.created_at))
+
+    def test_views_and_essence(self):
+        self.post.increase_view_count(30)
+        self.assertScoreConsistent()
+
+        for _ in range(5):
+            view_counter.record_view(self.post.pk)
+        view_counter.flush()
+        self.assertEqual(self.assertScoreConsistent().view_count, 35)
+
+        post = Post.objects.get(pk=self.post.pk)
+        post.is_essence = True
+        post.save(update_fields=['is_essence'])
+        self.assertScoreConsistent()
+
+    def test_more_interaction_ranks_higher(self):
+        quiet = make_post(self.forum, self.user, '冷门帖子')
+        make_reply(self.post, self.user)
+        self.post.increase_view_count(50)
+
+        ranked = list(Post.objects.filter(pk__in=[self.post.pk, quiet.pk]).order_by(*Post.HOT_ORDERING))
+        self.assertEqual(ranked[0], self.post)
+
+    def test_refresh_command_recomputes(self):
+        make_reply(self.post, self.user)
+        Post.objects.filter(pk=self.post.pk).update(hot_score=0)
+
+        call_command('refresh_hot_scores', stdout=StringIO())
+        self.assertScoreConsistent()
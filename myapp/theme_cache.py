@@ -0,0 +1,141 @@
+"""
+主题缓存
+
+当前激活主题、其 CSS 变量以及主题列表几乎不变，却在每次请求时都要查询数据库。
+这里使用两级缓存：进程内缓存（短 TTL，避免每次都访问共享缓存）+ Django 缓存框架
+（locmem / file / redis 等后端），在主题或主题变量变更时统一失效。缓存只在本进程内
+有效时（CACHE_IS_SHARED 为 False），失效到达不了其他进程，Django 缓存中的条目也只保留
+THEME_LOCAL_CACHE_TTL 秒，其他进程最多滞后这么久。
+
+每个主题的变量还会被渲染为带内容哈希的 CSS 文件，由 ``theme_css`` 视图以长期缓存方式提供。
+"""
+import hashlib
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+ACTIVE_THEME_CACHE_KEY = 'myapp:theme:active'
+THEME_LIST_CACHE_KEY = 'myapp:theme:list'
+THEME_CSS_CACHE_KEY = 'myapp:theme:css'
+
+_VARIABLE_NAME_RE = re.compile(r'^[\w-]+$')
+
+_local_cache = {}
+_local_lock = threading.Lock()
+
+
+def _shared_timeout():
+    """共享缓存过期时间（秒），缓存不在进程间共享时与进程内缓存相同"""
+    timeout = getattr(settings, 'THEME_CACHE_TIMEOUT', 60 * 60 * 24)
+    if not getattr(settings, 'CACHE_IS_SHARED', False):
+        timeout = min(timeout, _local_ttl())
+    return timeout
+
+
+def _local_ttl():
+    """进程内缓存过期时间（秒），决定其他进程感知失效的最大延迟"""
+    return getattr(settings, 'THEME_LOCAL_CACHE_TTL', 5)
+
+
+def _cached(key, loader):
+    """依次从进程内缓存、共享缓存读取，都未命中时调用 loader 回源数据库"""
+    now = time.monotonic()
+    entry = _local_cache.get(key)
+    if entry is not None and entry[0] > now:
+        return entry[1]
+
+    value = cache.get(key)
+    if value is None:
+        value = loader()
+        cache.set(key, value, _shared_timeout())
+
+    with _local_lock:
+        _local_cache[key] = (now + _local_ttl(), value)
+    return value
+
+
+def _load_active_theme():
+    from .models import Theme
+
+    theme = Theme.objects.filter(is_active=True).first()
+    variables = {}
+    if theme:
+        variables = {var.name: var.value for var in theme.variables.all()}
+    # 使用字典包装，保证“没有激活主题”也能被缓存
+    return {'theme': theme, 'variables': variables}
+
+
+def _load_theme_list():
+    from .models import Theme
+
+    return list(Theme.objects.all())
+
+
+def render_theme_css(variables):
+    """将主题变量渲染为 CSS 自定义属性，忽略非法变量名并去除可能破坏规则的字符"""
+    lines = [':root {']
+    for name, value in sorted(variables.items()):
+        if not _VARIABLE_NAME_RE.match(name):
+            continue
+        value = re.sub(r'[;{}<>]', '', value).strip()
+        lines.append(f'  --{name}: {value};')
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+
+def _load_theme_css():
+    from .models import Theme
+
+    bundles = {}
+    for theme in Theme.objects.prefetch_related('variables'):
+        css = render_theme_css({var.name: var.value for var in theme.variables.all()})
+        bundles[theme.identifier] = {
+            'css': css,
+            'version': hashlib.sha256(css.encode('utf-8')).hexdigest()[:12],
+        }
+    return bundles
+
+
+def get_active_theme():
+    """获取当前激活的主题，没有时返回 None"""
+    return _cached(ACTIVE_THEME_CACHE_KEY, _load_active_theme)['theme']
+
+
+def get_active_theme_variables():
+    """获取当前激活主题的 CSS 变量字典"""
+    return dict(_cached(ACTIVE_THEME_CACHE_KEY, _load_active_theme)['variables'])
+
+
+def get_themes():
+    """获取所有主题列表"""
+    return list(_cached(THEME_LIST_CACHE_KEY, _load_theme_list))
+
+
+def get_theme_css(identifier):
+    """
+    获取主题的 CSS 文件内容及其版本号（内容哈希）
+
+    返回 {'css': ..., 'version': ...}，主题不存在时返回 None。
+    只有主题变量变化时才会重新生成。
+    """
+    return _cached(THEME_CSS_CACHE_KEY, _load_theme_css).get(identifier)
+
+
+def _clear():
+    with _local_lock:
+        _local_cache.clear()
+    cache.delete_many([ACTIVE_THEME_CACHE_KEY, THEME_LIST_CACHE_KEY, THEME_CSS_CACHE_KEY])
+
+
+def invalidate_theme_cache():
+    """
+    使主题缓存失效
+
+    立即清除一次，并在事务提交后再清除一次，避免并发请求在提交前把旧数据重新写回缓存。
+    """
+    _clear()
+    transaction.on_commit(_clear)
@@ -0,0 +1,111 @@
+"""
+初始主题数据
+
+数据迁移 0009_seed_themes 在 migrate 时写入一次（迁移中保存了当时的一份数据），
+之后新增的主题通过 create_themes 命令补齐。函数接收模型类作为参数。
+"""
+
+DEFAULT_THEMES = [
+    {
+        'identifier': 'light',
+        'name': '浅色主题',
+        'is_active': True,
+        'variables': {
+            'primary': '#007bff',
+            'secondary': '#6c757d',
+            'background': '#ffffff',
+            'text': '#212529',
+            'border': '#dee2e6',
+            'shadow': 'rgba(0, 0, 0, 0.1)',
+            'card-bg': '#ffffff',
+            'navbar-bg': '#f8f9fa',
+            'navbar-text': '#212529',
+            'footer-bg': '#f8f9fa',
+            'footer-text': '#212529',
+        },
+    },
+    {
+        'identifier': 'dark',
+        'name': '暗色主题',
+        'is_active': False,
+        'variables': {
+            'primary': '#0d6efd',
+            'secondary': '#6c757d',
+            'background': '#121212',
+            'text': '#ffffff',
+            'border': '#404040',
+            'shadow': 'rgba(0, 0, 0, 0.3)',
+            'card-bg': '#1e1e1e',
+            'navbar-bg': '#343a40',
+            'navbar-text': '#ffffff',
+            'footer-bg': '#343a40',
+            'footer-text': '#ffffff',
+        },
+    },
+    {
+        'identifier': 'blue',
+        'name': '蓝色主题',
+        'is_active': False,
+        'variables': {
+            'primary': '#0056b3',
+            'secondary': '#6c757d',
+            'background': '#f8faff',
+            'text': '#212529',
+            'border': '#b3d7ff',
+            'shadow': 'rgba(0, 86, 179, 0.1)',
+            'card-bg': '#ffffff',
+            'navbar-bg': '#0056b3',
+            'navbar-text': '#ffffff',
+            'footer-bg': '#e6f2ff',
+            'footer-text': '#212529',
+        },
+    },
+    {
+        'identifier': 'green',
+        'name': '绿色主题',
+        'is_active': False,
+        'variables': {
+            'primary': '#28a745',
+            'secondary': '#6c757d',
+            'background': '#f8fff9',
+            'text': '#212529',
+            'border': '#c3e6cb',
+            'shadow': 'rgba(40, 167, 69, 0.1)',
+            'card-bg': '#ffffff',
+            'navbar-bg': '#28a745',
+            'navbar-text': '#ffffff',
+            'footer-bg': '#e6f7ec',
+            'footer-text': '#212529',
+        },
+    },
+]
+
+
+def is_seeded(Theme):
+    """初始主题是否都已存在（一条查询）"""
+    identifiers = [theme['identifier'] for theme in DEFAULT_THEMES]
+    return Theme.objects.filter(identifier__in=identifiers).count() == len(identifiers)
+
+
+def seed_themes(Theme, ThemeVariable):
+    """
+    创建缺少的初始主题及其变量，返回新建的主题名称列表
+
+    已存在的主题（按标识符判断）保持不变；只有在没有任何激活主题时才激活浅色主题。
+    """
+    existing = set(Theme.objects.values_list('identifier', flat=True))
+    has_active = Theme.objects.filter(is_active=True).exists()
+    created = []
+    for spec in DEFAULT_THEMES:
+        if spec['identifier'] in existing:
+            continue
+        theme = Theme.objects.create(
+            name=spec['name'],
+            identifier=spec['identifier'],
+            is_active=spec['is_active'] and not has_active,
+        )
+        ThemeVariable.objects.bulk_create(
+            ThemeVariable(theme=theme, name=name, value=value) for name, value in spec['variables'].items()
+        )
+        created.append(spec['name'])
+    return created
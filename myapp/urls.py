@@ -10,6 +10,7 @@ urlpatterns = [
     path('themes/edit/<int:theme_id>/', views.edit_theme, name='edit_theme'),
     path('themes/delete/<int:theme_id>/', views.delete_theme, name='delete_theme'),
     path('themes/switch/<int:theme_id>/', views.switch_theme, name='switch_theme'),
+    path('themes/<slug:identifier>.<slug:version>.css', views.theme_css, name='theme_css'),
     path('api/theme-variables/', views.get_theme_variables, name='get_theme_variables'),
     
     # ==================== 论坛功能路由 ====================
@@ -25,6 +26,8 @@ urlpatterns = [
     path('user/profile/<str:username>/', views.user_profile, name='user_profile_detail'),
     path('notifications/', views.notifications, name='notifications'),
     path('notifications/<int:notification_id>/read/', views.mark_notification_read, name='mark_notification_read'),
+    path('notifications/stream/', views.notification_stream, name='notification_stream'),
+    path('notifications/poll/', views.notification_poll, name='notification_poll'),
     path('post/<int:post_id>/essence/', views.toggle_essence, name='toggle_essence'),
     path('post/<int:post_id>/top/', views.toggle_top, name='toggle_top'),
     
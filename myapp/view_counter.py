@@ -0,0 +1,249 @@
+"""
+帖子浏览次数缓冲计数
+
+浏览帖子时不再直接写数据库，而是在缓存中原子递增（cache.incr），
+再由后台线程或 flush_view_counts 命令定期把累计值批量写回：
+相同增量的帖子合并为一条 ``UPDATE ... SET view_count = view_count + n``。
+
+缓存中的数据结构：
+- ``myapp:view:count:<post_id>``  待写回的浏览次数
+- ``myapp:view:reg:<post_id>``    帖子是否已登记到待写回列表
+- ``myapp:view:pending``          待写回的帖子 ID 列表
+
+使用进程内 locmem 缓存时每个进程各自缓冲，需要开启后台线程（VIEW_COUNT_FLUSH_INTERVAL）；
+使用 file / redis 等共享缓存时也可以改由定时任务执行 flush_view_counts。
+"""
+import atexit
+import hashlib
+import logging
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+COUNT_KEY = 'myapp:view:count:%s'
+REGISTERED_KEY = 'myapp:view:reg:%s'
+SEEN_KEY = 'myapp:view:seen:%s:%s'
+PENDING_KEY = 'myapp:view:pending'
+LOCK_KEY = 'myapp:view:lock'
+FLUSH_LOCK_KEY = 'myapp:view:flush-lock'
+
+# 写回锁的过期时间（秒），应大于一次写回的最长耗时
+FLUSH_LOCK_TIMEOUT = 300
+
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def _dedupe_window():
+    """同一访客重复浏览同一帖子不计数的时间窗口（秒），0 表示不去重"""
+    return getattr(settings, 'VIEW_COUNT_DEDUPE_WINDOW', 0)
+
+
+def _flush_interval():
+    """后台线程写回间隔（秒），0 表示不启动后台线程"""
+    return getattr(settings, 'VIEW_COUNT_FLUSH_INTERVAL', 0)
+
+
+def _visitor_id(request):
+    """优先使用会话标识访客，没有会话时使用IP"""
+    session_key = getattr(getattr(request, 'session', None), 'session_key', None)
+    if session_key:
+        visitor = session_key
+    else:
+        forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR', '')
+        visitor = forwarded_for.split(',')[0].strip() or request.META.get('REMOTE_ADDR', '')
+    return hashlib.md5(visitor.encode('utf-8')).hexdigest()
+
+
+class LockTimeout(Exception):
+    """等待时间内没有获得锁"""
+
+
+class _CacheLock:
+    """
+    基于 cache.add 的简单互斥锁
+
+    锁中保存随机令牌，释放时只删除自己持有的锁；持锁进程异常退出时锁在 timeout 后自动过期。
+    """
+
+    def __init__(self, key=LOCK_KEY, timeout=10, wait=2.0):
+        self.key = key
+        self.timeout = timeout
+        self.wait = wait
+        self.token = None
+
+    def acquire(self):
+        """在 wait 秒内获得锁返回 True，否则返回 False"""
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.wait
+        while not cache.add(self.key, token, self.timeout):
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        self.token = token
+        return True
+
+    def release(self):
+        # 持锁超过 timeout 后锁可能已被其他进程获得，不能删除
+        if self.token is not None and cache.get(self.key) == self.token:
+            cache.delete(self.key)
+        self.token = None
+
+    def __enter__(self):
+        if not self.acquire():
+            raise LockTimeout(self.key)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+def _increment(post_id):
+    key = COUNT_KEY % post_id
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # 计数键恰好被淘汰
+        cache.set(key, 1, None)
+
+    # 每个写回周期内每个帖子只登记一次
+    if cache.add(REGISTERED_KEY % post_id, 1, None):
+        _register([post_id])
+
+
+def _register(post_ids):
+    try:
+        with _CacheLock():
+            pending = cache.get(PENDING_KEY) or []
+            pending.extend(post_ids)
+            cache.set(PENDING_KEY, pending, None)
+    except LockTimeout:
+        # 取消登记标记，这些帖子的下一次浏览会重新登记，计数不会丢失
+        cache.delete_many([REGISTERED_KEY % post_id for post_id in post_ids])
+        logger.warning('登记待写回的帖子时等待锁超时')
+
+
+def record_view(post_id, request=None):
+    """
+    记录一次帖子浏览
+
+    开启去重时，同一访客在窗口期内的重复浏览会被忽略。返回本次浏览是否被计数。
+    """
+    window = _dedupe_window()
+    if window and request is not None:
+        if not cache.add(SEEN_KEY % (post_id, _visitor_id(request)), 1, window):
+            return False
+
+    _increment(post_id)
+    _ensure_flusher()
+    return True
+
+
+def pending_views(post_id):
+    """获取帖子尚未写回数据库的浏览次数"""
+    return cache.get(COUNT_KEY % post_id) or 0
+
+
+def flush():
+    """
+    把缓存中累计的浏览次数写回数据库，返回 (帖子数, 浏览次数)
+
+    先写数据库再用 decr 扣减计数，写回期间新增的浏览会保留到下一次写回。
+    整个读取、写库、扣减过程持有写回锁，同一时间只有一个进程写回；
+    其他进程正在写回时直接返回 (0, 0)。
+    """
+    lock = _CacheLock(FLUSH_LOCK_KEY, timeout=FLUSH_LOCK_TIMEOUT, wait=0)
+    if not lock.acquire():
+        return 0, 0
+    try:
+        return _flush()
+    finally:
+        lock.release()
+
+
+def _flush():
+    from . import hot
+    from .models import Post
+
+    with _CacheLock():
+        post_ids = cache.get(PENDING_KEY) or []
+        cache.delete(PENDING_KEY)
+        # 先取消登记，之后的新浏览会重新登记到下一批
+        cache.delete_many([REGISTERED_KEY % post_id for post_id in post_ids])
+
+    if not post_ids:
+        return 0, 0
+
+    counts = cache.get_many([COUNT_KEY % post_id for post_id in post_ids])
+    by_increment = defaultdict(list)
+    for post_id in post_ids:
+        increment = counts.get(COUNT_KEY % post_id) or 0
+        if increment > 0:
+            by_increment[increment].append(post_id)
+
+    try:
+        with transaction.atomic():
+            for increment, ids in by_increment.items():
+                Post.objects.filter(pk__in=ids).update(
+                    view_count=F('view_count') + increment,
+                    hot_score=hot.adjusted(view_count=F('view_count') + increment),
+                )
+    except Exception:
+        # 写库失败时重新登记，计数保留到下一次写回
+        cache.set_many({REGISTERED_KEY % post_id: 1 for post_id in post_ids}, None)
+        _register(post_ids)
+        raise
+
+    total = 0
+    for increment, ids in by_increment.items():
+        for post_id in ids:
+            try:
+                cache.decr(COUNT_KEY % post_id, increment)
+            except ValueError:
+                pass
+        total += increment * len(ids)
+
+    return sum(len(ids) for ids in by_increment.values()), total
+
+
+def _flush_loop(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            flush()
+        except Exception:
+            logger.exception('写回帖子浏览次数失败')
+        finally:
+            close_old_connections()
+
+
+def _ensure_flusher():
+    """按需在当前进程中启动后台写回线程"""
+    global _flusher
+    interval = _flush_interval()
+    if not interval or _flusher is not None:
+        return
+    with _flusher_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(
+                target=_flush_loop, args=(interval,), name='view-count-flusher', daemon=True
+            )
+            _flusher.start()
+            # 进程退出前写回剩余的计数，避免进程内缓存中的数据丢失
+            atexit.register(_flush_at_exit)
+
+
+def _flush_at_exit():
+    try:
+        flush()
+    except Exception:
+        logger.exception('进程退出时写回帖子浏览次数失败')
@@ -1,42 +1,41 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import HttpResponse, JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.contrib import messages
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.http import require_POST
+from django.core.handlers.asgi import ASGIRequest
+from django.views.decorators.http import require_POST, require_GET
 from django.views.decorators.csrf import csrf_exempt
-from django.core.paginator import Paginator
-from django.db.models import Q
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
 
 from .models import Theme, ThemeVariable, Forum, Post, Reply, UserProfile, Notification
 from .forms import CustomUserCreationForm, UserProfileForm, UserEditForm
+from . import fragment_cache, notification_fanout, reply_thread, view_counter
+from .conditional import conditional_page
+from .notification_stream import poll_events, stream_events
+from .pagination import KeysetPaginator
+from .rows import as_rows
+from .search import RANK_ORDERING, highlight, search_posts
+from .theme_cache import get_active_theme, get_active_theme_variables, get_themes, get_theme_css
 from django.contrib.auth.models import User
 
 
 def index(request):
-    active_theme = Theme.objects.filter(is_active=True).first()
-    theme_variables = {}
-    
-    if active_theme:
-        variables = active_theme.variables.all()
-        theme_variables = {var.name: var.value for var in variables}
-    
     context = {
-        'theme_variables': theme_variables,
-        'active_theme': active_theme,
+        'theme_variables': get_active_theme_variables(),
+        'active_theme': get_active_theme(),
     }
     return render(request, 'myapp/index.html', context)
 
 
 def theme_list(request):
     """列出所有主题"""
-    themes = Theme.objects.all()
-    active_theme = Theme.objects.filter(is_active=True).first()
-    
     context = {
-        'themes': themes,
-        'active_theme': active_theme,
+        'themes': get_themes(),
+        'active_theme': get_active_theme(),
     }
     return render(request, 'myapp/theme_list.html', context)
 
@@ -45,8 +44,7 @@ def switch_theme(request, theme_id):
     """切换主题"""
     theme = get_object_or_404(Theme, id=theme_id)
     
-    Theme.objects.filter(is_active=True).update(is_active=False)
-    
+    # Theme.save 会停用其他主题并使主题缓存失效
     theme.is_active = True
     theme.save()
     
@@ -57,15 +55,27 @@ def switch_theme(request, theme_id):
 @require_POST
 def get_theme_variables(request):
     """获取当前主题的CSS变量"""
-    active_theme = Theme.objects.filter(is_active=True).first()
-    
-    if not active_theme:
+    if not get_active_theme():
         return JsonResponse({'error': '没有激活的主题'}, status=404)
     
-    variables = active_theme.variables.all()
-    theme_variables = {var.name: var.value for var in variables}
+    return JsonResponse(get_active_theme_variables())
+
+
+@require_GET
+def theme_css(request, identifier, version):
+    """按内容哈希版本提供主题CSS文件，可被浏览器和CDN永久缓存"""
+    bundle = get_theme_css(identifier)
+    if bundle is None:
+        raise Http404("主题不存在")
+    
+    # 旧版本地址跳转到当前版本，避免把过期内容标记为永久缓存
+    if version != bundle['version']:
+        return redirect('theme_css', identifier=identifier, version=bundle['version'])
     
-    return JsonResponse(theme_variables)
+    response = HttpResponse(bundle['css'], content_type='text/css; charset=utf-8')
+    response['ETag'] = quote_etag(bundle['version'])
+    patch_cache_control(response, public=True, max_age=60 * 60 * 24 * 365, immutable=True)
+    return get_conditional_response(request, etag=response['ETag'], response=response)
 
 
 def create_theme(request):
@@ -157,25 +167,19 @@ def forum_index(request):
     else:
         forums = Forum.objects.filter(is_active=True, moderator_only=False)
     
+    # 帖子数和最新发帖时间使用板块上的冗余字段，整个列表只需一次查询
     forum_data = []
     for forum in forums:
         forum_info = {
             'forum': forum,
-            'post_count': forum.get_post_count(),
-            'last_post': forum.get_last_post(),
+            'post_count': forum.post_count,
+            'last_post_at': forum.last_post_at,
         }
         forum_data.append(forum_info)
 
-    unread_notifications_count = 0
-    if request.user.is_authenticated:
-        unread_notifications_count = Notification.objects.filter(
-            recipient=request.user, 
-            is_read=False
-        ).count()
-    
+    # 未读通知数由 notification_count 上下文处理器提供
     context = {
         'forums': forum_data,
-        'unread_notifications_count': unread_notifications_count,
     }
     return render(request, 'myapp/forum_index.html', context)
 
@@ -193,27 +197,65 @@ def forum_detail(request, forum_id):
     
     posts = Post.objects.filter(forum=forum, is_deleted=False, status='published')
     
-    if search:
-        posts = posts.filter(Q(title__icontains=search) | Q(content__icontains=search))
-    
     if sort == 'essence':
         posts = posts.filter(is_essence=True)
+        sort_ordering = Post.LATEST_ORDERING
     elif sort == 'hot':
-        posts = posts.order_by('-reply_count', '-view_count', '-created_at')
+        sort_ordering = Post.HOT_ORDERING
     else:  
-        posts = posts.order_by('-is_top', '-last_reply_at', '-created_at')
+        sort_ordering = Post.LATEST_ORDERING
     
-    paginator = Paginator(posts, 20)  
-    page_number = request.GET.get('page')
-    posts_page = paginator.get_page(page_number)
+    cursor = request.GET.get('cursor')
     
-    context = {
-        'forum': forum,
-        'posts': posts_page,
-        'search': search,
-        'sort': sort,
-    }
-    return render(request, 'myapp/forum_detail.html', context)
+    def post_list_context():
+        # 列表只显示保存时生成的摘要，不读取正文
+        queryset, ordering = as_rows(posts, *Post.LIST_FIELDS), sort_ordering
+        # 搜索使用全文索引，结果按相关度排序；高亮片段需要正文
+        if search:
+            queryset = as_rows(search_posts(posts, search), *Post.LIST_FIELDS, 'content', 'search_rank')
+            ordering = RANK_ORDERING
+        
+        # 游标分页：不使用 OFFSET，总数只做估算
+        paginator = KeysetPaginator(queryset, ordering, per_page=20, count='estimate')
+        posts_page = paginator.get_page(cursor)
+        
+        if search:
+            posts_page.object_list = [
+                post.replace(
+                    search_title=highlight(post.title, search, length=200),
+                    search_snippet=highlight(post.content, search),
+                )
+                for post in posts_page
+            ]
+        
+        return {'forum': forum, 'posts': posts_page, 'search': search, 'sort': sort}
+    
+    version = fragment_cache.get_version('forum', forum.id)
+    
+    def render_page():
+        # 帖子列表按板块版本号缓存，命中时不再查询帖子；搜索结果不缓存。
+        # 版本号可能只在本进程内，键中再加上板块的 updated_at（帖子和回复的写入都会更新），
+        # 其他进程中的写入同样使片段失效
+        key_parts = None
+        if not search:
+            key_parts = (forum.id, version, forum.updated_at.isoformat(), sort, cursor or '')
+        posts_html = fragment_cache.render_fragment(
+            'myapp/fragments/forum_post_list.html', post_list_context, request.user, key_parts
+        )
+        
+        context = {
+            'forum': forum,
+            'posts_html': posts_html,
+            'search': search,
+            'sort': sort,
+        }
+        return render(request, 'myapp/forum_detail.html', context)
+    
+    # 帖子和回复的任何写入都会更新板块的 updated_at（Forum.touch），验证值只取自板块行，
+    # 不依赖可能只在本进程内的片段缓存版本号。板块页只用 ETag 验证，不输出 Last-Modified
+    return conditional_page(
+        request, render_page, forum.updated_at, forum.post_count, forum.last_post_at
+    )
 
 
 @login_required
@@ -243,6 +285,7 @@ def post_create(request, forum_id):
             title=title,
             content=content
         )
+        notification_fanout.notify_post(post)
         
         messages.success(request, "帖子发布成功！")
         return redirect('post_detail', post_id=post.id)
@@ -255,17 +298,48 @@ def post_create(request, forum_id):
 
 def post_detail(request, post_id):
     """帖子详情页"""
-    post = get_object_or_404(Post, id=post_id, is_deleted=False, status='published')
-    
-    post.increase_view_count()
-    
-    replies = post.replies.filter(is_deleted=False).select_related('author', 'parent_reply')
+    # 验证值只查询帖子和作者资料中的几个字段，页面未变化时直接返回 304。
+    # 回复的增删体现在回复数和最后回复时间中；统计数以 F() 表达式更新，不会修改资料的 updated_at，
+    # 需要单独参与验证。验证值都来自数据库，其他进程中的写入同样生效
+    validators = Post.objects.filter(id=post_id, is_deleted=False, status='published').values_list(
+        'updated_at', 'last_reply_at', 'reply_count', 'author__profile__updated_at',
+        'author__profile__post_count', 'author__profile__reply_count'
+    ).first()
+    if validators is None:
+        raise Http404("帖子不存在")
+    updated_at, last_reply_at, *_ = validators
+    
+    # 浏览次数先在缓存中累计，由后台线程或 flush_view_counts 命令批量写回
+    view_counter.record_view(post_id, request)
+    
+    cursor = request.GET.get('cursor')
+    version = fragment_cache.get_version('post', post_id)
+    
+    def render_page():
+        post = get_object_or_404(
+            Post.objects.select_related('forum', 'author__profile'),
+            id=post_id, is_deleted=False, status='published'
+        )
+        post.view_count += view_counter.pending_views(post.id)
+        
+        # 回复楼层按帖子版本号缓存，命中时不再查询回复；未命中时每页固定三条查询。
+        # 回复的写入都会更新所属板块的 updated_at，键中包含它，其他进程中的写入同样使片段失效
+        replies_html = fragment_cache.render_fragment(
+            'myapp/fragments/reply_thread.html',
+            lambda: {'replies': reply_thread.load_thread(post, cursor)},
+            request.user,
+            (post.id, version, post.forum.updated_at.isoformat(), cursor or ''),
+        )
+        
+        context = {
+            'post': post,
+            'replies_html': replies_html,
+        }
+        return render(request, 'myapp/post_detail.html', context)
     
-    context = {
-        'post': post,
-        'replies': replies,
-    }
-    return render(request, 'myapp/post_detail.html', context)
+    return conditional_page(
+        request, render_page, *validators, last_modified=max(filter(None, (updated_at, last_reply_at)))
+    )
 
 
 @login_required
@@ -273,7 +347,7 @@ def post_edit(request, post_id):
     """编辑帖子"""
     post = get_object_or_404(Post, id=post_id)
     
-    if post.author != request.user and not request.user.is_staff:
+    if post.author_id != request.user.id and not request.user.is_staff:
         messages.error(request, "您没有权限编辑该帖子")
         return redirect('post_detail', post_id=post.id)
     
@@ -287,7 +361,8 @@ def post_edit(request, post_id):
         
         post.title = title
         post.content = content
-        post.save()
+        # 只写回修改的字段，不覆盖其他请求原子更新的计数
+        post.save(update_fields=['title', 'content', 'updated_at'])
         
         messages.success(request, "帖子更新成功！")
         return redirect('post_detail', post_id=post.id)
@@ -304,14 +379,14 @@ def post_delete(request, post_id):
     """删除帖子"""
     post = get_object_or_404(Post, id=post_id)
     
-    if post.author != request.user and not request.user.is_staff:
+    if post.author_id != request.user.id and not request.user.is_staff:
         return JsonResponse({'success': False, 'message': '您没有权限删除该帖子'})
     
     post.is_deleted = True
-    post.save()
+    post.save(update_fields=['is_deleted', 'updated_at'])
     
     messages.success(request, "帖子已删除")
-    return redirect('forum_detail', forum_id=post.forum.id)
+    return redirect('forum_detail', forum_id=post.forum_id)
 
 
 @login_required
@@ -340,15 +415,8 @@ def add_reply(request, post_id):
     
     reply = Reply.objects.create(**reply_data)
     
-    if post.author != request.user:
-        Notification.objects.create(
-            recipient=post.author,
-            sender=request.user,
-            notification_type='reply',
-            title=f'{request.user.username}回复了您的帖子',
-            content=f'《{post.title}》',
-            url=post.get_absolute_url()
-        )
+    # 通知帖子作者以及回复中 @ 提及的用户
+    notification_fanout.notify_reply(reply)
     
     messages.success(request, "回复成功！")
     return redirect('post_detail', post_id=post.id)
@@ -360,14 +428,14 @@ def delete_reply(request, reply_id):
     """删除回复"""
     reply = get_object_or_404(Reply, id=reply_id)
     
-    if reply.author != request.user and not request.user.is_staff:
+    if reply.author_id != request.user.id and not request.user.is_staff:
         return JsonResponse({'success': False, 'message': '您没有权限删除该回复'})
     
     reply.is_deleted = True
     reply.save()
     
     messages.success(request, "回复已删除")
-    return redirect('post_detail', post_id=reply.post.id)
+    return redirect('post_detail', post_id=reply.post_id)
 
 
 @login_required
@@ -386,10 +454,15 @@ def user_profile(request, username=None):
     posts_count = Post.objects.filter(author=user, is_deleted=False).count()
     replies_count = Reply.objects.filter(author=user, is_deleted=False).count()
     
-    recent_posts = Post.objects.filter(author=user, is_deleted=False, status='published')[:10]
+    # 作者就是资料页用户，不需要再连接用户表
+    recent_posts = as_rows(
+        Post.objects.filter(author=user, is_deleted=False, status='published'),
+        'id', 'title', 'excerpt', 'is_top', 'is_essence', 'view_count', 'reply_count', 'created_at',
+        'forum__id', 'forum__name',
+    )[:10]
     
     context = {
-        'user_profile': user,
+        'profile_user': user,
         'profile': profile,
         'posts_count': posts_count,
         'replies_count': replies_count,
@@ -402,22 +475,21 @@ def user_profile(request, username=None):
 @login_required
 def notifications(request):
     """通知列表"""
-    notifications = request.user.notifications.order_by('-created_at')
+    notifications = as_rows(request.user.notifications.all(), *Notification.LIST_FIELDS)
     
     if request.method == 'POST' and request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         if 'mark_all_read' in request.POST:
-            unread_notifications = notifications.filter(is_read=False)
-            if unread_notifications.exists():
-                unread_notifications.update(is_read=True)
+            if Notification.mark_all_read(request.user):
                 return JsonResponse({'success': True, 'message': '已标记所有通知为已读'})
             return JsonResponse({'success': True, 'message': '没有未读通知'})
     
-    unread_notifications = notifications.filter(is_read=False)
-    if unread_notifications.exists():
-        unread_notifications.update(is_read=True)
+    paginator = KeysetPaginator(notifications, Notification.LIST_ORDERING, per_page=20)
+    notifications_page = paginator.get_page(request.GET.get('cursor'))
+    
+    Notification.mark_all_read(request.user)
     
     context = {
-        'notifications': notifications,
+        'notifications': notifications_page,
     }
     return render(request, 'myapp/notifications.html', context)
 
@@ -428,8 +500,9 @@ def mark_notification_read(request, notification_id):
     """标记通知为已读"""
     try:
         notification = request.user.notifications.get(id=notification_id)
-        notification.is_read = True
-        notification.save()
+        if not notification.is_read:
+            notification.is_read = True
+            notification.save(update_fields=['is_read'])
         return JsonResponse({'success': True})
     except Notification.DoesNotExist:
         return JsonResponse({'success': False, 'message': '通知不存在'})
@@ -445,7 +518,7 @@ def toggle_essence(request, post_id):
     try:
         post = Post.objects.get(id=post_id)
         post.is_essence = not post.is_essence
-        post.save()
+        post.save(update_fields=['is_essence', 'updated_at'])
         return JsonResponse({
             'success': True, 
             'is_essence': post.is_essence,
@@ -455,6 +528,47 @@ def toggle_essence(request, post_id):
         return JsonResponse({'success': False, 'message': '帖子不存在'})
 
 
+# ==================== 实时通知视图（需要 ASGI） ====================
+
+async def _authenticated_user_id(request):
+    """在异步视图中读取当前登录用户，未登录返回 None"""
+    user = request.user
+    is_authenticated = await sync_to_async(lambda: user.is_authenticated)()
+    return user.pk if is_authenticated else None
+
+
+async def notification_stream(request):
+    """实时通知 - Server-Sent Events"""
+    # WSGI 下流式响应会被缓冲到连接结束，且每个连接占用一个工作进程：
+    # 返回 204，EventSource 收到后不再重连，页面上的通知角标只在刷新时更新
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    
+    user_id = await _authenticated_user_id(request)
+    if user_id is None:
+        return JsonResponse({'success': False, 'message': '请先登录'}, status=401)
+    
+    # 浏览器重连时通过 Last-Event-ID 告知最后收到的通知
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_id')
+    response = StreamingHttpResponse(
+        stream_events(user_id, last_event_id),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def notification_poll(request):
+    """实时通知 - 长轮询，供不支持 EventSource 的客户端使用"""
+    user_id = await _authenticated_user_id(request)
+    if user_id is None:
+        return JsonResponse({'success': False, 'message': '请先登录'}, status=401)
+    
+    events = await poll_events(user_id, request.GET.get('last_id'))
+    return JsonResponse({'success': True, 'events': events})
+
+
 # ==================== 用户认证视图 ====================
 
 def signup(request):
@@ -524,7 +638,7 @@ def toggle_top(request, post_id):
     try:
         post = Post.objects.get(id=post_id)
         post.is_top = not post.is_top
-        post.save()
+        post.save(update_fields=['is_top', 'updated_at'])
         return JsonResponse({
             'success': True, 
             'is_top': post.is_top,
@@ -5,6 +5,10 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.0/howto/deployment/asgi/
+
+The live notification endpoints (notifications/stream/ and notifications/poll/)
+are async views that hold a connection open per user; serve them through this
+application with an ASGI server, e.g. ``uvicorn myproject.asgi:application``.
 """
 
 import os
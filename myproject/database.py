@@ -0,0 +1,120 @@
+"""
+数据库配置
+
+把 ``DATABASE_URL`` 形式的连接串解析为 Django 的 DATABASES 配置项，支持：
+- ``sqlite:///db.sqlite3``（相对 BASE_DIR）、``sqlite:////绝对路径``、``sqlite://:memory:``；
+- ``postgres://用户:密码@主机:端口/数据库?sslmode=require``（postgresql:// 同义）。
+
+查询参数放入 OPTIONS。连接串中的值都是字符串，OPTION_TYPES 中列出的参数按驱动要求的类型转换
+（如 ``sqlite:///db.sqlite3?timeout=20`` 的 timeout 转为浮点数），其余参数原样传给驱动。
+
+SQLite 另有可选的调优配置（SQLITE_PROFILES），由 myproject.sqlite_tuned 后端在连接建立时应用。
+"""
+from pathlib import Path
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+from django.core.exceptions import ImproperlyConfigured
+
+ENGINES = {
+    'sqlite': 'django.db.backends.sqlite3',
+    'postgres': 'django.db.backends.postgresql',
+    'postgresql': 'django.db.backends.postgresql',
+}
+
+
+def _boolean(value):
+    """把连接串中的 true/false、1/0 等转换为布尔值"""
+    lowered = value.lower()
+    if lowered in ('1', 'true', 'yes', 'on'):
+        return True
+    if lowered in ('0', 'false', 'no', 'off'):
+        return False
+    raise ValueError(value)
+
+
+# 需要转换类型的连接参数，值为转换函数；未列出的参数以字符串传给驱动
+# （libpq 的连接参数本身就是字符串，connect_timeout、keepalives 等不需要转换）
+OPTION_TYPES = {
+    'sqlite': {
+        'timeout': float,
+        'detect_types': int,
+        'cached_statements': int,
+        'check_same_thread': _boolean,
+    },
+    'postgres': {
+        'isolation_level': int,
+        'server_side_binding': _boolean,
+    },
+}
+OPTION_TYPES['postgresql'] = OPTION_TYPES['postgres']
+
+
+def _options(scheme, query):
+    """把查询参数转换为 OPTIONS"""
+    types = OPTION_TYPES[scheme]
+    options = {}
+    for name, value in parse_qsl(query):
+        cast = types.get(name)
+        if cast is not None:
+            try:
+                value = cast(value)
+            except ValueError:
+                raise ImproperlyConfigured(f'DATABASE_URL 参数 {name} 的值无效：{value}') from None
+        options[name] = value
+    return options
+
+
+def parse_database_url(url, base_dir):
+    """解析连接串，返回 DATABASES 中的一项"""
+    parts = urlsplit(url)
+    engine = ENGINES.get(parts.scheme)
+    if engine is None:
+        raise ImproperlyConfigured(f'不支持的 DATABASE_URL 类型：{parts.scheme}')
+
+    if parts.scheme == 'sqlite':
+        if parts.netloc == ':memory:':
+            name = ':memory:'
+        else:
+            # sqlite:///db.sqlite3 的路径部分为 /db.sqlite3，去掉第一个斜杠后按相对路径处理
+            name = Path(unquote(parts.path[1:]))
+            if not name.is_absolute():
+                name = Path(base_dir) / name
+        return {'ENGINE': engine, 'NAME': name, 'OPTIONS': _options(parts.scheme, parts.query)}
+
+    return {
+        'ENGINE': engine,
+        'NAME': unquote(parts.path[1:]),
+        'USER': unquote(parts.username or ''),
+        'PASSWORD': unquote(parts.password or ''),
+        'HOST': parts.hostname or '',
+        'PORT': str(parts.port or ''),
+        'OPTIONS': _options(parts.scheme, parts.query),
+    }
+
+
+# SQLite 调优配置：连接建立时执行的 PRAGMA
+# - default：Django 默认行为，不执行任何 PRAGMA；
+# - production：WAL 日志（读写互不阻塞）、NORMAL 同步（WAL 下不会损坏数据库，只在断电时可能丢失最后的事务）、
+#   写锁等待 5 秒、256MB 内存映射、64MB 页缓存、临时表放在内存中。
+SQLITE_PROFILES = {
+    'default': {},
+    'production': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,
+        'temp_store': 'MEMORY',
+    },
+}
+
+
+def sqlite_pragmas(profile, **overrides):
+    """返回调优配置的 PRAGMA 字典，overrides 为整数项的覆盖值（来自环境变量，值为 None 的项不覆盖）"""
+    try:
+        pragmas = dict(SQLITE_PROFILES[profile])
+    except KeyError:
+        raise ImproperlyConfigured(f'未知的 SQLITE_PROFILE：{profile}（可选 {", ".join(SQLITE_PROFILES)}）')
+    if pragmas:
+        pragmas.update((name, int(value)) for name, value in overrides.items() if value is not None)
+    return pragmas
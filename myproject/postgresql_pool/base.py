@@ -0,0 +1,122 @@
+"""
+带进程内连接池的 PostgreSQL 数据库后端
+
+在 Django 自带的 PostgreSQL 后端之上增加一个简单的连接池：关闭连接时不断开，
+而是归还到池中，下次打开连接时直接取用，省去建立连接和认证的开销。
+适用于多线程 worker（如 gunicorn gthread）或 CONN_MAX_AGE=0 的部署。
+
+DATABASES 中的配置：
+    'ENGINE': 'myproject.postgresql_pool',
+    'POOL': {'MAX_SIZE': 10, 'TIMEOUT': 10},
+
+- MAX_SIZE：每个进程、每个数据库别名最多同时打开的连接数；
+- TIMEOUT：连接都被占用时等待空闲连接的秒数，超时抛出 OperationalError。
+
+取出空闲连接时，若开启了 CONN_HEALTH_CHECKS 会先执行 ``SELECT 1`` 检查，失效的连接直接丢弃；
+在 atomic 块中关闭的连接不归还，直接断开。
+连接池在进程内创建，gunicorn 使用 --preload 时也会在 fork 后的各 worker 中分别创建。
+"""
+import threading
+
+from django.db.backends.postgresql import base
+
+Database = base.Database
+
+
+class ConnectionPool:
+    """线程安全的连接池，保存 (连接, 隔离级别)"""
+
+    def __init__(self, max_size, timeout):
+        self.timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def acquire(self):
+        """占用一个连接名额，所有名额都被占用时最多等待 timeout 秒"""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise Database.OperationalError(f'{self.timeout} 秒内没有可用的数据库连接')
+
+    def take_idle(self):
+        """取出最近归还的空闲连接，没有时返回 None"""
+        with self._lock:
+            return self._idle.pop() if self._idle else None
+
+    def release(self, entry=None):
+        """归还连接名额，entry 为 None 时表示连接已丢弃"""
+        if entry is not None:
+            with self._lock:
+                self._idle.append(entry)
+        self._slots.release()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except Database.Error:
+        pass
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def _pool(self):
+        with _pools_lock:
+            pool = _pools.get(self.alias)
+            if pool is None:
+                options = self.settings_dict.get('POOL', {})
+                pool = _pools[self.alias] = ConnectionPool(options.get('MAX_SIZE', 10), options.get('TIMEOUT', 10))
+        return pool
+
+    def _healthy(self, connection):
+        if connection.closed:
+            return False
+        if not self.settings_dict['CONN_HEALTH_CHECKS']:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except Database.Error:
+            return False
+        return True
+
+    def get_new_connection(self, conn_params):
+        pool = self._pool()
+        pool.acquire()
+        try:
+            while (entry := pool.take_idle()) is not None:
+                connection, isolation_level = entry
+                if self._healthy(connection):
+                    self.isolation_level = isolation_level
+                    return connection
+                _close_quietly(connection)
+            return super().get_new_connection(conn_params)
+        except BaseException:
+            pool.release()
+            raise
+
+    def _close(self):
+        if self.connection is None:
+            return
+        pool = self._pool()
+        if self.in_atomic_block:
+            # 在 atomic 块中关闭时 Django 仍保留 self.connection（只标记 closed_in_transaction），
+            # 这时归还会让池和本连接对象同时持有同一个连接，只能断开
+            _close_quietly(self.connection)
+            pool.release()
+            return
+        try:
+            # 归还前结束可能未完成的事务，失败的连接直接丢弃
+            with self.wrap_database_errors:
+                self.connection.rollback()
+        except Exception:
+            _close_quietly(self.connection)
+            pool.release()
+            raise
+        if self.connection.closed:
+            pool.release()
+        else:
+            pool.release((self.connection, self.isolation_level))
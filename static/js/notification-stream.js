@@ -0,0 +1,37 @@
+/**
+ * 实时通知JavaScript模块
+ * 通过 Server-Sent Events 接收新通知和未读数，更新页面上的通知角标
+ */
+(function () {
+    const script = document.currentScript;
+    const streamUrl = script && script.dataset.streamUrl;
+    if (!streamUrl || !window.EventSource) {
+        return;
+    }
+
+    /**
+     * 更新所有通知角标
+     */
+    function updateBadges(count) {
+        document.querySelectorAll('.notification-badge').forEach(function (badge) {
+            badge.textContent = count;
+            badge.classList.toggle('d-none', count <= 0);
+        });
+    }
+
+    // 断线后浏览器会自动重连，并通过 Last-Event-ID 补齐错过的通知
+    const source = new EventSource(streamUrl);
+
+    source.addEventListener('unread', function (event) {
+        updateBadges(JSON.parse(event.data).count);
+    });
+
+    source.addEventListener('notification', function (event) {
+        const notification = JSON.parse(event.data);
+        document.dispatchEvent(new CustomEvent('notification:received', { detail: notification }));
+    });
+
+    window.addEventListener('beforeunload', function () {
+        source.close();
+    });
+})();
@@ -16,7 +16,8 @@ class ThemeManager {
         
         this.setupEventListeners();
         
-        // 不再自动从服务器加载主题变量，使用本地定义的变量
+        // 激活主题的变量由服务端生成的版本化CSS文件直接提供（见 base.html），
+        // 无需在页面加载时再请求 /api/theme-variables/
         // this.loadThemeVariables();
     }
 